@@ -0,0 +1,177 @@
+"""
+End-to-end pipeline benchmark against the local SQLite warehouse backend.
+
+Generates a synthetic workbook, then times each pipeline step (read, validate,
+stage, copy, merge) with wall time and peak Python memory. The load runs twice:
+"initial" into an empty target (all inserts) and "reload" of the same file
+(all unchanged), which is what most month-end reruns look like.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_pipeline --stores 150 --years 5 --format xlsx
+    python -m benchmarks.bench_pipeline --stores 500 --years 5 --format csv --json results.json
+    python -m benchmarks.bench_pipeline --stores 500 --years 5 --format csv --baseline results.json --tolerance 0.25
+    python -m benchmarks.bench_pipeline --stores 500 --years 5 --format csv --stage-format csv.gz --part-mb 1
+
+Also reports the warehouse statements of each load: the reload reuses the session's
+stage, ledger and temp table, so it sends fewer than the initial load.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import config
+from utils.file_utils import read_excel_file
+from utils.validation import validate_dataframe, periods_in_frame
+from utils.staging import STAGE_FORMATS, serialize_frame, stage_file_name, write_stage_parts
+from utils.warehouse import (
+    using_backend,
+    prepare_session,
+    upload_to_stage,
+    upload_parts_to_stage,
+    create_temp_table,
+    load_stage_to_temp,
+    merge_temp_to_target,
+    target_has_periods,
+    insert_temp_to_target
+)
+from benchmarks.synthetic import make_financials_frame, write_workbook
+from benchmarks.local_warehouse import open_local_warehouse
+
+
+class StepTimer:
+    """Collects wall time and peak traced memory for named steps."""
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def run(self, name: str, fn, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            peak_mb = None
+            if self.trace_memory:
+                peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+                tracemalloc.stop()
+            self.results.append({'step': name, 'seconds': round(seconds, 4),
+                                 'peak_mb': round(peak_mb, 1) if peak_mb is not None else None})
+
+
+def run_load(timer: StepTimer, conn, path: str, stage_format: str, label: str, part_bytes: int = None):
+    """Run one load through every pipeline step, timing each. With part_bytes the frame is staged as parts."""
+    df = timer.run(f"{label}.read", read_excel_file, path)
+    is_valid, errors = timer.run(f"{label}.validate", validate_dataframe, df, path)
+    if not is_valid:
+        raise RuntimeError(f"Synthetic file failed validation: {errors}")
+
+    prepare_session(conn)
+
+    def stage():
+        if part_bytes:
+            with tempfile.TemporaryDirectory() as part_dir:
+                write_stage_parts(df, part_dir, stage_format, target_bytes=part_bytes)
+                return upload_parts_to_stage(conn, part_dir, f"bench_{label}", stage_format)
+        stage_file = stage_file_name(f"bench_{label}", stage_format)
+        upload_to_stage(conn, stage_file, stage_file, file_stream=serialize_frame(df, stage_format))
+        return stage_file
+    stage_file = timer.run(f"{label}.stage", stage)
+
+    def copy():
+        create_temp_table(conn)
+        load_stage_to_temp(conn, stage_file, stage_format)
+    timer.run(f"{label}.copy", copy)
+
+    def merge():
+        # As the pipeline does: a plain INSERT when the target has none of the loaded periods
+        periods = periods_in_frame(df)
+        if not target_has_periods(conn, periods):
+            return insert_temp_to_target(conn, os.path.basename(path))
+        return merge_temp_to_target(conn, os.path.basename(path), periods, backfill=True)
+    return timer.run(f"{label}.merge", merge)
+
+
+def compare_to_baseline(results: list, baseline_path: str, tolerance: float) -> list:
+    """Return a message for every step slower than the baseline by more than tolerance."""
+    with open(baseline_path) as f:
+        baseline = {row['step']: row for row in json.load(f)['steps']}
+    regressions = []
+    for row in results:
+        base = baseline.get(row['step'])
+        if base and row['seconds'] > base['seconds'] * (1 + tolerance):
+            regressions.append(f"{row['step']}: {row['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline steps against the local SQLite warehouse')
+    parser.add_argument('--stores', type=int, default=150)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--periods', type=int, default=config.MAX_PERIOD)
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx', help='Input file format')
+    parser.add_argument('--stage-format', choices=STAGE_FORMATS, default=config.STAGE_FORMAT)
+    parser.add_argument('--part-mb', type=float, default=None,
+                        help='Stage the frame as parts of about this many MB, uploaded by one PUT (default: one file)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc (faster, no peak memory column)')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Fail if any step is slower than this earlier --json result')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown vs baseline (default: 0.25)')
+    args = parser.parse_args()
+
+    timer = StepTimer(trace_memory=not args.no_memory)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"Store_Financials_bench.{args.format}")
+        df = make_financials_frame(args.stores, args.years, args.periods)
+        timer.run('generate', write_workbook, df, path)
+        rows = len(df)
+        del df
+
+        part_bytes = int(args.part_mb * 1024 * 1024) if args.part_mb else None
+        backend, conn = open_local_warehouse(os.path.join(tmp, 'warehouse', 'bench.db'))
+        try:
+            with using_backend(backend):
+                initial = run_load(timer, conn, path, args.stage_format, 'initial', part_bytes)
+                initial_trips = conn.round_trips
+                reload = run_load(timer, conn, path, args.stage_format, 'reload', part_bytes)
+        finally:
+            backend.close()
+        round_trips = {'initial': initial_trips, 'reload': conn.round_trips - initial_trips}
+
+    print(f"\nRows: {rows:,}  ({args.stores} stores x {args.years} years x {args.periods} periods, "
+          f"{args.format} in, {args.stage_format} staged)")
+    print(f"Initial load inserted/updated: {initial}   Reload inserted/updated: {reload}")
+    print(f"Warehouse statements: initial {round_trips['initial']}, reload {round_trips['reload']}")
+    print(f"{'step':<20}{'seconds':>10}{'rows/s':>14}{'peak MB':>10}")
+    for row in timer.results:
+        rate = rows / row['seconds'] if row['seconds'] else 0
+        peak = f"{row['peak_mb']:.1f}" if row['peak_mb'] is not None else '-'
+        print(f"{row['step']:<20}{row['seconds']:>10.3f}{rate:>14,.0f}{peak:>10}")
+
+    report = {'rows': rows, 'stores': args.stores, 'years': args.years, 'periods': args.periods,
+              'format': args.format, 'stage_format': args.stage_format,
+              'round_trips': round_trips, 'steps': timer.results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(timer.results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.tolerance:.0%} slower than baseline):")
+            for message in regressions:
+                print(f"  - {message}")
+            sys.exit(1)
+        print(f"\nNo step slower than baseline by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Workbook reader engine benchmark.
+
+Writes synthetic .xlsx workbooks, reads them with every installed reader engine
+(utils.file_utils.READER_ENGINES) and checks each frame is identical to the one
+pandas' openpyxl reader returns, then reports the best read time per engine.
+Engines that are not installed are reported and skipped.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_readers --stores 2000
+    python -m benchmarks.bench_readers --stores 2000 --text-numbers --with-blanks --repeat 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.file_utils import READER_FALLBACKS, reader_engine_installed, read_excel_file
+from benchmarks.synthetic import make_financials_frame, write_workbook
+
+# The engine every other engine's frame is compared with
+REFERENCE_ENGINE = 'openpyxl'
+
+
+def make_workbook(path: str, stores: int, text_numbers: bool = False, with_blanks: bool = False) -> str:
+    """Write a synthetic workbook, optionally with empty cells and NA strings sprinkled in."""
+    df = make_financials_frame(stores, text_numbers=text_numbers)
+    if with_blanks:
+        money = config.FINANCIAL_COLUMNS[0]
+        df = df.astype({money: object, 'OPENED': object})
+        df.loc[::7, money] = np.nan
+        df.loc[::11, 'OPENED'] = 'N/A'
+    return write_workbook(df, path)
+
+
+def time_read(path: str, engine: str, repeat: int):
+    """Best wall time over repeat reads, and the frame of the last read."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = read_excel_file(path, engine=engine)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and compare workbook reader engines')
+    parser.add_argument('--stores', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--text-numbers', action='store_true', help='Write the money columns as text cells')
+    parser.add_argument('--with-blanks', action='store_true', help='Leave some cells empty or "N/A"')
+    args = parser.parse_args()
+
+    engines = READER_FALLBACKS['.xlsx']
+    missing = [engine for engine in engines if not reader_engine_installed(engine)]
+    for engine in missing:
+        print(f"{engine:>18}: not installed, skipped")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_workbook(os.path.join(tmp, 'Store_Financials.xlsx'), args.stores,
+                             args.text_numbers, args.with_blanks)
+        print(f"Workbook: {args.stores * 13} rows, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+        reference_seconds, reference = time_read(path, REFERENCE_ENGINE, args.repeat)
+
+        mismatched = []
+        for engine in engines:
+            if engine in missing:
+                continue
+            if engine == REFERENCE_ENGINE:
+                seconds, df = reference_seconds, reference
+            else:
+                seconds, df = time_read(path, engine, args.repeat)
+            try:
+                pd.testing.assert_frame_equal(df, reference)
+                parity = 'identical'
+            except AssertionError as e:
+                parity = f"DIFFERS: {str(e).splitlines()[0]}"
+                mismatched.append(engine)
+            print(f"{engine:>18}: {seconds:8.3f} s  ({reference_seconds / seconds:.1f}x)  {parity}")
+
+    if mismatched:
+        raise SystemExit(f"Frames differ from {REFERENCE_ENGINE} for: {', '.join(mismatched)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Multi-sheet workbook benchmark.
+
+Writes a synthetic annual workbook with one sheet per period and times reading every
+sheet one after another against reading them on a process pool (--sheets "*").
+
+Usage (from the repo root):
+    python -m benchmarks.bench_sheets --stores 500
+    python -m benchmarks.bench_sheets --stores 500 --workers 4 --repeat 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import config
+from utils.file_utils import read_excel_sheets
+from benchmarks.synthetic import make_financials_frame, write_sheet_per_period
+
+
+def time_read(path: str, max_workers: int, repeat: int) -> float:
+    """Best wall time over repeat reads of every sheet."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read_excel_sheets(path, '*', max_workers)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parallel per-sheet parsing')
+    parser.add_argument('--stores', type=int, default=500)
+    parser.add_argument('--periods', type=int, default=config.MAX_PERIOD)
+    parser.add_argument('--workers', type=int, default=None, help='Parallel workers (default: CPU count)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_sheet_per_period(make_financials_frame(args.stores, 1, args.periods),
+                                      os.path.join(tmp, 'Store_Financials_annual.xlsx'))
+        print(f"Workbook: {args.periods} sheets x {args.stores} stores, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+        sequential = time_read(path, 1, args.repeat)
+        parallel = time_read(path, args.workers, args.repeat)
+
+    workers = min(args.periods, args.workers or os.cpu_count() or 1)
+    print(f"{'sequential':>12}: {sequential:8.3f} s")
+    print(f"{'parallel':>12}: {parallel:8.3f} s  ({workers} workers, {sequential / parallel:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
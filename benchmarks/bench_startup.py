@@ -0,0 +1,80 @@
+"""
+CLI startup benchmark.
+
+Times fresh interpreters running the entry points analysts use as a pre-submit check
+(import, --help, --validate-only on a small file) and reports which heavy modules each
+one loaded. The Snowflake connector should only appear once a warehouse step runs.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --runs 10 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_financials_frame, write_workbook
+
+# Modules whose import dominates startup; reported per case
+HEAVY_MODULES = ['pandas', 'pyarrow', 'openpyxl', 'snowflake.connector']
+
+# Prints the heavy modules loaded once the statement has run
+_PROBE = "import sys, json; {statement}; print(json.dumps([m for m in {modules} if m in sys.modules]))"
+
+
+def time_command(command: list, runs: int) -> dict:
+    """Run a command repeatedly in fresh interpreters and return wall time statistics."""
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        seconds.append(time.perf_counter() - start)
+    return {'median': round(statistics.median(seconds), 4), 'min': round(min(seconds), 4)}
+
+
+def loaded_modules(statement: str) -> list:
+    """Return the heavy modules loaded by a fresh interpreter after running statement."""
+    probe = _PROBE.format(statement=statement, modules=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CLI startup time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = write_workbook(make_financials_frame(stores=20), os.path.join(tmp, 'Store_Financials.csv'))
+        validate = ['load_financials.py', '--file', workbook, '--validate-only', '--no-cache']
+        cases = [
+            ('python', [sys.executable, '-c', 'pass'], 'pass'),
+            ('import load_financials', [sys.executable, '-c', 'import load_financials'], 'import load_financials'),
+            ('--help', [sys.executable, 'load_financials.py', '--help'], 'import load_financials'),
+            ('--validate-only', [sys.executable] + validate,
+             f"sys.argv = {validate!r}; import runpy\ntry: runpy.run_path('load_financials.py', run_name='__main__')\n"
+             "except SystemExit: pass"),
+        ]
+
+        results = []
+        for name, command, statement in cases:
+            timing = time_command(command, args.runs)
+            modules = loaded_modules(statement)
+            results.append({'case': name, **timing, 'modules': modules})
+            print(f"{name:>24}: median {timing['median']:.3f} s  min {timing['min']:.3f} s  "
+                  f"loads {', '.join(modules) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'runs': args.runs, 'cases': results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Validation throughput benchmark.
+
+Compares utils.validation.validate_dataframe against the previous column-by-column
+implementation on synthetic frames and checks both report the same errors. Also
+reports memory per row of the validated frame, raw and in each compact dtype backend.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_validation --rows 1000000
+    python -m benchmarks.bench_validation --rows 1000000 --text-numbers --with-errors
+"""
+import argparse
+import time
+import pandas as pd
+
+import config
+from utils.validation import validate_dataframe
+from utils.schema import DTYPE_BACKENDS, memory_per_row
+from benchmarks.synthetic import make_frame_with_rows
+
+
+def make_frame(rows: int, text_numbers: bool = False, with_errors: bool = False) -> pd.DataFrame:
+    """Build a synthetic frame, optionally with one failure per rule."""
+    df = make_frame_with_rows(rows, text_numbers=text_numbers)
+    if with_errors:
+        df.loc[1, 'YEAR'] = 1999
+        df.loc[2, 'PERIOD'] = 'P14'
+        df.loc[3, 'STORE_LOCATION'] = None
+        df.loc[4] = df.loc[5]
+    return df
+
+
+def legacy_validate_dataframe(df: pd.DataFrame, filename: str):
+    """The column-by-column validation this engine replaced, kept for comparison."""
+    errors = []
+    missing_cols = set(config.REQUIRED_COLUMNS) - set(df.columns)
+    if missing_cols:
+        errors.append(f"Missing required columns: {missing_cols}")
+        return False, errors
+    df['YEAR'] = pd.to_numeric(df['YEAR'], errors='coerce')
+    df['PERIOD'] = df['PERIOD'].astype(str)
+    df['PERIOD'] = df['PERIOD'].str.extract(r'(\d+)', expand=False)
+    df['PERIOD'] = pd.to_numeric(df['PERIOD'], errors='coerce')
+    for col in config.KEY_COLUMNS:
+        null_count = df[col].isnull().sum()
+        if null_count > 0:
+            errors.append(f"Found {null_count} null values in key column: {col}")
+            null_rows = df[df[col].isnull()][['YEAR', 'PERIOD', 'STORE_LOCATION']].head(3)
+            errors.append(f"Sample rows with null {col}:\n{null_rows.to_string()}")
+    valid_years = df['YEAR'].notna()
+    invalid_years = df[valid_years & ~df['YEAR'].between(config.MIN_YEAR, config.MAX_YEAR)]
+    if len(invalid_years) > 0:
+        errors.append(f"Found {len(invalid_years)} rows with invalid YEAR (must be {config.MIN_YEAR}-{config.MAX_YEAR})")
+        sample_years = df.loc[invalid_years.index[:3], ['YEAR', 'PERIOD', 'STORE_LOCATION']]
+        errors.append(f"Sample invalid rows:\n{sample_years.to_string()}")
+    valid_periods = df['PERIOD'].notna()
+    invalid_periods = df[valid_periods & ~df['PERIOD'].between(config.MIN_PERIOD, config.MAX_PERIOD)]
+    if len(invalid_periods) > 0:
+        errors.append(f"Found {len(invalid_periods)} rows with invalid PERIOD (must be {config.MIN_PERIOD}-{config.MAX_PERIOD})")
+        sample_periods = df.loc[invalid_periods.index[:3], ['YEAR', 'PERIOD', 'STORE_LOCATION']]
+        errors.append(f"Sample invalid rows:\n{sample_periods.to_string()}")
+    for col in config.FINANCIAL_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    duplicates = df[df.duplicated(subset=config.KEY_COLUMNS, keep=False)]
+    if len(duplicates) > 0:
+        errors.append(f"Found {len(duplicates)} duplicate rows based on YEAR, PERIOD, STORE_LOCATION")
+        sample_dups = duplicates[['YEAR', 'PERIOD', 'STORE_LOCATION']].head(5)
+        errors.append(f"Sample duplicates:\n{sample_dups.to_string()}")
+    if len(df) == 0:
+        errors.append("DataFrame is empty")
+    return len(errors) == 0, errors
+
+
+def time_validator(validator, frame: pd.DataFrame, repeat: int):
+    """Return (best_seconds, errors) over several runs on fresh copies of the frame."""
+    best = None
+    errors = None
+    for _ in range(repeat):
+        df = frame.copy()
+        start = time.perf_counter()
+        _, errors = validator(df, 'benchmark')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark validate_dataframe throughput')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--text-numbers', action='store_true', help='Store financial columns as text, as from a messy CSV')
+    parser.add_argument('--with-errors', action='store_true', help='Inject one failure per rule to compare error output')
+    args = parser.parse_args()
+
+    frame = make_frame(args.rows, text_numbers=args.text_numbers, with_errors=args.with_errors)
+    print(f"Rows: {len(frame):,}  Columns: {len(frame.columns)}  text numbers: {args.text_numbers}")
+
+    results = {}
+    for name, validator in [('legacy', legacy_validate_dataframe), ('engine', validate_dataframe)]:
+        seconds, errors = time_validator(validator, frame, args.repeat)
+        results[name] = errors
+        print(f"{name:>8}: {seconds:8.3f} s  {len(frame) / seconds:>14,.0f} rows/s")
+
+    print(f"Errors identical: {results['legacy'] == results['engine']}")
+
+    if not args.with_errors:
+        legacy = frame.copy()
+        legacy_validate_dataframe(legacy, 'benchmark.xlsx')
+        print("Memory per row of the validated frame (required columns):")
+        print(f"{'legacy':>8}: {memory_per_row(legacy[config.REQUIRED_COLUMNS]):8.0f} bytes")
+        for backend in DTYPE_BACKENDS:
+            compact = frame.copy()
+            validate_dataframe(compact, 'benchmark.xlsx', backend)
+            print(f"{backend:>8}: {memory_per_row(compact[config.REQUIRED_COLUMNS]):8.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Local warehouse for the pipeline benchmark: the embedded SQLite backend
+(utils/sqlite_backend.SQLiteBackend) in a throwaway database file.
+
+The backend runs the real stage, COPY, hash backfill, MERGE and INSERT SQL, so a
+statement it cannot run raises and fails the benchmark. The connection handed to
+the backend is wrapped only to count the statements it sends, the local
+equivalent of a real connection's round trips.
+"""
+import sqlite3
+
+from utils.sqlite_backend import SQLiteBackend
+
+
+class CountingCursor:
+    """A sqlite3 cursor that counts execute and executemany calls on its connection."""
+
+    def __init__(self, cursor: sqlite3.Cursor, connection: 'CountingConnection'):
+        self._cursor = cursor
+        self._connection = connection
+
+    def execute(self, sql: str, params=()):
+        self._connection.round_trips += 1
+        self._cursor.execute(sql, params)
+        return self
+
+    def executemany(self, sql: str, rows):
+        self._connection.round_trips += 1
+        self._cursor.executemany(sql, rows)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    """A sqlite3 connection whose cursors count the statements sent through them."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self.round_trips = 0
+
+    def cursor(self):
+        return CountingCursor(self._conn.cursor(), self)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def open_local_warehouse(path: str):
+    """Open a SQLite backend on path. Returns: (backend, counting connection)"""
+    backend = SQLiteBackend(path)
+    return backend, CountingConnection(backend.connect())
@@ -0,0 +1,90 @@
+"""
+Synthetic Store_Financials generator.
+
+Builds frames and workbooks with exactly config.REQUIRED_COLUMNS at a chosen
+stores x years x periods scale, with PERIOD written as "P1".."P13" like the
+files Finance sends.
+
+Usage (from the repo root):
+    python -m benchmarks.synthetic --stores 150 --years 3 --format xlsx --out Store_Financials_synthetic.xlsx
+    python -m benchmarks.synthetic --stores 500 --sheet-per-period --out Store_Financials_annual.xlsx
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+import config
+
+
+def make_financials_frame(stores: int, years: int = 1, periods: int = None, seed: int = 0,
+                          first_year: int = 2020, text_numbers: bool = False) -> pd.DataFrame:
+    """Return one row per store, year and period with random money values at cent precision."""
+    periods = periods or config.MAX_PERIOD
+    rng = np.random.default_rng(seed)
+    rows = stores * years * periods
+
+    store_names = np.array([f"STORE_{i:05d}" for i in range(stores)], dtype=object)
+    df = pd.DataFrame({
+        'YEAR': np.repeat(np.arange(first_year, first_year + years), stores * periods),
+        'PERIOD': np.tile(np.repeat(np.array([f"P{p}" for p in range(1, periods + 1)], dtype=object), stores), years),
+        'OPENED': '2015-06-01',
+        'STORE_LOCATION': np.tile(store_names, years * periods),
+    })
+    money = rng.integers(0, 10_000_000, size=(rows, len(config.FINANCIAL_COLUMNS))) / 100
+    df = pd.concat([df, pd.DataFrame(money, columns=config.FINANCIAL_COLUMNS)], axis=1)[config.REQUIRED_COLUMNS]
+    if text_numbers:
+        df[config.FINANCIAL_COLUMNS] = df[config.FINANCIAL_COLUMNS].astype(str)
+    return df
+
+
+def make_frame_with_rows(rows: int, seed: int = 0, text_numbers: bool = False) -> pd.DataFrame:
+    """Return a frame of exactly rows rows, spreading stores over a single year."""
+    periods = config.MAX_PERIOD
+    stores = -(-rows // periods)
+    return make_financials_frame(stores, 1, periods, seed=seed, text_numbers=text_numbers).head(rows)
+
+
+def write_workbook(df: pd.DataFrame, path: str) -> str:
+    """Write a frame as .xlsx or .csv depending on the path's extension."""
+    _, ext = os.path.splitext(path)
+    if ext.lower() == '.csv':
+        df.to_csv(path, index=False)
+    elif ext.lower() == '.xlsx':
+        df.to_excel(path, index=False, engine='openpyxl')
+    else:
+        raise ValueError(f"Unsupported file extension: {ext}. Please use .csv or .xlsx files.")
+    return path
+
+
+def write_sheet_per_period(df: pd.DataFrame, path: str) -> str:
+    """Write an .xlsx with one sheet per PERIOD value ("P1".."P13"), like the annual regional workbooks."""
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for period, rows in df.groupby('PERIOD', sort=False):
+            rows.to_excel(writer, sheet_name=str(period), index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic Store_Financials file')
+    parser.add_argument('--stores', type=int, default=150)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--periods', type=int, default=config.MAX_PERIOD)
+    parser.add_argument('--first-year', type=int, default=2020)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx')
+    parser.add_argument('--out', default=None, help='Output path (default: Store_Financials_synthetic.<format>)')
+    parser.add_argument('--sheet-per-period', action='store_true', help='Write an .xlsx with one sheet per period')
+    args = parser.parse_args()
+
+    out = args.out or f"Store_Financials_synthetic.{args.format}"
+    df = make_financials_frame(args.stores, args.years, args.periods, seed=args.seed, first_year=args.first_year)
+    if args.sheet_per_period:
+        write_sheet_per_period(df, out)
+    else:
+        write_workbook(df, out)
+    print(f"Wrote {len(df):,} rows to {out}")
+
+
+if __name__ == "__main__":
+    main()
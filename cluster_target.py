@@ -0,0 +1,45 @@
+import argparse
+import sys
+from utils.snowflake_utils import (
+    get_snowflake_connection,
+    close_snowflake_connection,
+    get_clustering_key,
+    clustering_key_matches,
+    set_clustering_key
+)
+import config
+
+def cluster_target(apply: bool = False):
+    """Check the target table's clustering key and, with apply, set it to CLUSTERING_KEY."""
+    expected = ', '.join(config.CLUSTERING_KEY)
+    try:
+        conn = get_snowflake_connection()
+        current = get_clustering_key(conn)
+        print(f"Target table: {config.TARGET_TABLE}")
+        print(f"Clustering key: {current or 'none'}")
+
+        if clustering_key_matches(current):
+            print(f"✓ Clustered on ({expected}) - period-scoped MERGEs prune other periods")
+            return True
+
+        if not apply:
+            print(f"✗ Not clustered on ({expected}); run with --apply to set it")
+            return False
+
+        set_clustering_key(conn)
+        print(f"✓ Clustering key set to ({expected})")
+        print("  Automatic Clustering reorganizes existing data in the background and uses credits")
+        return True
+
+    except Exception as e:
+        print(f"✗ Clustering check failed: {e}")
+        return False
+
+    finally:
+        close_snowflake_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check or set the clustering key of the target table')
+    parser.add_argument('--apply', action='store_true', help=f"Set the clustering key to ({', '.join(config.CLUSTERING_KEY)}) if it differs")
+    args = parser.parse_args()
+    sys.exit(0 if cluster_target(args.apply) else 1)
@@ -11,7 +11,11 @@ SNOWFLAKE_CONFIG = {
     'database': os.getenv('SNOWFLAKE_DATABASE'),
     'schema': os.getenv('SNOWFLAKE_SCHEMA'),
     'role': os.getenv('SNOWFLAKE_ROLE'),
-    'authenticator': os.getenv('SNOWFLAKE_AUTHENTICATOR', 'externalbrowser')
+    'authenticator': os.getenv('SNOWFLAKE_AUTHENTICATOR', 'externalbrowser'),
+    # Cache the SSO ID token locally so back-to-back runs skip the browser round trip
+    'client_store_temporary_credential': True,
+    # Keep long-lived sessions (batch, daemon) from timing out between loads
+    'client_session_keep_alive': True
 }
 
 # Remove password from config if using SSO
@@ -20,6 +24,9 @@ if SNOWFLAKE_CONFIG['authenticator'] == 'externalbrowser':
 else:
     SNOWFLAKE_CONFIG['password'] = os.getenv('SNOWFLAKE_PASSWORD')
 
+# Ping a reused connection before handing it out if it has been idle this long
+CONNECTION_HEALTH_CHECK_SECONDS = 60
+
 # These need to be module-level variables too
 SNOWFLAKE_DATABASE = os.getenv('SNOWFLAKE_DATABASE')
 SNOWFLAKE_SCHEMA = os.getenv('SNOWFLAKE_SCHEMA')
@@ -27,7 +34,10 @@ SNOWFLAKE_SCHEMA = os.getenv('SNOWFLAKE_SCHEMA')
 # Table Configuration
 TARGET_TABLE = 'RAW_STORE_FINANCIALS'
 TEMP_TABLE = 'RAW_STORE_FINANCIALS_TEMP'
+RAW_TABLE = 'RAW_STORE_FINANCIALS_UNVALIDATED'  # Text rows checked by --validate-in-warehouse before the temp table
 STAGE_NAME = 'FINANCIALS_STAGE'
+LEDGER_TABLE = 'FINANCIALS_LOAD_LEDGER'  # One row per file load: checksum, row count, key range, outcome
+CHANGE_LOG_TABLE = 'FINANCIALS_CHANGE_LOG'  # Keys each load inserted or updated (--capture-changes)
 
 # Required Columns - in exact order from your table
 REQUIRED_COLUMNS = [
@@ -53,8 +63,64 @@ KEY_COLUMNS = ['YEAR', 'PERIOD', 'STORE_LOCATION']
 FINANCIAL_COLUMNS = [col for col in REQUIRED_COLUMNS 
                      if col not in KEY_COLUMNS and col != 'OPENED']
 
+# Row hash of the non-key columns, computed during validation and stored in the target
+ROW_HASH_COLUMN = 'ROW_HASH'
+
+# Columns written to the stage and loaded into the temp table
+STAGED_COLUMNS = REQUIRED_COLUMNS + [ROW_HASH_COLUMN]
+
 # Validation Rules
 MIN_YEAR = 2019
 MAX_YEAR = 2030
 MIN_PERIOD = 1
-MAX_PERIOD = 13
\ No newline at end of file
+MAX_PERIOD = 13
+
+# Reader Configuration
+READER_ENGINE = 'auto'  # One of: auto, calamine, openpyxl-readonly, openpyxl, xlrd (auto: fastest installed)
+
+# Streaming Configuration
+STREAM_CHUNK_SIZE = 50000  # Rows per chunk when reading with --stream
+
+# Staging Configuration
+STAGE_FORMAT = 'csv.gz'  # One of: csv, csv.gz, parquet (parquet requires pyarrow)
+
+# In-memory Schema Configuration (money as int64 cents, small ints, categorical text)
+DTYPE_BACKEND = 'numpy'  # One of: numpy, pyarrow (Arrow-backed integer columns)
+
+# Snapshot Configuration (local cache of target keys and row hashes for --delta)
+SNAPSHOT_DIR = '.snapshots'
+
+# Metrics Configuration (JSON run reports and Prometheus textfile)
+METRICS_DIR = 'metrics'
+PROMETHEUS_TEXTFILE = 'financials_pipeline.prom'
+
+# Parse Cache Configuration (validated frames keyed by input file content)
+PARSE_CACHE_DIR = '.cache/parsed'
+PARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used entries are evicted beyond this
+
+# Change Capture Configuration (--capture-changes)
+CHANGE_LOG_DIR = 'changes'  # Local JSON Lines file of the changed keys, one per load
+
+# Watch Mode Configuration (--watch daemon)
+WATCH_POLL_SECONDS = 2  # How often the folder is scanned
+WATCH_DEBOUNCE_SECONDS = 5  # A file must be unchanged this long before it is loaded
+WATCH_PARSE_WORKERS = 1  # Processes reading and validating files ahead of the load
+WATCH_QUEUE_SIZE = 2  # Parsed files allowed to wait for the load before the watcher pauses
+
+# Merge Pruning Configuration (see cluster_target.py)
+CLUSTERING_KEY = ['YEAR', 'PERIOD']  # Target clustering that lets period-scoped MERGEs skip other periods
+
+# Warehouse Backend Configuration (see utils/warehouse.py)
+WAREHOUSE_BACKEND = 'snowflake'  # Or 'sqlite' to load into a local database file (CI, laptops, shadow loads)
+LOCAL_WAREHOUSE_PATH = '.local_warehouse/financials.db'  # Database file of the sqlite backend; its stage sits next to it
+
+# Multi-target Loads Configuration (--targets)
+TARGET_PROFILES = {  # Profile name -> config module of that target
+    'prod': 'config',
+    'sandbox': 'sandbox_test_files.config_sandbox',
+}
+ASYNC_POLL_SECONDS = 0.5  # How often the COPYs and MERGEs submitted to every target are checked
+
+# Chunked Staging Configuration (large backfills)
+STAGE_PART_TARGET_BYTES = 100 * 1024 * 1024  # Larger loads are staged as parts of about this size; Snowflake suggests 100-250 MB compressed
+STAGE_PUT_PARALLEL = 8  # Threads the connector uses to upload the parts of one PUT (1-99)
\ No newline at end of file
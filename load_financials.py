@@ -1,139 +1,1437 @@
 import argparse
+import io
 import logging
+import queue
+import shutil
+import signal
+import tempfile
 import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Optional
 import pandas as pd
 import os
 
-from utils.file_utils import read_excel_file, get_filename_from_path
-from utils.validation import validate_dataframe, print_validation_summary
-from utils.snowflake_utils import (
-    get_snowflake_connection,
-    create_stage_if_not_exists,
+import config
+from utils import metrics
+from utils.file_utils import READER_ENGINES, read_excel_file, iter_file_chunks, get_filename_from_path
+from utils.validation import (
+    VALIDATION_RULES,
+    validate_dataframe,
+    validate_chunk,
+    raw_validation_errors,
+    print_description_summary,
+    print_validation_summary,
+    periods_in_frame,
+    update_validation_summary,
+    print_stream_summary,
+    partial_update_columns
+)
+from utils.schema import DTYPE_BACKENDS
+from utils.staging import (
+    STAGE_FORMATS,
+    RAW_STAGE_FORMAT,
+    StagePartWriter,
+    estimate_stage_bytes,
+    partial_staged_columns,
+    raw_staged_frame,
+    serialize_frame,
+    stage_file_name,
+    write_stage_parts
+)
+from utils.parse_cache import file_content_hash, load_cached_frame, store_cached_frame
+from utils.ledger import (
+    OUTCOME_SUCCESS,
+    OUTCOME_FAILED,
+    target_table_name,
+    describe_rows,
+    describe_summary,
+    build_ledger_entry,
+    find_loaded_locally,
+    find_loaded_in_warehouse,
+    record_loads,
+    record_failed_loads,
+    record_committed_loads,
+    print_already_loaded
+)
+from utils.snapshot import (
+    load_snapshot,
+    refresh_snapshot,
+    record_loaded_rows,
+    diff_against_snapshot,
+    print_delta_preview
+)
+from utils.batch_utils import (
+    SOURCE_FILE_COLUMN,
+    collect_input_files,
+    parse_and_validate_file,
+    parse_files_parallel,
+    combine_frames,
+    find_cross_file_duplicates,
+    count_actions_per_file,
+    format_per_file,
+    key_tuple
+)
+from utils.change_log import ChangeCapture
+from utils.watcher import FolderWatcher
+from utils.warehouse import (
+    BACKENDS,
+    create_backend,
+    set_backend,
+    get_connection,
+    close_connection,
+    prepare_session,
     upload_to_stage,
+    upload_parts_to_stage,
     create_temp_table,
     load_stage_to_temp,
-    merge_temp_to_target
+    backfill_row_hashes,
+    classify_temp_rows,
+    merge_temp_to_target,
+    find_unmatched_keys,
+    merge_partial_to_target,
+    target_has_periods,
+    insert_temp_to_target,
+    create_raw_table,
+    load_stage_to_raw,
+    validate_raw_rows,
+    load_raw_to_temp,
+    describe_temp_table,
+    submit_load_stage_to_temp,
+    submit_merge_temp_to_target,
+    submit_insert_temp_to_target,
+    load_profile,
+    using_backend
 )
 
-# Setup logging
-os.makedirs('logs', exist_ok=True)
-log_filename = f"logs/load_financials_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_filename),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Set by setup_logging when the CLI starts, so importing this module has no side effects
+log_filename = None
+
+
+def setup_logging(log_to_file: bool = True):
+    """Log to stdout and, unless log_to_file is False, to a timestamped file in logs/."""
+    global log_filename
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_to_file:
+        os.makedirs('logs', exist_ok=True)
+        log_filename = f"logs/load_financials_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        handlers.insert(0, logging.FileHandler(log_filename))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+
+def stream_validate_to_file(excel_file: str, temp_dir: str, stage_format: str, chunk_size: int = None,
+                            dtype_backend: str = None, reader_engine: str = None):
+    """
+    Read, validate and write the staging part files in temp_dir chunk by chunk so memory
+    stays bounded. Every chunk is validated even after a failure so the full error list is reported.
+    Returns: (is_valid, list_of_errors, summary)
+    """
+    errors = []
+    summary = {}
+    seen_keys = set()
+    writer = StagePartWriter(temp_dir, stage_format)
+    
+    try:
+        for chunk in iter_file_chunks(excel_file, chunk_size, reader_engine):
+            chunk_valid, chunk_errors = validate_chunk(chunk, excel_file, seen_keys, dtype_backend)
+            if not chunk_valid:
+                errors.extend(f"Rows {chunk.index[0]}-{chunk.index[-1]}: {error}" for error in chunk_errors)
+                continue
+            if errors:
+                # Keep validating, but stop writing once anything has failed
+                continue
+            
+            update_validation_summary(summary, chunk)
+            writer.write(chunk)
+            logger.info(f"Validated and staged {summary['rows']} rows so far")
+    finally:
+        writer.close()
+    
+    if not errors and not summary:
+        errors.append("DataFrame is empty")
+    
+    return len(errors) == 0, errors, summary
+
+
+def read_and_validate(excel_file: str, use_cache: bool = True, dtype_backend: str = None, sheets: str = None,
+                      reader_engine: str = None, partial: bool = False):
+    """
+    Steps 1-2 for a whole file: read and validate it, or reuse the frame validated on an
+    earlier run when the file is unchanged. Partial update files are not cached: the cache
+    only holds complete frames.
+    Returns: (df, is_valid, list_of_errors)
+    """
+    use_cache = use_cache and not partial
+    df = load_cached_frame(excel_file, dtype_backend=dtype_backend, sheets=sheets) if use_cache else None
+    if df is not None:
+        # Step 1-2: Unchanged file - reuse the frame validated on an earlier run
+        logger.info("Step 1-2: Using cached parse of unchanged file...")
+        metrics.step('read_validate')
+        metrics.record(rows=len(df), cache_hit=True)
+        return df, True, []
+    
+    # Step 1: Read Excel file
+    logger.info("Step 1: Reading Excel file...")
+    metrics.step('read')
+    df = read_excel_file(excel_file, sheets, engine=reader_engine)
+    metrics.record(rows=len(df))
+    logger.info(f"Loaded {len(df)} rows from Excel")
+    
+    # Step 2: Validate data
+    logger.info("Step 2: Validating data...")
+    metrics.step('validate')
+    is_valid, errors = validate_dataframe(df, excel_file, dtype_backend, partial)
+    metrics.record(rows=len(df), errors=len(errors))
+    if is_valid and use_cache:
+        store_cached_frame(excel_file, df, sheets=sheets)
+    return df, is_valid, errors
+
+
+def stage_raw_rows(excel_file: str, temp_dir: str, chunk_size: int = None, reader_engine: str = None):
+    """
+    Write the file's required columns as text part files in temp_dir, chunk by chunk and without
+    converting or validating anything, for warehouse-side validation. Only a missing column or an
+    empty file is caught here.
+    Returns: (rows_written, list_of_errors)
+    """
+    rows = 0
+    writer = StagePartWriter(temp_dir, RAW_STAGE_FORMAT, raw=True)
+    try:
+        for chunk in iter_file_chunks(excel_file, chunk_size, reader_engine):
+            missing = set(config.REQUIRED_COLUMNS) - set(chunk.columns)
+            if missing:
+                return rows, [f"Missing required columns: {missing}"]
+            writer.write(raw_staged_frame(chunk))
+            rows += len(chunk)
+            logger.info(f"Staged {rows} raw rows so far")
+    finally:
+        writer.close()
+    return rows, [] if rows else ["DataFrame is empty"]
+
+
+def serialize_for_stage(df: pd.DataFrame, stage_format: str, part_dir: str,
+                        columns: Optional[list] = None) -> Optional[io.BytesIO]:
+    """
+    Serialize the staged columns (default STAGED_COLUMNS) of a DataFrame for the stage. Frames
+    that would stage larger than STAGE_PART_TARGET_BYTES are split into part files in part_dir,
+    uploaded by one parallel PUT so a large backfill is COPYed by every warehouse thread, and
+    None is returned; anything smaller is returned in memory.
+    """
+    estimated_bytes = estimate_stage_bytes(df, stage_format, columns=columns)
+    if estimated_bytes > config.STAGE_PART_TARGET_BYTES:
+        parts = write_stage_parts(df, part_dir, stage_format, estimated_bytes, columns=columns)
+        logger.info(f"Split {len(df)} rows into {len(parts)} {stage_format} parts")
+        return None
+    
+    buffer = serialize_frame(df, stage_format, columns)
+    logger.info(f"Serialized {len(df)} rows to {buffer.getbuffer().nbytes} bytes of {stage_format}")
+    return buffer
+
+
+def upload_serialized(conn, prefix: str, stage_format: str, buffer: Optional[io.BytesIO], part_dir: str) -> str:
+    """
+    Upload what serialize_for_stage produced and return what load_stage_to_temp should load.
+    Can be called once per target, so a file loaded into several targets is serialized once.
+    """
+    if buffer is None:
+        return upload_parts_to_stage(conn, part_dir, prefix, stage_format)
+    stage_file = stage_file_name(prefix, stage_format)
+    buffer.seek(0)
+    upload_to_stage(conn, stage_file, stage_file, file_stream=buffer)
+    return stage_file
+
+
+def upload_frame(conn, df: pd.DataFrame, stage_format: str, columns: Optional[list] = None) -> str:
+    """Serialize a DataFrame, upload it to the stage and return what load_stage_to_temp should load."""
+    prefix = f"financials_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    with tempfile.TemporaryDirectory(prefix='financials_stage_') as part_dir:
+        buffer = serialize_for_stage(df, stage_format, part_dir, columns)
+        return upload_serialized(conn, prefix, stage_format, buffer, part_dir)
+
+
+def merge_or_insert(conn, source_filename: str, periods: list, capture: Optional[ChangeCapture] = None) -> tuple:
+    """
+    Move the temp table into the target. Opening a new period, every row is an insert, so
+    when the target has no rows in the loaded periods a plain INSERT replaces the hash
+    backfill and MERGE; otherwise both run as usual, sent together in one round trip.
+    With capture, the keys about to change are written to the change log just before the move,
+    and to the local change file once it has committed.
+    Returns: (rows_inserted, rows_updated)
+    """
+    new_periods = not target_has_periods(conn, periods)
+    if new_periods:
+        logger.info("Target has no rows in the loaded periods - inserting without MERGE")
+    if capture is None:
+        if new_periods:
+            return insert_temp_to_target(conn, source_filename)
+        return merge_temp_to_target(conn, source_filename, periods, backfill=True)
+    
+    # The backfill runs first on its own, so the capture sees exactly the rows the MERGE changes
+    if not new_periods:
+        backfill_row_hashes(conn, periods)
+    capture.capture(conn, source_filename, periods)
+    if new_periods:
+        rows = insert_temp_to_target(conn, source_filename)
+    else:
+        rows = merge_temp_to_target(conn, source_filename, periods)
+    write_changes(capture)
+    return rows
+
+
+def update_supplied_columns(conn, source_filename: str, periods: list, columns: list,
+                            capture: Optional[ChangeCapture] = None) -> tuple:
+    """
+    Move a partial update into the target: only columns are compared and updated. A partial
+    file has nothing to insert a new row with, so it is rejected if any key is not in the target.
+    Returns: (rows_inserted, rows_updated), rows_inserted always 0
+    """
+    unmatched, sample = find_unmatched_keys(conn, periods)
+    if unmatched:
+        keys = ', '.join(f"({year}, {period}, {store})" for year, period, store in sample)
+        raise ValueError(f"{unmatched} rows of the partial update have keys not in {target_table_name()}; a "
+                         f"partial update only corrects existing rows - e.g. {keys}")
+    if capture is not None:
+        capture.capture(conn, source_filename, periods, columns)
+    rows = merge_partial_to_target(conn, source_filename, columns, periods)
+    if capture is not None:
+        write_changes(capture)
+    return rows
+
+
+def write_changes(capture: ChangeCapture):
+    """Write a committed load's changed keys to its local change file and add them to the run report."""
+    path = capture.write()
+    inserted, updated = capture.counts()
+    metrics.record_run(change_load_id=capture.load_id, keys_inserted=inserted, keys_updated=updated,
+                       change_file=path)
+
+
+def preview_delta(df: pd.DataFrame) -> bool:
+    """Print the insert and update sets against the local snapshot, without touching the warehouse."""
+    snapshot, watermark = load_snapshot()
+    inserts, updates = diff_against_snapshot(df, snapshot)
+    print_delta_preview(inserts, updates, len(df), watermark)
+    return True
+
+
+def select_delta_rows(conn, df: pd.DataFrame) -> pd.DataFrame:
+    """Refresh the local snapshot and keep only rows that are new or changed in the target."""
+    metrics.step('delta')
+    snapshot = refresh_snapshot(conn)
+    inserts, updates = diff_against_snapshot(df, snapshot)
+    metrics.record(rows=len(inserts) + len(updates), rows_new=len(inserts), rows_changed=len(updates))
+    logger.info(f"Delta: {len(inserts)} new, {len(updates)} changed, "
+                f"{len(df) - len(inserts) - len(updates)} unchanged rows skipped")
+    return pd.concat([inserts, updates])
+
+
+def report_nothing_to_load(start_time: datetime) -> bool:
+    """Log and print the result of a delta run where every row was already up to date."""
+    duration = (datetime.now() - start_time).total_seconds()
+    logger.info("No new or changed rows - nothing uploaded")
+    print("\n✓ SUCCESS! Target already up to date - nothing uploaded")
+    print(f"  Duration: {duration:.2f} seconds")
+    print(f"  Log file: {log_filename}")
+    return True
+
+
+def report_validation_failed(errors: list) -> bool:
+    """Log and print the errors of a file that failed validation."""
+    logger.error("VALIDATION FAILED!")
+    for error in errors:
+        logger.error(f"  - {error}")
+    print("\n❌ VALIDATION FAILED - Pipeline stopped")
+    print("Errors found:")
+    for error in errors:
+        print(f"  - {error}")
+    return False
+
+
+def report_success(rows_inserted: int, rows_updated: int, start_time: datetime,
+                   capture: Optional[ChangeCapture] = None) -> bool:
+    """Log and print the result of a successful single-file load."""
+    duration = (datetime.now() - start_time).total_seconds()
+    
+    logger.info("="*60)
+    logger.info("PIPELINE COMPLETED SUCCESSFULLY!")
+    logger.info(f"Rows inserted: {rows_inserted}")
+    logger.info(f"Rows updated: {rows_updated}")
+    logger.info(f"Duration: {duration:.2f} seconds")
+    logger.info("="*60)
+    
+    print("\n✓ SUCCESS!")
+    print(f"  Rows inserted: {rows_inserted}")
+    print(f"  Rows updated: {rows_updated}")
+    if capture is not None:
+        capture.print_summary()
+    print(f"  Duration: {duration:.2f} seconds")
+    print(f"  Log file: {log_filename}")
+    return True
+
+
+def report_already_loaded(loaded: dict, start_time: datetime) -> bool:
+    """Log and print the result of a run where the ledger has every input file as loaded."""
+    duration = (datetime.now() - start_time).total_seconds()
+    logger.info(f"All input files already loaded into {target_table_name()} - nothing to do (use --force to reload)")
+    print("\n✓ SKIPPED - already loaded (use --force to reload)")
+    print_already_loaded(loaded)
+    print(f"  Duration: {duration:.2f} seconds")
+    print(f"  Log file: {log_filename}")
+    return True
+
+
+def drop_loaded_files(files: list, checksums: dict, loaded: dict) -> list:
+    """
+    Return the batch files still to load. Skipped files are reported here when some remain;
+    when none remain the caller reports them through report_already_loaded.
+    """
+    skipped = [path for path in files if checksums[path] in loaded]
+    if skipped and len(skipped) < len(files):
+        logger.info(f"Skipping {len(skipped)} files already loaded into {target_table_name()} (use --force to reload)")
+        print(f"\nSkipping {len(skipped)} already loaded files (use --force to reload):")
+        print_already_loaded({checksums[path]: loaded[checksums[path]] for path in skipped})
+    return [path for path in files if checksums[path] not in loaded]
+
 
-def main(excel_file: str):
-    """Main pipeline execution."""
+def main(excel_file: str, stream: bool = False, chunk_size: int = None, stage_format: str = None,
+         delta: bool = False, preview: bool = False, use_cache: bool = True, force: bool = False,
+         dtype_backend: str = None, sheets: str = None, reader_engine: str = None,
+         capture_changes: bool = False, change_deltas: bool = False, partial: bool = False):
+    """
+    Main pipeline execution. With partial, the file holds the key columns and any subset of
+    the others, and only those columns are staged, copied, compared and updated.
+    """
     start_time = datetime.now()
     logger.info("="*60)
     logger.info("STORE FINANCIALS PIPELINE STARTED")
     logger.info(f"Input file: {excel_file}")
     logger.info("="*60)
     
+    stage_format = stage_format or config.STAGE_FORMAT
+    capture = ChangeCapture(change_deltas) if capture_changes else None
     conn = None
-    temp_csv = None
+    temp_dir = None
+    checksum = None
+    description = None
     
     try:
-        # Step 1: Read Excel file
-        logger.info("Step 1: Reading Excel file...")
-        df = read_excel_file(excel_file)
-        logger.info(f"Loaded {len(df)} rows from Excel")
+        # Skip files the ledger already has as loaded, before parsing or connecting
+        checksum = file_content_hash(excel_file)
+        if not force:
+            loaded = find_loaded_locally([checksum])
+            if loaded:
+                return report_already_loaded(loaded, start_time)
         
-        # Step 2: Validate data
-        logger.info("Step 2: Validating data...")
-        is_valid, errors = validate_dataframe(df, excel_file)
+        if stream:
+            # Step 1-2: Read, validate and write staging file in chunks
+            logger.info("Step 1-2: Streaming, validating and staging file in chunks...")
+            metrics.step('read_validate')
+            temp_dir = f"temp_financials_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            os.makedirs(temp_dir, exist_ok=True)
+            is_valid, errors, summary = stream_validate_to_file(excel_file, temp_dir, stage_format, chunk_size,
+                                                                dtype_backend, reader_engine)
+            metrics.record(rows=summary.get('rows', 0))
+        else:
+            df, is_valid, errors = read_and_validate(excel_file, use_cache, dtype_backend, sheets, reader_engine,
+                                                     partial)
         
         if not is_valid:
-            logger.error("VALIDATION FAILED!")
-            for error in errors:
-                logger.error(f"  - {error}")
+            return report_validation_failed(errors)
+        
+        logger.info("✓ Validation passed")
+        update_columns = partial_update_columns(df.columns) if partial else None
+        staged_columns = partial_staged_columns(update_columns) if partial else None
+        if partial:
+            logger.info(f"Partial update of {len(update_columns)} columns: {', '.join(update_columns)}")
+        if stream:
+            print_stream_summary(summary)
+            description = describe_summary(summary)
+        else:
+            print_validation_summary(df)
+            description = describe_rows(df)
+        
+        if preview:
+            return preview_delta(df)
+        
+        # Step 3: Connect to Snowflake
+        logger.info("Step 3: Connecting to Snowflake...")
+        metrics.step('connect')
+        conn = get_connection()
+        
+        # Step 4: Create stage
+        logger.info("Step 4: Setting up Snowflake session...")
+        metrics.step('setup')
+        prepare_session(conn)
+        if not force:
+            loaded = find_loaded_in_warehouse(conn, [checksum])
+            if loaded:
+                return report_already_loaded(loaded, start_time)
+        
+        if delta:
+            df = select_delta_rows(conn, df)
+            if len(df) == 0:
+                record_loads(conn, [build_ledger_entry(excel_file, checksum, description, OUTCOME_SUCCESS, 0, 0)])
+                return report_nothing_to_load(start_time)
+        
+        # Step 5: Upload data to stage
+        logger.info(f"Step 5: Uploading data to stage as {stage_format}...")
+        metrics.step('upload')
+        if stream:
+            stage_file = upload_parts_to_stage(conn, temp_dir, f"financials_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                                               stage_format)
+        else:
+            stage_file = upload_frame(conn, df, stage_format, staged_columns)
+        periods = sorted(summary['periods']) if stream else periods_in_frame(df)
+        
+        # Step 6: Create temp table
+        logger.info("Step 6: Creating temporary table...")
+        metrics.step('temp_table')
+        create_temp_table(conn)
+        
+        # Step 7: Load to temp table
+        logger.info("Step 7: Loading data to temporary table...")
+        metrics.step('copy')
+        load_stage_to_temp(conn, stage_file, stage_format, staged_columns)
+        
+        # Step 8: Merge to target table
+        logger.info("Step 8: Merging data to target table...")
+        metrics.step('merge')
+        source_filename = get_filename_from_path(excel_file)
+        if partial:
+            rows_inserted, rows_updated = update_supplied_columns(conn, source_filename, periods, update_columns,
+                                                                  capture)
+        else:
+            rows_inserted, rows_updated = merge_or_insert(conn, source_filename, periods, capture)
+        metrics.record_run(rows_inserted=rows_inserted, rows_updated=rows_updated)
+        record_committed_loads(conn, [build_ledger_entry(excel_file, checksum, description, OUTCOME_SUCCESS,
+                                                         rows_inserted, rows_updated)])
+        if delta:
+            record_loaded_rows(df)
+        
+        return report_success(rows_inserted, rows_updated, start_time, capture)
+        
+    except Exception as e:
+        logger.error(f"Pipeline failed with error: {e}", exc_info=True)
+        print(f"\n❌ ERROR: {e}")
+        print(f"Check log file for details: {log_filename}")
+        if capture is not None:
+            capture.discard(conn)
+        if description is not None:
+            record_failed_loads(conn, [build_ledger_entry(excel_file, checksum, description, OUTCOME_FAILED,
+                                                          error_message=str(e))])
+        return False
+        
+    finally:
+        # Cleanup
+        if temp_dir and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+            logger.info(f"Cleaned up temporary directory: {temp_dir}")
+        
+        if conn:
+            close_connection()
+            logger.info("Closed target connection")
+
+
+def main_pushdown(excel_file: str, chunk_size: int = None, force: bool = False, reader_engine: str = None,
+                  capture_changes: bool = False, change_deltas: bool = False):
+    """
+    Pipeline with warehouse-side validation, for history reloads too large for the runner: the
+    file is staged as text chunk by chunk, COPYed into RAW_TABLE and checked there by the
+    validation rules as set-based SQL, so client memory stays flat. Valid rows are typed into
+    the temp table and merged as usual, compared column by column since they have no ROW_HASH.
+    """
+    start_time = datetime.now()
+    logger.info("="*60)
+    logger.info("STORE FINANCIALS PIPELINE STARTED (warehouse-side validation)")
+    logger.info(f"Input file: {excel_file}")
+    logger.info("="*60)
+    
+    capture = ChangeCapture(change_deltas) if capture_changes else None
+    conn = None
+    temp_dir = None
+    checksum = None
+    description = None
+    
+    try:
+        # Skip files the ledger already has as loaded, before reading or connecting
+        checksum = file_content_hash(excel_file)
+        if not force:
+            loaded = find_loaded_locally([checksum])
+            if loaded:
+                return report_already_loaded(loaded, start_time)
+        
+        # Step 1: Write the raw rows as text parts
+        logger.info("Step 1: Staging raw rows in chunks...")
+        metrics.step('read')
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        temp_dir = f"temp_financials_{timestamp}"
+        os.makedirs(temp_dir, exist_ok=True)
+        rows, errors = stage_raw_rows(excel_file, temp_dir, chunk_size, reader_engine)
+        metrics.record(rows=rows)
+        if errors:
+            return report_validation_failed(errors)
+        
+        # Step 2: Connect and set up
+        logger.info("Step 2: Connecting to Snowflake and setting up stage...")
+        metrics.step('connect')
+        conn = get_connection()
+        metrics.step('setup')
+        prepare_session(conn)
+        if not force:
+            loaded = find_loaded_in_warehouse(conn, [checksum])
+            if loaded:
+                return report_already_loaded(loaded, start_time)
+        
+        # Step 3: Upload the parts and COPY them into the raw table
+        logger.info("Step 3: Uploading raw rows and loading them into the raw table...")
+        metrics.step('upload')
+        stage_dir = upload_parts_to_stage(conn, temp_dir, f"financials_raw_{timestamp}", RAW_STAGE_FORMAT)
+        metrics.step('copy')
+        create_raw_table(conn)
+        load_stage_to_raw(conn, stage_dir)
+        
+        # Step 4: Validate in the warehouse
+        logger.info("Step 4: Validating data in the warehouse...")
+        metrics.step('validate')
+        row_count, failures = validate_raw_rows(conn, VALIDATION_RULES)
+        errors = raw_validation_errors(row_count, failures)
+        metrics.record(rows=row_count, errors=len(errors))
+        if errors:
+            return report_validation_failed(errors)
+        logger.info("✓ Validation passed")
+        
+        # Step 5: Type the validated rows into the temp table
+        logger.info("Step 5: Loading validated rows into temporary table...")
+        metrics.step('temp_table')
+        create_temp_table(conn)
+        load_raw_to_temp(conn)
+        description, periods = describe_temp_table(conn)
+        print_description_summary(description)
+        
+        # Step 6: Merge to target table
+        logger.info("Step 6: Merging data to target table...")
+        metrics.step('merge')
+        rows_inserted, rows_updated = merge_or_insert(conn, get_filename_from_path(excel_file), periods, capture)
+        metrics.record_run(rows_inserted=rows_inserted, rows_updated=rows_updated)
+        record_committed_loads(conn, [build_ledger_entry(excel_file, checksum, description, OUTCOME_SUCCESS,
+                                                         rows_inserted, rows_updated)])
+        return report_success(rows_inserted, rows_updated, start_time, capture)
+        
+    except Exception as e:
+        logger.error(f"Pipeline failed with error: {e}", exc_info=True)
+        print(f"\n❌ ERROR: {e}")
+        print(f"Check log file for details: {log_filename}")
+        if capture is not None:
+            capture.discard(conn)
+        if description is not None:
+            record_failed_loads(conn, [build_ledger_entry(excel_file, checksum, description, OUTCOME_FAILED,
+                                                          error_message=str(e))])
+        return False
+        
+    finally:
+        if temp_dir and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+            logger.info(f"Cleaned up temporary directory: {temp_dir}")
+        
+        if conn:
+            close_connection()
+            logger.info("Closed target connection")
+
+
+class TargetLoad:
+    """One target of a multi-target load: its backend and session, the step in flight and the outcome."""
+
+    def __init__(self, profile: str, backend):
+        self.profile = profile
+        self.backend = backend
+        self.conn = None
+        self.pending = None
+        self.capture = None
+        self.rows = None
+        self.skipped = None
+        self.error = None
+
+    @property
+    def active(self) -> bool:
+        return self.error is None and self.skipped is None
+
+
+def run_on_targets(loads: list, action, label: str):
+    """
+    Run action(load) for every target still loading, with its backend active. A failure only
+    fails that target; the others carry on.
+    """
+    for load in loads:
+        if not load.active:
+            continue
+        try:
+            with using_backend(load.backend):
+                action(load)
+        except Exception as e:
+            logger.error(f"[{load.profile}] {label} failed: {e}", exc_info=True)
+            load.error = e
+
+
+def wait_for_targets(loads: list):
+    """Poll the step every target has in flight until each has finished or failed."""
+    waiting = [load for load in loads if load.active and load.pending is not None]
+    while waiting:
+        for load in list(waiting):
+            try:
+                done = load.backend.poll_step(load.conn, load.pending)
+            except Exception as e:
+                logger.error(f"[{load.profile}] {load.pending.name} failed: {e}")
+                load.error = e
+                done = True
+            if done:
+                waiting.remove(load)
+        if waiting:
+            time.sleep(config.ASYNC_POLL_SECONDS)
+
+
+def report_targets(loads: list, start_time: datetime) -> bool:
+    """Log and print the outcome of every target, and add it to the run report. Returns: True if no target failed"""
+    duration = (datetime.now() - start_time).total_seconds()
+    outcomes = {}
+    logger.info("="*60)
+    print()
+    for load in loads:
+        table = load.backend.target_table_name()
+        if load.error is not None:
+            outcomes[load.profile] = {'error': str(load.error)}
+            logger.error(f"[{load.profile}] {table}: FAILED - {load.error}")
+            print(f"❌ {load.profile} ({table}): ERROR - {load.error}")
+        elif load.skipped is not None:
+            outcomes[load.profile] = {'skipped': True}
+            logger.info(f"[{load.profile}] {table}: already loaded - skipped (use --force to reload)")
+            print(f"✓ {load.profile} ({table}): SKIPPED - already loaded (use --force to reload)")
+            print_already_loaded(load.skipped)
+        else:
+            outcomes[load.profile] = {'rows_inserted': load.rows[0], 'rows_updated': load.rows[1]}
+            logger.info(f"[{load.profile}] {table}: inserted {load.rows[0]}, updated {load.rows[1]}")
+            print(f"✓ {load.profile} ({table}): {load.rows[0]} inserted, {load.rows[1]} updated")
+            if load.capture is not None:
+                outcomes[load.profile].update(change_load_id=load.capture.load_id, change_file=load.capture.path)
+                load.capture.print_summary()
+    metrics.record_run(targets=outcomes)
+    logger.info(f"Duration: {duration:.2f} seconds")
+    logger.info("="*60)
+    print(f"  Duration: {duration:.2f} seconds")
+    print(f"  Log file: {log_filename}")
+    return all(load.error is None for load in loads)
+
+
+def main_targets(excel_file: str, profiles: list, stage_format: str = None, use_cache: bool = True,
+                 force: bool = False, dtype_backend: str = None, sheets: str = None, reader_engine: str = None,
+                 backend_name: str = None, local_path: str = None, capture_changes: bool = False,
+                 change_deltas: bool = False):
+    """
+    Load one file into several targets (TARGET_PROFILES, e.g. sandbox and prod). The file is read,
+    validated and serialized once. Each target gets its own session; the COPYs, then the MERGEs,
+    are submitted to every target without waiting and polled together, so the targets load at
+    the same time. A target that fails does not stop the others, and each has its own ledger
+    and, with capture_changes, its own change log and change file.
+    """
+    start_time = datetime.now()
+    logger.info("="*60)
+    logger.info("STORE FINANCIALS PIPELINE STARTED (multi-target)")
+    logger.info(f"Input file: {excel_file}")
+    logger.info(f"Targets: {', '.join(profiles)}")
+    logger.info("="*60)
+    
+    stage_format = stage_format or config.STAGE_FORMAT
+    loads = [TargetLoad(profile, create_backend(backend_name, load_profile(profile), local_path))
+             for profile in profiles]
+    part_dir = tempfile.mkdtemp(prefix='financials_stage_')
+    checksum = None
+    description = None
+    
+    try:
+        # Skip targets the ledger already has the file loaded into, before parsing or connecting
+        checksum = file_content_hash(excel_file)
+        if not force:
+            for load in loads:
+                with using_backend(load.backend):
+                    load.skipped = find_loaded_locally([checksum]) or None
+            if not any(load.active for load in loads):
+                return report_targets(loads, start_time)
+        
+        df, is_valid, errors = read_and_validate(excel_file, use_cache, dtype_backend, sheets, reader_engine)
+        if not is_valid:
+            return report_validation_failed(errors)
+        
+        logger.info("✓ Validation passed")
+        print_validation_summary(df)
+        description = describe_rows(df)
+        periods = periods_in_frame(df)
+        source_filename = get_filename_from_path(excel_file)
+        prefix = f"financials_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        buffer = serialize_for_stage(df, stage_format, part_dir)
+        
+        def start_copy(load: TargetLoad):
+            load.conn = get_connection()
+            prepare_session(load.conn)
+            if not force:
+                load.skipped = find_loaded_in_warehouse(load.conn, [checksum]) or None
+                if load.skipped:
+                    return
+            stage_file = upload_serialized(load.conn, prefix, stage_format, buffer, part_dir)
+            create_temp_table(load.conn)
+            load.pending = submit_load_stage_to_temp(load.conn, stage_file, stage_format)
+        
+        def start_merge(load: TargetLoad):
+            new_periods = not target_has_periods(load.conn, periods)
+            if capture_changes:
+                # Captured before the MERGE is submitted, after the backfill as in merge_or_insert
+                load.capture = ChangeCapture(change_deltas)
+                if not new_periods:
+                    backfill_row_hashes(load.conn, periods)
+                load.capture.capture(load.conn, source_filename, periods)
+            if new_periods:
+                logger.info(f"[{load.profile}] Target has no rows in the loaded periods - inserting without MERGE")
+                load.pending = submit_insert_temp_to_target(load.conn, source_filename)
+            else:
+                load.pending = submit_merge_temp_to_target(load.conn, source_filename, periods,
+                                                           backfill=load.capture is None)
+        
+        def record_success(load: TargetLoad):
+            load.rows = load.pending.result
+            if load.capture is not None:
+                load.capture.write()
+        
+        # Step 3: Connect, set up, upload and start the COPY on every target
+        logger.info("Step 3: Connecting, uploading and starting the COPY on every target...")
+        metrics.step('upload')
+        run_on_targets(loads, start_copy, 'upload')
+        metrics.step('copy')
+        wait_for_targets(loads)
+        
+        # Step 4: Start the MERGE on every target that loaded its temp table
+        logger.info("Step 4: Merging data to every target...")
+        metrics.step('merge')
+        run_on_targets(loads, start_merge, 'merge')
+        wait_for_targets(loads)
+        run_on_targets(loads, record_success, 'result')
+        
+        # The ledger is written outside run_on_targets: a target whose MERGE committed stays loaded
+        for load in loads:
+            with using_backend(load.backend):
+                if load.error is not None:
+                    if load.capture is not None:
+                        load.capture.discard(load.conn)
+                    record_failed_loads(load.conn, [build_ledger_entry(excel_file, checksum, description,
+                                                                       OUTCOME_FAILED, error_message=str(load.error))])
+                elif load.skipped is None:
+                    record_committed_loads(load.conn, [build_ledger_entry(excel_file, checksum, description,
+                                                                          OUTCOME_SUCCESS, *load.rows)])
+        return report_targets(loads, start_time)
+        
+    except Exception as e:
+        logger.error(f"Pipeline failed with error: {e}", exc_info=True)
+        print(f"\n❌ ERROR: {e}")
+        print(f"Check log file for details: {log_filename}")
+        return False
+        
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+        for load in loads:
+            if load.conn:
+                load.backend.close()
+        logger.info("Closed target connections")
+
+
+def main_batch(files: list, max_workers: int = None, stage_format: str = None,
+               delta: bool = False, preview: bool = False, use_cache: bool = True, force: bool = False,
+               dtype_backend: str = None, sheets: str = None, reader_engine: str = None,
+               capture_changes: bool = False, change_deltas: bool = False):
+    """Batch pipeline: parse and validate many files in parallel, then stage and merge once."""
+    start_time = datetime.now()
+    logger.info("="*60)
+    logger.info("STORE FINANCIALS BATCH PIPELINE STARTED")
+    logger.info(f"Input files: {len(files)}")
+    logger.info("="*60)
+    
+    if not files:
+        logger.error("No input files found")
+        print("\n❌ No input files found - Pipeline stopped")
+        return False
+    
+    stage_format = stage_format or config.STAGE_FORMAT
+    capture = ChangeCapture(change_deltas) if capture_changes else None
+    conn = None
+    descriptions = {}
+    
+    try:
+        # Skip files the ledger already has as loaded, before parsing or connecting
+        checksums = {path: file_content_hash(path) for path in files}
+        if not force:
+            loaded = find_loaded_locally(list(checksums.values()))
+            files = drop_loaded_files(files, checksums, loaded)
+            if not files:
+                return report_already_loaded(loaded, start_time)
+        
+        # Step 1-2: Read and validate every file on a process pool
+        logger.info("Step 1-2: Reading and validating files in parallel...")
+        metrics.step('read_validate')
+        results = parse_files_parallel(files, max_workers=max_workers, use_cache=use_cache,
+                                       dtype_backend=dtype_backend, sheets=sheets, reader_engine=reader_engine)
+        
+        failed = {path: errors for path, (df, errors) in results.items() if errors}
+        if failed:
+            logger.error(f"VALIDATION FAILED for {len(failed)} of {len(files)} files!")
             print("\n❌ VALIDATION FAILED - Pipeline stopped")
-            print("Errors found:")
-            for error in errors:
+            for path, errors in failed.items():
+                print(f"Errors in {path}:")
+                for error in errors:
+                    logger.error(f"  {path}: {error}")
+                    print(f"  - {error}")
+            return False
+        
+        df = combine_frames({path: frame for path, (frame, errors) in results.items()})
+        metrics.record(rows=len(df))
+        logger.info(f"Loaded {len(df)} rows from {len(files)} files")
+        
+        duplicate_errors = find_cross_file_duplicates(df)
+        if duplicate_errors:
+            logger.error("VALIDATION FAILED - duplicate keys across files!")
+            print("\n❌ VALIDATION FAILED - Pipeline stopped")
+            for error in duplicate_errors:
+                logger.error(f"  - {error}")
                 print(f"  - {error}")
             return False
         
         logger.info("✓ Validation passed")
         print_validation_summary(df)
+        descriptions = {path: describe_rows(frame) for path, (frame, errors) in results.items()}
+        
+        if preview:
+            return preview_delta(df)
         
         # Step 3: Connect to Snowflake
         logger.info("Step 3: Connecting to Snowflake...")
-        conn = get_snowflake_connection()
+        metrics.step('connect')
+        conn = get_connection()
         
         # Step 4: Create stage
-        logger.info("Step 4: Setting up Snowflake stage...")
-        create_stage_if_not_exists(conn)
+        logger.info("Step 4: Setting up Snowflake session...")
+        metrics.step('setup')
+        prepare_session(conn)
+        if not force:
+            loaded = find_loaded_in_warehouse(conn, [checksums[path] for path in files])
+            remaining = drop_loaded_files(files, checksums, loaded)
+            if not remaining:
+                return report_already_loaded(loaded, start_time)
+            if len(remaining) < len(files):
+                df = df[df[SOURCE_FILE_COLUMN].isin(remaining)]
+                descriptions = {path: descriptions[path] for path in remaining}
+                files = remaining
         
-        # Step 5: Save to CSV and upload to stage
-        logger.info("Step 5: Uploading data to stage...")
-        temp_csv = f"temp_financials_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        df.to_csv(temp_csv, index=False)
+        # Rows skipped by the delta still count as unchanged in the per-file report
+        upload_df = select_delta_rows(conn, df) if delta else df
+        if len(upload_df) == 0:
+            record_loads(conn, [build_ledger_entry(path, checksums[path], descriptions[path], OUTCOME_SUCCESS, 0, 0)
+                                for path in files])
+            return report_nothing_to_load(start_time)
         
-        stage_file = f"financials_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        upload_to_stage(conn, temp_csv, stage_file)
+        # Step 5: Upload data to stage
+        logger.info(f"Step 5: Uploading data to stage as {stage_format}...")
+        metrics.step('upload')
+        stage_file = upload_frame(conn, upload_df, stage_format)
+        periods = periods_in_frame(upload_df)
         
         # Step 6: Create temp table
         logger.info("Step 6: Creating temporary table...")
+        metrics.step('temp_table')
         create_temp_table(conn)
         
         # Step 7: Load to temp table
         logger.info("Step 7: Loading data to temporary table...")
-        load_stage_to_temp(conn, stage_file)
+        metrics.step('copy')
+        load_stage_to_temp(conn, stage_file, stage_format)
         
-        # Step 8: Merge to target table
+        # Step 8: Classify rows per file, then merge everything once
         logger.info("Step 8: Merging data to target table...")
-        source_filename = get_filename_from_path(excel_file)
-        rows_inserted, rows_updated = merge_temp_to_target(conn, source_filename)
+        metrics.step('merge')
+        batch_name = f"{len(files)} files"
+        if target_has_periods(conn, periods):
+            backfill_row_hashes(conn, periods)
+            if capture is not None:
+                # The captured keys are the classification, so it costs no extra query
+                capture.capture(conn, batch_name, periods)
+                changed = [(change['YEAR'], change['PERIOD'], change['STORE_LOCATION'], change['ACTION'])
+                           for change in capture.changes]
+            else:
+                changed = classify_temp_rows(conn, periods)
+            actions = {key_tuple(y, p, s): action for y, p, s, action in changed}
+            per_file = count_actions_per_file(df, actions)
+            rows_inserted, rows_updated = merge_temp_to_target(conn, batch_name, periods)
+        else:
+            # New periods only: every uploaded row is an insert, no classification query needed
+            logger.info("Target has no rows in the loaded periods - inserting without MERGE")
+            actions = {key_tuple(y, p, s): 'INSERT' for y, p, s in
+                       zip(upload_df['YEAR'], upload_df['PERIOD'], upload_df['STORE_LOCATION'])}
+            per_file = count_actions_per_file(df, actions)
+            if capture is not None:
+                capture.capture(conn, batch_name, periods)
+            rows_inserted, rows_updated = insert_temp_to_target(conn, batch_name)
+        if capture is not None:
+            write_changes(capture)
+        metrics.record_run(rows_inserted=rows_inserted, rows_updated=rows_updated,
+                           per_file=per_file.reset_index().to_dict(orient='records'))
+        record_committed_loads(conn, [
+            build_ledger_entry(path, checksums[path], descriptions[path], OUTCOME_SUCCESS,
+                               int(per_file.loc[path, 'inserted']), int(per_file.loc[path, 'updated']))
+            for path in files
+        ])
+        if delta:
+            record_loaded_rows(upload_df)
         
         # Success!
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         
         logger.info("="*60)
-        logger.info("PIPELINE COMPLETED SUCCESSFULLY!")
+        logger.info("BATCH PIPELINE COMPLETED SUCCESSFULLY!")
+        logger.info(f"Per-file results:\n{format_per_file(per_file)}")
         logger.info(f"Rows inserted: {rows_inserted}")
         logger.info(f"Rows updated: {rows_updated}")
         logger.info(f"Duration: {duration:.2f} seconds")
         logger.info("="*60)
         
         print("\n✓ SUCCESS!")
+        print(format_per_file(per_file))
+        print(f"  Files loaded: {len(files)}")
         print(f"  Rows inserted: {rows_inserted}")
         print(f"  Rows updated: {rows_updated}")
+        if capture is not None:
+            capture.print_summary()
         print(f"  Duration: {duration:.2f} seconds")
         print(f"  Log file: {log_filename}")
         
         return True
         
     except Exception as e:
-        logger.error(f"Pipeline failed with error: {e}", exc_info=True)
+        logger.error(f"Batch pipeline failed with error: {e}", exc_info=True)
         print(f"\n❌ ERROR: {e}")
         print(f"Check log file for details: {log_filename}")
+        if capture is not None:
+            capture.discard(conn)
+        if descriptions:
+            record_failed_loads(conn, [
+                build_ledger_entry(path, checksums[path], description, OUTCOME_FAILED, error_message=str(e))
+                for path, description in descriptions.items()
+            ])
         return False
         
     finally:
         # Cleanup
-        if temp_csv and os.path.exists(temp_csv):
-            os.remove(temp_csv)
-            logger.info(f"Cleaned up temporary file: {temp_csv}")
-        
         if conn:
-            conn.close()
-            logger.info("Closed Snowflake connection")
+            close_connection()
+            logger.info("Closed target connection")
+
+
+def write_run_reports(run, metrics_json: str = None, prometheus_textfile: str = None, suffix: str = ''):
+    """
+    Write the JSON run report and the Prometheus textfile of a finished run. The default report
+    name carries the start time and the start of the run id, so runs started in the same second
+    (such as back-to-back watch files) do not overwrite each other's report.
+    """
+    metrics.write_json_report(
+        run, metrics_json or os.path.join(
+            config.METRICS_DIR, f"run_{run.started_at.strftime('%Y%m%d_%H%M%S')}_{run.run_id[:8]}{suffix}.json"))
+    metrics.write_prometheus_textfile(
+        run, prometheus_textfile or os.path.join(config.METRICS_DIR, config.PROMETHEUS_TEXTFILE))
+
+
+def load_validated_frame(conn, df: pd.DataFrame, filepath: str, checksum: str, description: dict,
+                         stage_format: str, delta: bool = False, capture: Optional[ChangeCapture] = None) -> tuple:
+    """
+    Stage, copy and merge one validated file over an open connection and record it in the ledger.
+    Returns: (rows_inserted, rows_updated)
+    """
+    if delta:
+        df = select_delta_rows(conn, df)
+        if len(df) == 0:
+            logger.info("No new or changed rows - nothing uploaded")
+            record_loads(conn, [build_ledger_entry(filepath, checksum, description, OUTCOME_SUCCESS, 0, 0)])
+            return 0, 0
+    
+    logger.info(f"Uploading {len(df)} rows to stage as {stage_format}...")
+    metrics.step('upload')
+    stage_file = upload_frame(conn, df, stage_format)
+    
+    metrics.step('temp_table')
+    create_temp_table(conn)
+    
+    metrics.step('copy')
+    load_stage_to_temp(conn, stage_file, stage_format)
+    
+    metrics.step('merge')
+    rows_inserted, rows_updated = merge_or_insert(conn, get_filename_from_path(filepath), periods_in_frame(df),
+                                                  capture)
+    metrics.record_run(rows_inserted=rows_inserted, rows_updated=rows_updated)
+    record_committed_loads(conn, [build_ledger_entry(filepath, checksum, description, OUTCOME_SUCCESS,
+                                                     rows_inserted, rows_updated)])
+    if delta:
+        record_loaded_rows(df)
+    return rows_inserted, rows_updated
+
+
+def watch_for_files(watcher: FolderWatcher, executor: ProcessPoolExecutor, work: queue.Queue,
+                    stop: threading.Event, use_cache: bool = True, force: bool = False, dtype_backend: str = None,
+                    sheets: str = None, reader_engine: str = None):
+    """
+    Producer thread of the watch daemon: poll the folder and hand each file that has landed to
+    the parse pool. Its future is queued straight away, so the next file is read and validated
+    while the consumer is still uploading and merging the previous one.
+    """
+    while not stop.is_set():
+        try:
+            for filepath, modified_at in watcher.poll():
+                checksum = file_content_hash(filepath)
+                if not force and find_loaded_locally([checksum]):
+                    logger.info(f"Skipping {filepath} - already loaded into {target_table_name()}")
+                    continue
+                logger.info(f"New file {filepath} - reading and validating")
+                future = executor.submit(parse_and_validate_file, filepath, use_cache, dtype_backend, sheets,
+                                         reader_engine=reader_engine)
+                # Blocks while the consumer is WATCH_QUEUE_SIZE files behind, which bounds memory
+                work.put((filepath, modified_at, checksum, future))
+        except Exception as e:
+            logger.error(f"Error while watching {watcher.directory}: {e}", exc_info=True)
+        stop.wait(config.WATCH_POLL_SECONDS)
+
+
+def load_watched_file(filepath: str, modified_at: float, checksum: str, future, stage_format: str,
+                      delta: bool = False, force: bool = False, prometheus_textfile: str = None,
+                      capture_changes: bool = False, change_deltas: bool = False) -> bool:
+    """
+    Consumer side of the watch daemon: wait for one file's parse, then load it over the warm
+    session. Every file is its own metrics run. Returns True if the file loaded or was skipped.
+    """
+    metrics.start_run('load_financials.watch', input=filepath, log_file=log_filename)
+    capture = ChangeCapture(change_deltas) if capture_changes else None
+    success = False
+    conn = None
+    description = None
+    
+    try:
+        metrics.step('read_validate')
+        _, df, errors = future.result()
+        if errors:
+            logger.error(f"VALIDATION FAILED for {filepath}")
+            print(f"\n❌ VALIDATION FAILED - {filepath} not loaded")
+            for error in errors:
+                logger.error(f"  - {error}")
+                print(f"  - {error}")
+            return False
+        metrics.record(rows=len(df))
+        description = describe_rows(df)
+        
+        metrics.step('connect')
+        conn = get_connection()
+        if not force:
+            loaded = find_loaded_in_warehouse(conn, [checksum])
+            if loaded:
+                logger.info(f"Skipping {filepath} - already loaded into {target_table_name()}")
+                print(f"\nSkipping {filepath} - already loaded (use --force to reload)")
+                print_already_loaded(loaded)
+                success = True
+                return True
+        
+        rows_inserted, rows_updated = load_validated_frame(conn, df, filepath, checksum, description,
+                                                           stage_format, delta, capture)
+        latency = time.time() - modified_at
+        metrics.record_run(landing_latency_seconds=round(latency, 3))
+        logger.info(f"Loaded {filepath}: {rows_inserted} inserted, {rows_updated} updated, "
+                    f"queryable {latency:.1f} seconds after it landed")
+        print(f"\n✓ {get_filename_from_path(filepath)}: {rows_inserted} inserted, {rows_updated} updated "
+              f"({latency:.1f} seconds after landing)")
+        if capture is not None:
+            capture.print_summary()
+        success = True
+        return True
+        
+    except Exception as e:
+        logger.error(f"Load of {filepath} failed with error: {e}", exc_info=True)
+        print(f"\n❌ ERROR loading {filepath}: {e}")
+        if capture is not None:
+            capture.discard(conn)
+        if description is not None:
+            record_failed_loads(conn, [build_ledger_entry(filepath, checksum, description, OUTCOME_FAILED,
+                                                          error_message=str(e))])
+        return False
+        
+    finally:
+        stem = os.path.splitext(get_filename_from_path(filepath))[0]
+        write_run_reports(metrics.finish_run(success), prometheus_textfile=prometheus_textfile, suffix=f"_{stem}")
+
+
+def main_watch(directory: str, max_workers: int = None, stage_format: str = None, delta: bool = False,
+               use_cache: bool = True, force: bool = False, dtype_backend: str = None,
+               prometheus_textfile: str = None, sheets: str = None, reader_engine: str = None,
+               capture_changes: bool = False, change_deltas: bool = False):
+    """
+    Daemon pipeline: watch a folder and load each workbook as it lands, over one warm Snowflake
+    session, until interrupted. A file that fails is logged and recorded in the ledger, and the
+    daemon carries on with the next one.
+    """
+    logger.info("="*60)
+    logger.info("STORE FINANCIALS WATCH PIPELINE STARTED")
+    logger.info(f"Watching: {directory}")
+    logger.info("="*60)
+    
+    stage_format = stage_format or config.STAGE_FORMAT
+    # Service managers stop the daemon with SIGTERM; shut down the same way as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    stop = threading.Event()
+    executor = None
+    loaded, failed = 0, 0
+    
+    try:
+        watcher = FolderWatcher(directory)
+        
+        # Connect and set up once; every file after this reuses the warm session
+        logger.info("Connecting to Snowflake and setting up stage...")
+        conn = get_connection()
+        prepare_session(conn)
+        
+        executor = ProcessPoolExecutor(max_workers=max_workers or config.WATCH_PARSE_WORKERS)
+        work = queue.Queue(maxsize=config.WATCH_QUEUE_SIZE)
+        producer = threading.Thread(target=watch_for_files, name='watcher', daemon=True,
+                                    args=(watcher, executor, work, stop, use_cache, force, dtype_backend, sheets,
+                                          reader_engine))
+        producer.start()
+        print(f"\nWatching {directory} for new files (Ctrl+C to stop)...")
+        
+        while True:
+            try:
+                # A timeout keeps the wait interruptible by Ctrl+C on Windows
+                item = work.get(timeout=1)
+            except queue.Empty:
+                continue
+            if load_watched_file(*item, stage_format=stage_format, delta=delta, force=force,
+                                 prometheus_textfile=prometheus_textfile, capture_changes=capture_changes,
+                                 change_deltas=change_deltas):
+                loaded += 1
+            else:
+                failed += 1
+    
+    except KeyboardInterrupt:
+        logger.info("Watch pipeline stopped")
+        print(f"\nStopped watching {directory}")
+        print(f"  Files loaded: {loaded}")
+        print(f"  Files failed: {failed}")
+        print(f"  Log file: {log_filename}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Watch pipeline failed with error: {e}", exc_info=True)
+        print(f"\n❌ ERROR: {e}")
+        print(f"Check log file for details: {log_filename}")
+        return False
+        
+    finally:
+        stop.set()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        close_connection()
+        logger.info("Closed target connection")
+
+
+def main_validate(files: list, max_workers: int = None, use_cache: bool = True, dtype_backend: str = None,
+                  sheets: str = None, reader_engine: str = None):
+    """Pre-submit check: read and validate files and print the summary, without connecting to Snowflake."""
+    if not files:
+        logger.error("No input files found")
+        print("\n❌ No input files found")
+        return False
+    
+    if len(files) == 1:
+        # One file is validated in this process rather than paying to start a worker pool
+        # (its sheets are still read in parallel)
+        filepath, df, errors = parse_and_validate_file(files[0], use_cache, dtype_backend, sheets, sheet_workers=None,
+                                                       reader_engine=reader_engine)
+        results = {filepath: (df, errors)}
+    else:
+        results = parse_files_parallel(files, max_workers=max_workers, use_cache=use_cache,
+                                       dtype_backend=dtype_backend, sheets=sheets, reader_engine=reader_engine)
+    
+    failed = {path: errors for path, (df, errors) in results.items() if errors}
+    if failed:
+        print("\n❌ VALIDATION FAILED")
+        for path, errors in failed.items():
+            print(f"Errors in {path}:")
+            for error in errors:
+                print(f"  - {error}")
+        return False
+    
+    df = combine_frames({path: frame for path, (frame, errors) in results.items()})
+    duplicate_errors = find_cross_file_duplicates(df)
+    if duplicate_errors:
+        print("\n❌ VALIDATION FAILED - duplicate keys across files")
+        for error in duplicate_errors:
+            print(f"  - {error}")
+        return False
+    
+    print(f"\n✓ VALIDATION PASSED - {len(files)} file(s) ready to load")
+    print_validation_summary(df)
+    return True
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Load store financials to Snowflake')
-    parser.add_argument('--file', required=True, help='Path to Excel (.xlsx, .xls) or CSV file')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--file', help='Path to Excel (.xlsx, .xls) or CSV file')
+    source.add_argument('--dir', help='Load every .xlsx, .xls and .csv file in this directory as one batch')
+    source.add_argument('--glob', help='Load every file matching this glob pattern as one batch (quote it)')
+    source.add_argument('--watch', metavar='DIR',
+                        help='Run as a daemon: load each file dropped into this directory as it lands')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of parse/validate worker processes for batch mode (default: CPU count) '
+                             f'or watch mode (default: {config.WATCH_PARSE_WORKERS})')
+    parser.add_argument('--sheets', metavar='PATTERN', default=None,
+                        help='Read every workbook sheet matching this comma-separated wildcard list, in parallel '
+                             '("*" for all; default: first sheet only)')
+    parser.add_argument('--reader-engine', choices=READER_ENGINES, default=config.READER_ENGINE,
+                        help='Workbook reader; auto picks calamine if installed, else openpyxl read-only, and an '
+                             'engine that is missing or cannot read the file falls back the same way '
+                             f'(default: {config.READER_ENGINE})')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read, validate and stage --file in fixed-size chunks to bound memory')
+    parser.add_argument('--chunk-size', type=int, default=config.STREAM_CHUNK_SIZE,
+                        help=f'Rows per chunk with --stream or --validate-in-warehouse (default: {config.STREAM_CHUNK_SIZE})')
+    parser.add_argument('--stage-format', choices=STAGE_FORMATS, default=config.STAGE_FORMAT,
+                        help=f'Format of the data uploaded to the stage (default: {config.STAGE_FORMAT})')
+    parser.add_argument('--targets', metavar='PROFILES', default=None,
+                        help=f"Load --file into several targets at once, e.g. sandbox,prod "
+                             f"(profiles: {', '.join(config.TARGET_PROFILES)})")
+    parser.add_argument('--backend', choices=BACKENDS, default=config.WAREHOUSE_BACKEND,
+                        help=f'Warehouse to load into; sqlite is a local database file for CI and shadow loads '
+                             f'(default: {config.WAREHOUSE_BACKEND})')
+    parser.add_argument('--local-db', metavar='PATH', default=None,
+                        help=f'Database file of the sqlite backend (default: {config.LOCAL_WAREHOUSE_PATH})')
+    parser.add_argument('--dtype-backend', choices=DTYPE_BACKENDS, default=config.DTYPE_BACKEND,
+                        help=f'Backend for the compact in-memory frame (default: {config.DTYPE_BACKEND})')
+    
+    parser.add_argument('--metrics-json', default=None,
+                        help=f'Write the JSON run report here (default: {config.METRICS_DIR}/run_<timestamp>_<run id>.json)')
+    parser.add_argument('--prometheus-textfile', default=None,
+                        help=f'Write Prometheus metrics here (default: {config.METRICS_DIR}/{config.PROMETHEUS_TEXTFILE})')
+    parser.add_argument('--delta', action='store_true',
+                        help='Upload only rows that are new or changed according to the local target snapshot')
+    parser.add_argument('--partial', action='store_true',
+                        help='--file holds corrections: the key columns plus any subset of the other columns. '
+                             'Only those columns are uploaded and updated, on rows already in the target')
+    parser.add_argument('--capture-changes', action='store_true',
+                        help=f'Record the (YEAR, PERIOD, STORE_LOCATION) keys each load inserts or updates in '
+                             f'{config.CHANGE_LOG_TABLE} and in a file under {config.CHANGE_LOG_DIR}/')
+    parser.add_argument('--change-deltas', action='store_true',
+                        help='With the captured keys, record the before and after value of every changed column '
+                             '(implies --capture-changes)')
+    parser.add_argument('--validate-in-warehouse', action='store_true',
+                        help='Stage --file as text in chunks and run the validation checks as SQL in the warehouse, '
+                             'for loads too large to validate on this machine')
+    parser.add_argument('--validate-only', action='store_true',
+                        help='Read and validate the input and print the summary, without connecting to Snowflake')
+    parser.add_argument('--preview', action='store_true',
+                        help='Print the rows a --delta load would insert and update, without touching the warehouse')
+    parser.add_argument('--force', action='store_true',
+                        help='Load files even if the load ledger has them as already loaded')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always re-read and re-validate input files instead of using the parse cache')
     
     args = parser.parse_args()
+    if args.stream and (args.delta or args.preview):
+        parser.error('--delta and --preview need the whole file in memory and cannot be used with --stream')
+    if args.stream and args.sheets:
+        parser.error('--sheets cannot be used with --stream, which reads the first sheet only')
+    if args.watch and (args.stream or args.preview or args.metrics_json):
+        parser.error('--stream, --preview and --metrics-json cannot be used with --watch '
+                     f'(watch mode writes one report per file to {config.METRICS_DIR}/)')
+    
+    if args.validate_in_warehouse and (not args.file or args.stream or args.sheets or args.delta or args.preview
+                                       or args.validate_only):
+        parser.error('--validate-in-warehouse only works with --file, and cannot be used with --stream, --sheets, '
+                     '--delta, --preview or --validate-only')
+    
+    targets = args.targets.split(',') if args.targets else None
+    if targets and (not args.file or args.stream or args.delta or args.preview or args.validate_in_warehouse
+                    or args.validate_only):
+        parser.error('--targets only works with --file, and cannot be used with --stream, --delta, --preview, '
+                     '--validate-in-warehouse or --validate-only')
+    unknown = [profile for profile in targets or [] if profile not in config.TARGET_PROFILES]
+    if unknown:
+        parser.error(f"Unknown target profiles: {', '.join(unknown)} (choose from {', '.join(config.TARGET_PROFILES)})")
+    
+    if args.local_db and args.backend != 'sqlite':
+        parser.error('--local-db can only be used with --backend sqlite')
+    
+    if args.validate_only and (args.watch or args.stream or args.delta or args.preview):
+        parser.error('--validate-only cannot be used with --watch, --stream, --delta or --preview')
+    
+    if args.partial and (not args.file or args.stream or args.delta or args.preview or args.validate_in_warehouse
+                         or args.validate_only or targets):
+        parser.error('--partial only works with --file, and cannot be used with --stream, --delta, --preview, '
+                     '--validate-in-warehouse, --validate-only or --targets')
     
-    success = main(args.file)
+    capture_changes = args.capture_changes or args.change_deltas
+    if capture_changes and (args.preview or args.validate_only):
+        parser.error('--capture-changes and --change-deltas cannot be used with --preview or --validate-only, '
+                     'which load nothing')
+    
+    # A validation check leaves no log file or run report behind
+    setup_logging(log_to_file=not args.validate_only)
+    
+    if args.validate_only:
+        files = [args.file] if args.file else collect_input_files(args.dir, args.glob)
+        success = main_validate(files, max_workers=args.workers, use_cache=not args.no_cache,
+                                dtype_backend=args.dtype_backend, sheets=args.sheets,
+                                reader_engine=args.reader_engine)
+        sys.exit(0 if success else 1)
+    
+    set_backend(create_backend(args.backend, local_path=args.local_db))
+    
+    if args.watch:
+        success = main_watch(args.watch, max_workers=args.workers, stage_format=args.stage_format, delta=args.delta,
+                             use_cache=not args.no_cache, force=args.force, dtype_backend=args.dtype_backend,
+                             prometheus_textfile=args.prometheus_textfile, sheets=args.sheets,
+                             reader_engine=args.reader_engine, capture_changes=capture_changes,
+                             change_deltas=args.change_deltas)
+        sys.exit(0 if success else 1)
+    
+    metrics.start_run('load_financials', input=args.file or args.dir or args.glob, log_file=log_filename)
+    success = False
+    try:
+        if targets:
+            success = main_targets(args.file, targets, stage_format=args.stage_format, use_cache=not args.no_cache,
+                                   force=args.force, dtype_backend=args.dtype_backend, sheets=args.sheets,
+                                   reader_engine=args.reader_engine, backend_name=args.backend,
+                                   local_path=args.local_db, capture_changes=capture_changes,
+                                   change_deltas=args.change_deltas)
+        elif args.validate_in_warehouse:
+            success = main_pushdown(args.file, chunk_size=args.chunk_size, force=args.force,
+                                    reader_engine=args.reader_engine, capture_changes=capture_changes,
+                                    change_deltas=args.change_deltas)
+        elif args.file:
+            success = main(args.file, stream=args.stream, chunk_size=args.chunk_size, stage_format=args.stage_format,
+                           delta=args.delta, preview=args.preview, use_cache=not args.no_cache, force=args.force,
+                           dtype_backend=args.dtype_backend, sheets=args.sheets, reader_engine=args.reader_engine,
+                           capture_changes=capture_changes, change_deltas=args.change_deltas, partial=args.partial)
+        else:
+            success = main_batch(collect_input_files(args.dir, args.glob), max_workers=args.workers,
+                                 stage_format=args.stage_format, delta=args.delta, preview=args.preview,
+                                 use_cache=not args.no_cache, force=args.force, dtype_backend=args.dtype_backend,
+                                 sheets=args.sheets, reader_engine=args.reader_engine,
+                                 capture_changes=capture_changes, change_deltas=args.change_deltas)
+    finally:
+        write_run_reports(metrics.finish_run(success), args.metrics_json, args.prometheus_textfile)
     sys.exit(0 if success else 1)
\ No newline at end of file
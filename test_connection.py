@@ -1,4 +1,4 @@
-from utils.snowflake_utils import get_snowflake_connection
+from utils.snowflake_utils import get_snowflake_connection, close_snowflake_connection
 import config
 
 def test_connection():
@@ -44,13 +44,15 @@ def test_connection():
             print(f"✗ Target table {config.TARGET_TABLE} does not exist!")
         
         cursor.close()
-        conn.close()
         
         return True
         
     except Exception as e:
         print(f"✗ Connection failed: {e}")
         return False
+    
+    finally:
+        close_snowflake_connection()
 
 if __name__ == "__main__":
     test_connection()
\ No newline at end of file
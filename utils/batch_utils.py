@@ -0,0 +1,144 @@
+import glob
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import config
+from utils.file_utils import read_excel_file, get_filename_from_path
+from utils.validation import validate_dataframe
+from utils.parse_cache import load_cached_frame, store_cached_frame
+from utils.schema import CATEGORY_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# Column added to the combined batch frame to remember which file a row came from. It holds the
+# full input path: a recursive glob can match files with the same name in different directories.
+SOURCE_FILE_COLUMN = 'SOURCE_FILE'
+
+
+def collect_input_files(directory: Optional[str] = None, pattern: Optional[str] = None) -> List[str]:
+    """Return the sorted list of workbooks in a directory or matching a glob pattern."""
+    if directory:
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        candidates = [os.path.join(directory, name) for name in os.listdir(directory)]
+    else:
+        candidates = glob.glob(pattern, recursive=True)
+
+    files = [
+        path for path in candidates
+        if os.path.isfile(path)
+        and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+        # Skip Excel lock files like "~$Store_Financials.xlsx"
+        and not os.path.basename(path).startswith('~$')
+    ]
+    return sorted(files)
+
+
+def parse_and_validate_file(filepath: str, use_cache: bool = True, dtype_backend: Optional[str] = None,
+                            sheets: Optional[str] = None,
+                            sheet_workers: Optional[int] = 1,
+                            reader_engine: Optional[str] = None) -> Tuple[str, Optional[pd.DataFrame], List[str]]:
+    """
+    Read and validate a single file, or take it from the parse cache. Usually runs inside a worker
+    process, so by default the sheets of a multi-sheet workbook are read one after another rather
+    than on a nested pool; pass sheet_workers=None to read them in parallel.
+    Returns: (filepath, validated_dataframe_or_None, list_of_errors)
+    """
+    try:
+        if use_cache:
+            cached = load_cached_frame(filepath, dtype_backend=dtype_backend, sheets=sheets)
+            if cached is not None:
+                return filepath, cached, []
+        df = read_excel_file(filepath, sheets, max_workers=sheet_workers, engine=reader_engine)
+    except Exception as e:
+        return filepath, None, [f"Error reading file: {e}"]
+
+    is_valid, errors = validate_dataframe(df, filepath, dtype_backend)
+    if not is_valid:
+        return filepath, None, errors
+    if use_cache:
+        store_cached_frame(filepath, df, sheets=sheets)
+    return filepath, df, []
+
+
+def parse_files_parallel(files: List[str], max_workers: Optional[int] = None, use_cache: bool = True,
+                         dtype_backend: Optional[str] = None,
+                         sheets: Optional[str] = None,
+                         reader_engine: Optional[str] = None) -> Dict[str, Tuple[Optional[pd.DataFrame], List[str]]]:
+    """Parse and validate files on a process pool. Returns {filepath: (df, errors)} in input order."""
+    results = {}
+    worker = partial(parse_and_validate_file, use_cache=use_cache, dtype_backend=dtype_backend, sheets=sheets,
+                     reader_engine=reader_engine)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for filepath, df, errors in executor.map(worker, files):
+            if errors:
+                logger.error(f"Validation failed for {filepath}")
+            else:
+                logger.info(f"Parsed {len(df)} rows from {filepath}")
+            results[filepath] = (df, errors)
+    return results
+
+
+def combine_frames(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate validated frames, tagging each row with its source file path."""
+    tagged = []
+    for filepath, df in frames.items():
+        df = df.copy()
+        df[SOURCE_FILE_COLUMN] = filepath
+        tagged.append(df)
+    combined = pd.concat(tagged, ignore_index=True)
+    # Categoricals with different categories per file concatenate to object; restore them
+    for col in CATEGORY_COLUMNS:
+        if isinstance(tagged[0][col].dtype, pd.CategoricalDtype):
+            combined[col] = combined[col].astype('category')
+    return combined
+
+
+def find_cross_file_duplicates(combined: pd.DataFrame) -> List[str]:
+    """Return errors for keys that appear in more than one file of the batch."""
+    errors = []
+    duplicated = combined[combined.duplicated(subset=config.KEY_COLUMNS, keep=False)]
+    if len(duplicated) > 0:
+        errors.append(f"Found {len(duplicated)} rows with keys duplicated across files")
+        sample_dups = duplicated[config.KEY_COLUMNS + [SOURCE_FILE_COLUMN]].head(10)
+        errors.append(f"Sample duplicates:\n{sample_dups.to_string()}")
+    return errors
+
+
+def key_tuple(year, period, store_location) -> Tuple[int, int, str]:
+    """Normalize a (YEAR, PERIOD, STORE_LOCATION) key so client and Snowflake keys compare equal."""
+    return int(year), int(period), str(store_location)
+
+
+def count_actions_per_file(combined: pd.DataFrame, actions: Dict[Tuple[int, int, str], str]) -> pd.DataFrame:
+    """
+    Attribute merge actions back to source files, indexed by file path.
+    actions maps key tuples to 'INSERT' or 'UPDATE'; keys not present are unchanged.
+    """
+    keys = [
+        key_tuple(y, p, s)
+        for y, p, s in zip(combined['YEAR'], combined['PERIOD'], combined['STORE_LOCATION'])
+    ]
+    action = pd.Series([actions.get(k, 'UNCHANGED') for k in keys], index=combined.index)
+    report = pd.crosstab(combined[SOURCE_FILE_COLUMN], action)
+    for col in ['INSERT', 'UPDATE', 'UNCHANGED']:
+        if col not in report.columns:
+            report[col] = 0
+    report = report[['INSERT', 'UPDATE', 'UNCHANGED']]
+    report.columns = ['inserted', 'updated', 'unchanged']
+    report.index.name = 'file'
+    return report
+
+
+def format_per_file(report: pd.DataFrame) -> str:
+    """Render a per-file report by file name, keeping the full path only where names collide."""
+    names = [get_filename_from_path(path) for path in report.index]
+    labels = [name if names.count(name) == 1 else path for name, path in zip(names, report.index)]
+    return report.set_axis(labels).rename_axis(report.index.name).to_string()
@@ -0,0 +1,86 @@
+import json
+import os
+import logging
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+import config
+from utils.warehouse import capture_changes, discard_changes, target_table_name
+
+logger = logging.getLogger(__name__)
+
+ACTION_INSERT = 'INSERT'
+ACTION_UPDATE = 'UPDATE'
+
+
+def new_load_id() -> str:
+    """Identify one load's rows in the change log: its start time, plus a random suffix for concurrent loads."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+def get_change_file_path(load_id: str) -> str:
+    """Return the local change file of a load into the target table of the active backend."""
+    return os.path.join(config.CHANGE_LOG_DIR, f"{target_table_name().lower()}_{load_id}.jsonl")
+
+
+def _change_record(row: tuple) -> dict:
+    """One change log row as a dict; CHANGED_VALUES arrives as JSON text from both backends."""
+    year, period, store_location, action, changed_values = row
+    record = {'YEAR': int(year), 'PERIOD': int(period), 'STORE_LOCATION': store_location, 'ACTION': action}
+    if changed_values is not None:
+        record['CHANGED_VALUES'] = json.loads(changed_values) if isinstance(changed_values, str) else changed_values
+    return record
+
+
+class ChangeCapture:
+    """
+    The (YEAR, PERIOD, STORE_LOCATION) keys one load inserts or updates, for downstream marts to
+    refresh only those. capture() runs on the load's session just before the MERGE or INSERT and
+    writes them to CHANGE_LOG_TABLE; write() copies them to a local JSONL file once the load has
+    committed, and discard() removes them from the table if it did not.
+    """
+
+    def __init__(self, deltas: bool = False):
+        self.load_id = new_load_id()
+        self.deltas = deltas
+        self.changes: Optional[List[dict]] = None
+        self.path: Optional[str] = None
+
+    def capture(self, conn, file_name: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                columns: Optional[List[str]] = None):
+        """columns are the updated columns of a partial update, whose MERGE only compares those."""
+        rows = capture_changes(conn, self.load_id, file_name, periods, self.deltas, columns)
+        self.changes = [_change_record(row) for row in rows]
+
+    def discard(self, conn):
+        """
+        Remove the captured rows of a load that failed before write(). Best effort: the load has
+        already failed, so a failure here is only logged.
+        """
+        if self.changes is None or self.path is not None:
+            return
+        try:
+            discard_changes(conn, self.load_id)
+        except Exception as e:
+            logger.warning(f"Could not discard change log rows of load {self.load_id}: {e}")
+
+    def counts(self) -> Tuple[int, int]:
+        """(keys_inserted, keys_updated) in the captured changes."""
+        inserted = sum(1 for change in self.changes or [] if change['ACTION'] == ACTION_INSERT)
+        return inserted, len(self.changes or []) - inserted
+
+    def write(self, change_path: Optional[str] = None) -> str:
+        """Write the captured changes to a JSONL file, one key per line in key order."""
+        change_path = change_path or get_change_file_path(self.load_id)
+        os.makedirs(os.path.dirname(change_path), exist_ok=True)
+        with open(change_path, 'w') as f:
+            for change in self.changes or []:
+                f.write(json.dumps({'LOAD_ID': self.load_id, **change}, default=str) + "\n")
+        self.path = change_path
+        logger.info(f"Wrote {len(self.changes or [])} changed keys to {change_path}")
+        return change_path
+
+    def print_summary(self):
+        inserted, updated = self.counts()
+        print(f"  Changed keys: {inserted} inserted, {updated} updated (load {self.load_id})")
+        print(f"  Change file: {self.path}")
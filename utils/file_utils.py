@@ -1,9 +1,68 @@
 import pandas as pd
+import numpy as np
 import os
-from datetime import datetime
+import fnmatch
+import importlib.util
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache, partial
+from typing import Iterator, List, Optional
+import config
 
-def read_excel_file(filepath: str) -> pd.DataFrame:
-    """Read Excel or CSV file and return DataFrame."""
+logger = logging.getLogger(__name__)
+
+# Column added to frames read from several sheets to remember which sheet a row came from
+SOURCE_SHEET_COLUMN = 'SOURCE_SHEET'
+
+EXCEL_ENGINES = {'.xlsx': 'openpyxl', '.xls': 'xlrd'}
+
+# Workbook reader engines (--reader-engine). 'auto' takes the first installed engine in
+# READER_FALLBACKS; an explicit engine that is not installed or cannot read the file's
+# format falls back the same way. Every engine returns the frame pandas' own reader would.
+READER_ENGINES = ('auto', 'calamine', 'openpyxl-readonly', 'openpyxl', 'xlrd')
+
+# Fastest first: calamine parses in Rust, openpyxl-readonly iterates cell values only,
+# openpyxl and xlrd are the pandas read_excel engines
+READER_FALLBACKS = {
+    '.xlsx': ('calamine', 'openpyxl-readonly', 'openpyxl'),
+    '.xls': ('calamine', 'xlrd'),
+}
+
+_ENGINE_MODULES = {'calamine': 'python_calamine', 'openpyxl-readonly': 'openpyxl', 'openpyxl': 'openpyxl',
+                   'xlrd': 'xlrd'}
+
+
+@lru_cache(maxsize=None)
+def reader_engine_installed(engine: str) -> bool:
+    return importlib.util.find_spec(_ENGINE_MODULES[engine]) is not None
+
+
+def resolve_reader_engine(ext: str, engine: Optional[str] = None) -> str:
+    """
+    Return the engine that reads ext files for the requested engine (default: config.READER_ENGINE).
+    If none of the fallbacks is installed the last one is returned, so pandas raises its usual ImportError.
+    """
+    engine = engine or config.READER_ENGINE
+    if engine not in READER_ENGINES:
+        raise ValueError(f"Unsupported reader engine: {engine}. Please use one of {', '.join(READER_ENGINES)}.")
+    fallbacks = READER_FALLBACKS[ext]
+    if engine in fallbacks and reader_engine_installed(engine):
+        return engine
+    resolved = next((name for name in fallbacks if reader_engine_installed(name)), fallbacks[-1])
+    if engine != 'auto':
+        reason = 'is not installed' if engine in fallbacks else f'cannot read {ext} files'
+        logger.warning(f"Reader engine '{engine}' {reason}; using '{resolved}'")
+    return resolved
+
+
+def read_excel_file(filepath: str, sheets: Optional[str] = None, max_workers: Optional[int] = None,
+                    engine: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read Excel or CSV file and return DataFrame.
+    With sheets, every workbook sheet matching the pattern is read (see read_excel_sheets);
+    otherwise only the first sheet. CSV files ignore sheets and engine.
+    """
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"File not found: {filepath}")
     
@@ -11,13 +70,14 @@ def read_excel_file(filepath: str) -> pd.DataFrame:
     _, ext = os.path.splitext(filepath)
     ext = ext.lower()
     
+    if sheets and ext in EXCEL_ENGINES:
+        return read_excel_sheets(filepath, sheets, max_workers, engine)
+    
     # Read file based on extension
     if ext == '.csv':
         df = pd.read_csv(filepath)
-    elif ext == '.xlsx':
-        df = pd.read_excel(filepath, engine='openpyxl')
-    elif ext == '.xls':
-        df = pd.read_excel(filepath, engine='xlrd')
+    elif ext in EXCEL_ENGINES:
+        df = read_workbook_sheet(filepath, 0, resolve_reader_engine(ext, engine))
     else:
         raise ValueError(f"Unsupported file extension: {ext}. Please use .csv, .xlsx, or .xls files.")
     
@@ -27,6 +87,282 @@ def read_excel_file(filepath: str) -> pd.DataFrame:
     return df
 
 
+def read_workbook_sheet(filepath: str, sheet_name, engine: str) -> pd.DataFrame:
+    """Read one sheet (name or index) with a resolved engine, before any column renaming."""
+    if engine in ('openpyxl', 'xlrd'):
+        return pd.read_excel(filepath, sheet_name=sheet_name, engine=engine)
+    if engine == 'calamine':
+        rows = _calamine_rows(filepath, sheet_name)
+    else:
+        rows = _openpyxl_value_rows(filepath, sheet_name)
+    return _frame_from_rows(rows)
+
+
+def _frame_from_rows(rows: list) -> pd.DataFrame:
+    """
+    Build the frame from converted cell values the way pd.read_excel does: trailing empty cells
+    and rows trimmed, rows padded to one width, then pandas' TextParser for the header, NA
+    strings and type inference, so every engine yields the same dtypes and values.
+    """
+    from pandas.io.parsers import TextParser
+    
+    data = []
+    last_row_with_data = -1
+    for row_number, row in enumerate(rows):
+        while row and row[-1] == '':
+            row.pop()
+        if row:
+            last_row_with_data = row_number
+        data.append(row)
+    data = data[:last_row_with_data + 1]
+    if not data:
+        return pd.DataFrame()
+    
+    width = max(len(row) for row in data)
+    data = [row + [''] * (width - len(row)) for row in data]
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+def _numeric_cell(value):
+    """Excel stores every number as a double; whole numbers come back as int, as in pandas."""
+    as_int = int(value)
+    return as_int if as_int == value else value
+
+
+def _openpyxl_value_rows(filepath: str, sheet_name) -> list:
+    """Cell values of one .xlsx sheet via openpyxl read-only, values-only iteration."""
+    from openpyxl import load_workbook
+    from openpyxl.cell.cell import ERROR_CODES
+    
+    wb = load_workbook(filepath, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        # Some writers record a wrong sheet size; read-only mode trusts it unless reset
+        ws.reset_dimensions()
+        rows = []
+        for row in ws.iter_rows(values_only=True):
+            converted = []
+            for value in row:
+                if value is None:
+                    value = ''
+                elif isinstance(value, float):
+                    value = _numeric_cell(value)
+                elif isinstance(value, str) and value in ERROR_CODES:
+                    # Values-only rows carry no cell type; formula errors read as NaN like pandas
+                    value = np.nan
+                converted.append(value)
+            rows.append(converted)
+        return rows
+    finally:
+        wb.close()
+
+
+def _calamine_rows(filepath: str, sheet_name) -> list:
+    """Cell values of one .xlsx or .xls sheet via the Rust calamine parser (python-calamine)."""
+    from python_calamine import CalamineWorkbook
+    
+    workbook = CalamineWorkbook.from_path(filepath)
+    try:
+        if isinstance(sheet_name, int):
+            sheet = workbook.get_sheet_by_index(sheet_name)
+        else:
+            sheet = workbook.get_sheet_by_name(sheet_name)
+        rows = []
+        for row in sheet.to_python(skip_empty_area=False):
+            converted = []
+            for value in row:
+                if isinstance(value, float):
+                    value = _numeric_cell(value)
+                elif isinstance(value, date) and not isinstance(value, datetime):
+                    # openpyxl returns midnight datetimes for date cells; calamine returns dates
+                    value = datetime(value.year, value.month, value.day)
+                converted.append(value)
+            rows.append(converted)
+        return rows
+    finally:
+        workbook.close()
+
+
+def workbook_sheet_names(filepath: str, engine: Optional[str] = None) -> List[str]:
+    """Return a workbook's sheet names in workbook order."""
+    _, ext = os.path.splitext(filepath)
+    engine = resolve_reader_engine(ext.lower(), engine)
+    if engine == 'calamine':
+        from python_calamine import CalamineWorkbook
+        workbook = CalamineWorkbook.from_path(filepath)
+        try:
+            return list(workbook.sheet_names)
+        finally:
+            workbook.close()
+    with pd.ExcelFile(filepath, engine=EXCEL_ENGINES[ext.lower()]) as workbook:
+        return workbook.sheet_names
+
+
+def select_sheets(filepath: str, sheets: str, engine: Optional[str] = None) -> List[str]:
+    """
+    Return the workbook's sheet names matching sheets, in workbook order.
+    sheets is a comma-separated list of case-insensitive wildcard patterns, e.g. "P*" or "East,West"; "*" selects all.
+    """
+    names = workbook_sheet_names(filepath, engine)
+    patterns = [pattern.strip().lower() for pattern in sheets.split(',') if pattern.strip()]
+    selected = [name for name in names if any(fnmatch.fnmatch(name.lower(), pattern) for pattern in patterns)]
+    if not selected:
+        raise ValueError(f"No sheet matches '{sheets}'. Sheets in {get_filename_from_path(filepath)}: {', '.join(names)}")
+    return selected
+
+
+def _read_sheet(filepath: str, engine: str, sheet_name: str) -> pd.DataFrame:
+    """Read one sheet with upper-cased column names. Runs inside a worker process."""
+    df = read_workbook_sheet(filepath, sheet_name, engine)
+    df.columns = df.columns.astype(str).str.upper().str.strip()
+    return df
+
+
+def read_excel_sheets(filepath: str, sheets: str, max_workers: Optional[int] = None,
+                      engine: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read the sheets matching sheets into one frame, one worker process per sheet, so a
+    13-sheet workbook takes about as long as its largest sheet given enough cores.
+    Rows keep their sheet name in SOURCE_SHEET_COLUMN for error messages. Sheets without
+    any key column (cover or notes sheets) are skipped; max_workers=1 reads in this process.
+    """
+    _, ext = os.path.splitext(filepath)
+    engine = resolve_reader_engine(ext.lower(), engine)
+    names = select_sheets(filepath, sheets, engine)
+    workers = min(len(names), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(partial(_read_sheet, filepath, engine), names))
+    else:
+        frames = [_read_sheet(filepath, engine, name) for name in names]
+    
+    tagged = []
+    for name, df in zip(names, frames):
+        if not set(config.KEY_COLUMNS) & set(df.columns):
+            logger.warning(f"Skipping sheet '{name}' of {filepath} - it has none of the key columns")
+            continue
+        missing = set(config.REQUIRED_COLUMNS) - set(df.columns)
+        if missing:
+            raise ValueError(f"Sheet '{name}' is missing required columns: {missing}")
+        logger.info(f"Read {len(df)} rows from sheet '{name}'")
+        tagged.append(df.assign(**{SOURCE_SHEET_COLUMN: name}))
+    if not tagged:
+        raise ValueError(f"None of the sheets matching '{sheets}' has the key columns {', '.join(config.KEY_COLUMNS)}")
+    
+    combined = pd.concat(tagged, ignore_index=True)
+    combined[SOURCE_SHEET_COLUMN] = combined[SOURCE_SHEET_COLUMN].astype('category')
+    return combined
+
+
 def get_filename_from_path(filepath: str) -> str:
     """Extract filename from full path."""
-    return os.path.basename(filepath)
\ No newline at end of file
+    return os.path.basename(filepath)
+
+
+def iter_file_chunks(filepath: str, chunk_size: int = None, engine: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream an Excel or CSV file as DataFrames of at most chunk_size rows.
+    Only config.REQUIRED_COLUMNS are kept; the index continues across chunks
+    so row numbers in validation errors match a full read.
+    """
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"File not found: {filepath}")
+    
+    chunk_size = chunk_size or config.STREAM_CHUNK_SIZE
+    _, ext = os.path.splitext(filepath)
+    ext = ext.lower()
+    
+    if ext == '.csv':
+        chunks = pd.read_csv(
+            filepath,
+            chunksize=chunk_size,
+            usecols=lambda col: col.upper().strip() in config.REQUIRED_COLUMNS
+        )
+    elif ext == '.xlsx':
+        # openpyxl read-only is the engine that streams rows from disk, so 'auto' streams with it
+        if (engine or config.READER_ENGINE) == 'auto':
+            engine = 'openpyxl-readonly'
+        chunks = _iter_xlsx_chunks(filepath, chunk_size, resolve_reader_engine(ext, engine))
+    elif ext == '.xls':
+        # Neither xlrd nor calamine streams rows, so .xls is read once and sliced
+        df = read_workbook_sheet(filepath, 0, resolve_reader_engine(ext, engine))
+        df.columns = df.columns.str.upper().str.strip()
+        df = df[[col for col in df.columns if col in config.REQUIRED_COLUMNS]]
+        chunks = (df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size))
+    else:
+        raise ValueError(f"Unsupported file extension: {ext}. Please use .csv, .xlsx, or .xls files.")
+    
+    for chunk in chunks:
+        chunk.columns = chunk.columns.str.upper().str.strip()
+        yield chunk
+
+
+def _iter_xlsx_chunks(filepath: str, chunk_size: int, engine: str = 'openpyxl-readonly') -> Iterator[pd.DataFrame]:
+    """
+    Read the first sheet of an .xlsx row by row: with calamine's row iterator for engine
+    'calamine', otherwise with openpyxl read-only row iteration.
+    """
+    if engine == 'calamine':
+        rows = _iter_calamine_rows(filepath)
+    else:
+        rows = _iter_openpyxl_rows(filepath)
+    try:
+        header = next(rows, None)
+        if header is None:
+            return
+        
+        # Keep only the positions of required columns
+        positions = []
+        columns = []
+        for i, name in enumerate(header):
+            name = str(name).upper().strip() if name is not None else ''
+            if name in config.REQUIRED_COLUMNS:
+                positions.append(i)
+                columns.append(name)
+        
+        buffer = []
+        start = 0
+        blank_rows = 0
+        for row in rows:
+            # Read-only sheets often report trailing blank rows, which a full read drops too. Blank
+            # rows are held back until a later row has data, so blank rows mid-sheet are kept and
+            # fail validation, and row numbers match a full read.
+            if all(v is None for v in row):
+                blank_rows += 1
+                continue
+            pending = [(None,) * len(positions)] * blank_rows
+            pending.append(tuple(row[i] if i < len(row) else None for i in positions))
+            blank_rows = 0
+            for values in pending:
+                buffer.append(values)
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=columns, index=pd.RangeIndex(start, start + len(buffer)))
+                    start += len(buffer)
+                    buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns, index=pd.RangeIndex(start, start + len(buffer)))
+    finally:
+        rows.close()
+
+
+def _iter_openpyxl_rows(filepath: str) -> Iterator[tuple]:
+    """Cell values of the first .xlsx sheet, one row at a time, via openpyxl read-only iteration."""
+    from openpyxl import load_workbook
+    
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _iter_calamine_rows(filepath: str) -> Iterator[tuple]:
+    """Cell values of the first sheet, one row at a time, via calamine; empty cells read as None."""
+    from python_calamine import CalamineWorkbook
+    
+    workbook = CalamineWorkbook.from_path(filepath)
+    try:
+        for row in workbook.get_sheet_by_index(0).iter_rows():
+            yield tuple(None if value == '' else value for value in row)
+    finally:
+        workbook.close()
@@ -0,0 +1,158 @@
+import json
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+import pandas as pd
+import config
+from utils import warehouse
+from utils.warehouse import fetch_loaded_files, insert_ledger_entries
+
+logger = logging.getLogger(__name__)
+
+OUTCOME_SUCCESS = 'SUCCESS'
+OUTCOME_FAILED = 'FAILED'
+
+
+def target_table_name() -> str:
+    """Fully qualified target table of the active backend; ledger entries only count for the table they loaded."""
+    return warehouse.target_table_name()
+
+
+def get_ledger_mirror_path() -> str:
+    """Return the local mirror of the load ledger, kept next to the target snapshot."""
+    return os.path.join(config.SNAPSHOT_DIR, f"{target_table_name().lower()}.ledger.jsonl")
+
+
+def describe_rows(df: pd.DataFrame) -> dict:
+    """Row count and key range of a validated frame, in ledger columns."""
+    return {
+        'ROW_COUNT': len(df),
+        'MIN_YEAR': int(df['YEAR'].min()),
+        'MAX_YEAR': int(df['YEAR'].max()),
+        'MIN_PERIOD': int(df['PERIOD'].min()),
+        'MAX_PERIOD': int(df['PERIOD'].max()),
+        'STORE_COUNT': int(df['STORE_LOCATION'].nunique())
+    }
+
+
+def describe_summary(summary: dict) -> dict:
+    """Row count and key range from a streamed validation summary, in ledger columns."""
+    return {
+        'ROW_COUNT': summary['rows'],
+        'MIN_YEAR': int(summary['year_min']),
+        'MAX_YEAR': int(summary['year_max']),
+        'MIN_PERIOD': int(summary['period_min']),
+        'MAX_PERIOD': int(summary['period_max']),
+        'STORE_COUNT': len(summary['stores'])
+    }
+
+
+def build_ledger_entry(filepath: str, checksum: str, description: dict, outcome: str,
+                       rows_inserted: Optional[int] = None, rows_updated: Optional[int] = None,
+                       error_message: Optional[str] = None) -> dict:
+    """Assemble one ledger row. description comes from describe_rows or describe_summary."""
+    return {
+        'FILE_NAME': os.path.basename(filepath),
+        'FILE_CHECKSUM': checksum,
+        'TARGET_TABLE': target_table_name(),
+        **description,
+        'ROWS_INSERTED': rows_inserted,
+        'ROWS_UPDATED': rows_updated,
+        'OUTCOME': outcome,
+        'ERROR_MESSAGE': error_message[:1000] if error_message else None
+    }
+
+
+def _read_mirror(mirror_path: Optional[str] = None) -> List[dict]:
+    mirror_path = mirror_path or get_ledger_mirror_path()
+    if not os.path.exists(mirror_path):
+        return []
+    entries = []
+    with open(mirror_path) as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries
+
+
+def append_to_mirror(entries: List[dict], mirror_path: Optional[str] = None):
+    """Append ledger entries to the local mirror, stamped with the local time."""
+    mirror_path = mirror_path or get_ledger_mirror_path()
+    os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+    loaded_at = datetime.now().astimezone().isoformat()
+    with open(mirror_path, 'a') as f:
+        for entry in entries:
+            f.write(json.dumps({**entry, 'LOADED_AT': entry.get('LOADED_AT') or loaded_at}) + '\n')
+
+
+def find_loaded_locally(checksums: List[str], mirror_path: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Return {checksum: latest successful entry} from the local mirror, without contacting the warehouse.
+    """
+    wanted = set(checksums)
+    loaded = {}
+    for entry in _read_mirror(mirror_path):
+        if (entry['FILE_CHECKSUM'] in wanted and entry['OUTCOME'] == OUTCOME_SUCCESS
+                and entry['TARGET_TABLE'] == target_table_name()):
+            loaded[entry['FILE_CHECKSUM']] = entry
+    return loaded
+
+
+def find_loaded_in_warehouse(conn, checksums: List[str]) -> Dict[str, dict]:
+    """
+    Return {checksum: entry} for files the warehouse ledger has as loaded, e.g. by another machine.
+    Hits are copied into the local mirror so the next run skips them without connecting.
+    """
+    loaded = {}
+    for checksum, file_name, loaded_at in fetch_loaded_files(conn, checksums, target_table_name()):
+        loaded[checksum] = {
+            'FILE_NAME': file_name,
+            'FILE_CHECKSUM': checksum,
+            'TARGET_TABLE': target_table_name(),
+            'OUTCOME': OUTCOME_SUCCESS,
+            'LOADED_AT': pd.Timestamp(loaded_at).isoformat()
+        }
+    if loaded:
+        append_to_mirror(list(loaded.values()))
+    return loaded
+
+
+def record_loads(conn, entries: List[dict]):
+    """Write entries to the warehouse ledger, then to the local mirror."""
+    insert_ledger_entries(conn, entries)
+    append_to_mirror(entries)
+
+
+def record_failed_loads(conn, entries: List[dict]):
+    """
+    Best-effort ledger write for a failed load. The mirror always gets the entries; a warehouse
+    error here is logged rather than raised so it never hides the error that failed the load.
+    """
+    if conn is not None:
+        try:
+            insert_ledger_entries(conn, entries)
+        except Exception as e:
+            logger.warning(f"Could not record failed load in the warehouse ledger: {e}")
+    append_to_mirror(entries)
+
+
+def record_committed_loads(conn, entries: List[dict]):
+    """
+    Best-effort ledger write for a load that has already committed to the target. Errors are
+    logged rather than raised: the load succeeded, and a rerun only merges it again.
+    """
+    try:
+        insert_ledger_entries(conn, entries)
+    except Exception as e:
+        logger.warning(f"Could not record committed load in the warehouse ledger: {e}")
+    try:
+        append_to_mirror(entries)
+    except Exception as e:
+        logger.warning(f"Could not record committed load in the local ledger mirror: {e}")
+
+
+def print_already_loaded(loaded: Dict[str, dict]):
+    """Print the files skipped because the ledger has them as loaded."""
+    for entry in loaded.values():
+        print(f"  - {entry['FILE_NAME']} (checksum {entry['FILE_CHECKSUM'][:12]}) loaded at {entry['LOADED_AT']}")
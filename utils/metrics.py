@@ -0,0 +1,234 @@
+import functools
+import json
+import os
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'financials_pipeline'
+
+
+class Span:
+    """One timed unit of work: a pipeline step or a Snowflake call inside it."""
+
+    def __init__(self, name: str, parent: Optional[str] = None):
+        self.name = name
+        self.parent = parent
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.duration = None
+        self.status = 'running'
+        self.attributes = {}
+
+    def end(self, status: str = 'ok'):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+            self.status = status
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': round(self.duration, 6) if self.duration is not None else None,
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+
+class RunMetrics:
+    """Spans and totals for one pipeline run."""
+
+    def __init__(self, pipeline: str, **attributes):
+        self.pipeline = pipeline
+        self.run_id = str(uuid.uuid4())
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.duration = None
+        self.success = None
+        self.attributes = dict(attributes)
+        self.spans = []
+        self._step = None
+        self._stack = []
+
+    def step(self, name: str) -> Span:
+        """Close the current pipeline step, if any, and start the next one."""
+        if self._step is not None:
+            self._step.end()
+        self._step = Span(name)
+        self._stack = [self._step]
+        self.spans.append(self._step)
+        return self._step
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a unit of work nested inside the current step."""
+        parent = self._stack[-1].name if self._stack else None
+        span = Span(name, parent)
+        self.spans.append(span)
+        self._stack.append(span)
+        try:
+            yield span
+            span.end()
+        except Exception:
+            span.end('error')
+            raise
+        finally:
+            self._stack.remove(span)
+
+    def record(self, **attributes):
+        """Attach attributes to the innermost open span, or to the run if none is open."""
+        target = self._stack[-1].attributes if self._stack else self.attributes
+        target.update(attributes)
+
+    def finish(self, success: bool):
+        if self._step is not None:
+            self._step.end('ok' if success else 'error')
+        self._stack = []
+        self.duration = time.perf_counter() - self._start
+        self.success = success
+
+    def to_dict(self) -> dict:
+        return {
+            'run_id': self.run_id,
+            'pipeline': self.pipeline,
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': round(self.duration, 6) if self.duration is not None else None,
+            'success': self.success,
+            'attributes': self.attributes,
+            'spans': [span.to_dict() for span in self.spans]
+        }
+
+
+# The run being recorded in this process; instrumentation is a no-op when it is None
+_current_run: Optional[RunMetrics] = None
+
+
+def start_run(pipeline: str, **attributes) -> RunMetrics:
+    global _current_run
+    _current_run = RunMetrics(pipeline, **attributes)
+    return _current_run
+
+
+def finish_run(success: bool) -> Optional[RunMetrics]:
+    global _current_run
+    run = _current_run
+    if run is not None:
+        run.finish(success)
+    _current_run = None
+    return run
+
+
+def step(name: str):
+    """Start the next pipeline step in the current run."""
+    if _current_run is not None:
+        _current_run.step(name)
+
+
+def record(**attributes):
+    """Attach attributes (rows, bytes, ...) to the innermost open span."""
+    if _current_run is not None:
+        _current_run.record(**attributes)
+
+
+def record_run(**attributes):
+    """Attach attributes (input file, totals, ...) to the current run itself."""
+    if _current_run is not None:
+        _current_run.attributes.update(attributes)
+
+
+def record_query(cursor):
+    """Append the Snowflake query ID of the statement a cursor just ran to the innermost span."""
+    if _current_run is None:
+        return
+    query_id = getattr(cursor, 'sfqid', None)
+    if query_id:
+        target = _current_run._stack[-1].attributes if _current_run._stack else _current_run.attributes
+        target.setdefault('query_ids', []).append(query_id)
+
+
+def traced(name: str):
+    """Decorator that wraps a function call in a span of the current run."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_run is None:
+                return fn(*args, **kwargs)
+            with _current_run.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _write_atomic(path: str, content: str):
+    """Write via a temp file and rename so readers never see a half-written file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_json_report(run: RunMetrics, path: str):
+    """Write the full run report, every span included, as JSON."""
+    _write_atomic(path, json.dumps(run.to_dict(), indent=2, default=str))
+    logger.info(f"Run report written to {path}")
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prometheus_textfile(run: RunMetrics, path: str):
+    """
+    Write run metrics in the Prometheus text format for node_exporter's textfile collector.
+    Durations of spans sharing a name (e.g. one call per batch) are summed.
+    """
+    pipeline = _escape(run.pipeline)
+    step_seconds, call_seconds, step_rows = {}, {}, {}
+    bytes_uploaded = 0
+    for span in run.spans:
+        seconds = span.duration or 0.0
+        if span.parent is None:
+            step_seconds[span.name] = step_seconds.get(span.name, 0.0) + seconds
+            if 'rows' in span.attributes:
+                step_rows[span.name] = span.attributes['rows']
+        else:
+            call_seconds[span.name] = call_seconds.get(span.name, 0.0) + seconds
+        bytes_uploaded += span.attributes.get('bytes', 0)
+
+    lines = []
+
+    def metric(name: str, help_text: str, samples: list):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        for labels, value in samples:
+            label_text = ','.join([f'pipeline="{pipeline}"'] + [f'{k}="{_escape(v)}"' for k, v in labels.items()])
+            lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}")
+
+    metric('step_duration_seconds', 'Wall time of each pipeline step in the last run.',
+           [({'step': name}, round(value, 6)) for name, value in step_seconds.items()])
+    metric('snowflake_call_duration_seconds', 'Wall time of each Snowflake call in the last run.',
+           [({'call': name}, round(value, 6)) for name, value in call_seconds.items()])
+    metric('step_rows', 'Rows handled by each pipeline step in the last run.',
+           [({'step': name}, value) for name, value in step_rows.items()])
+    metric('bytes_uploaded', 'Bytes uploaded to the Snowflake stage in the last run.', [({}, bytes_uploaded)])
+    for name in ['rows_inserted', 'rows_updated']:
+        if name in run.attributes:
+            metric(name, f"Rows {name.split('_')[1]} by the MERGE in the last run.", [({}, run.attributes[name])])
+    if 'landing_latency_seconds' in run.attributes:
+        metric('landing_latency_seconds', 'Seconds from the file landing to its rows being merged, in watch mode.',
+               [({}, run.attributes['landing_latency_seconds'])])
+    metric('run_duration_seconds', 'Wall time of the last run.', [({}, round(run.duration or 0.0, 6))])
+    metric('run_success', '1 if the last run succeeded, 0 otherwise.', [({}, 1 if run.success else 0)])
+    metric('last_run_timestamp_seconds', 'Unix time the last run started.', [({}, round(run.started_at.timestamp(), 3))])
+
+    _write_atomic(path, '\n'.join(lines) + '\n')
+    logger.info(f"Prometheus metrics written to {path}")
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import logging
+import pandas as pd
+from typing import Optional
+import config
+from utils.validation import VALIDATION_RULES
+from utils.schema import compact_frame
+
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of cached frames changes so old entries stop matching
+CACHE_FORMAT_VERSION = 2
+
+_READ_BLOCK_SIZE = 1024 * 1024
+
+
+def _rules_fingerprint() -> str:
+    """Digest of everything validation depends on, so a rule or range change invalidates the cache."""
+    settings = {
+        'version': CACHE_FORMAT_VERSION,
+        'columns': config.STAGED_COLUMNS,
+        'years': [config.MIN_YEAR, config.MAX_YEAR],
+        'periods': [config.MIN_PERIOD, config.MAX_PERIOD],
+        'rules': [rule.name for rule in VALIDATION_RULES]
+    }
+    return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+
+
+def file_content_hash(filepath: str) -> str:
+    """Return the SHA-256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(_READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(filepath: str, sheets: Optional[str] = None) -> str:
+    """Key a parsed file by its content, extension, sheet selection and the current validation rules."""
+    _, ext = os.path.splitext(filepath)
+    digest = hashlib.sha256()
+    digest.update(file_content_hash(filepath).encode())
+    digest.update(ext.lower().encode())
+    digest.update(_rules_fingerprint().encode())
+    if sheets:
+        digest.update(f"sheets={sheets}".encode())
+    return digest.hexdigest()
+
+
+def _cache_path(key: str, cache_dir: Optional[str] = None) -> str:
+    return os.path.join(cache_dir or config.PARSE_CACHE_DIR, f"{key}.parquet")
+
+
+def load_cached_frame(filepath: str, cache_dir: Optional[str] = None,
+                      dtype_backend: Optional[str] = None, sheets: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Return the validated frame cached for this file's content, or None on a miss.
+    A hit refreshes the entry's modification time, which is what LRU eviction orders by.
+    The frame comes back in the compact schema of the requested dtype backend.
+    """
+    path = _cache_path(cache_key(filepath, sheets), cache_dir)
+    try:
+        df = pd.read_parquet(path)
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable parse cache entry {path}: {e}")
+        return None
+    compact_frame(df, dtype_backend)
+    logger.info(f"Parse cache hit for {filepath} ({len(df)} rows)")
+    return df
+
+
+def store_cached_frame(filepath: str, df: pd.DataFrame, cache_dir: Optional[str] = None,
+                       max_bytes: Optional[int] = None, sheets: Optional[str] = None):
+    """Cache a validated frame under the file's content key, then evict down to max_bytes."""
+    cache_dir = cache_dir or config.PARSE_CACHE_DIR
+    path = _cache_path(cache_key(filepath, sheets), cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df[config.STAGED_COLUMNS].to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        # Caching is an optimization; a column pyarrow cannot store must not fail the load
+        logger.warning(f"Could not cache parsed frame for {filepath}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict_cache(cache_dir, max_bytes)
+
+
+def evict_cache(cache_dir: Optional[str] = None, max_bytes: Optional[int] = None) -> int:
+    """
+    Delete least recently used entries until the cache fits in max_bytes.
+    Returns: number of entries removed
+    """
+    cache_dir = cache_dir or config.PARSE_CACHE_DIR
+    max_bytes = config.PARSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.parquet'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Another worker evicted it first
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"Evicted {removed} parse cache entries to stay under {max_bytes} bytes")
+    return removed
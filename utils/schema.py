@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+import config
+
+# dtype backends a validated frame can be held in
+DTYPE_BACKENDS = ('numpy', 'pyarrow')
+
+# Money columns are held as fixed-point cents after validation
+MONEY_COLUMNS = config.FINANCIAL_COLUMNS
+
+# Low-cardinality text columns held as categoricals
+CATEGORY_COLUMNS = ['STORE_LOCATION', 'OPENED']
+
+
+def _check_backend(dtype_backend: Optional[str]) -> str:
+    dtype_backend = dtype_backend or config.DTYPE_BACKEND
+    if dtype_backend not in DTYPE_BACKENDS:
+        raise ValueError(f"Unsupported dtype backend: {dtype_backend}. Please use one of {', '.join(DTYPE_BACKENDS)}.")
+    return dtype_backend
+
+
+def compact_dtypes(dtype_backend: Optional[str] = None) -> Dict[str, object]:
+    """
+    Target dtype for each required column of a validated frame.
+    Money is nullable int64 cents, YEAR and PERIOD the smallest integers that hold their
+    validated ranges, and the text columns categoricals.
+    """
+    if _check_backend(dtype_backend) == 'pyarrow':
+        import pyarrow as pa
+        money = pd.ArrowDtype(pa.int64())
+        types = {'YEAR': pd.ArrowDtype(pa.int16()), 'PERIOD': pd.ArrowDtype(pa.int8())}
+    else:
+        money = pd.Int64Dtype()
+        types = {'YEAR': np.dtype('int16'), 'PERIOD': np.dtype('int8')}
+    types.update({col: pd.CategoricalDtype() for col in CATEGORY_COLUMNS})
+    return {col: types.get(col, money) for col in config.REQUIRED_COLUMNS}
+
+
+def is_cents(values: pd.Series) -> bool:
+    """
+    True if a money column already holds cents. Only the nullable and Arrow integer dtypes
+    set by compact_frame count; a plain int64 column read from a file is whole dollars.
+    """
+    return isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(values.dtype)
+
+
+def to_cents(values: pd.Series, dtype) -> pd.Series:
+    """Convert a numeric money column in dollars to integer cents, keeping NULLs."""
+    cents = values.to_numpy(dtype='float64', na_value=np.nan) * 100
+    np.round(cents, out=cents)
+    missing = np.isnan(cents)
+    cents[missing] = 0
+    data = cents.astype('int64')
+    if isinstance(dtype, pd.ArrowDtype):
+        import pyarrow as pa
+        return pd.Series(pd.arrays.ArrowExtensionArray(pa.array(data, mask=missing)), index=values.index)
+    return pd.Series(pd.arrays.IntegerArray(data, missing), index=values.index)
+
+
+def to_dollars(values: pd.Series) -> np.ndarray:
+    """Return a money column as float64 dollars, whether it holds cents or dollars."""
+    dollars = values.to_numpy(dtype='float64', na_value=np.nan)
+    return dollars / 100 if is_cents(values) else dollars
+
+
+def cents_array(values: pd.Series, na_value: int) -> np.ndarray:
+    """Return a money column as a plain int64 cents array, with NULLs replaced by na_value."""
+    if is_cents(values):
+        return values.to_numpy(dtype='int64', na_value=na_value)
+    cents = np.round(values.to_numpy(dtype='float64', na_value=np.nan) * 100)
+    return np.where(np.isnan(cents), na_value, cents).astype('int64')
+
+
+def compact_frame(df: pd.DataFrame, dtype_backend: Optional[str] = None):
+    """
+    Convert a validated frame to the compact schema in place, one column at a time so at
+    most one extra column is alive. Columns already compact are left alone, so it is safe
+    to call again, e.g. to switch a cached frame to another backend. Columns a partial
+    update does not supply are skipped.
+    """
+    for col, dtype in compact_dtypes(dtype_backend).items():
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if values.dtype == dtype:
+            continue
+        if col in MONEY_COLUMNS:
+            df[col] = values.astype(dtype) if is_cents(values) else to_cents(values, dtype)
+        elif col == 'OPENED' and values.dtype != object:
+            # Dates parsed by the reader stay as they are so staging and the row hash see them unchanged
+            continue
+        else:
+            df[col] = values.astype(dtype)
+
+
+def as_text(values: pd.Series) -> pd.Series:
+    """Return a text column as str values, keeping NULLs; categoricals are expanded first."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    return values.where(values.isna(), values.astype(str))
+
+
+def with_dollars(df: pd.DataFrame) -> pd.DataFrame:
+    """Return df with any cents money columns as float64 dollars, for display."""
+    dollars = {col: to_dollars(df[col]) for col in MONEY_COLUMNS if col in df.columns and is_cents(df[col])}
+    return df.assign(**dollars) if dollars else df
+
+
+def memory_per_row(df: pd.DataFrame) -> float:
+    """Bytes per row, counting the Python objects behind object columns."""
+    return df.memory_usage(deep=True, index=False).sum() / len(df) if len(df) else 0.0
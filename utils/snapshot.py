@@ -0,0 +1,135 @@
+import json
+import os
+import logging
+import pandas as pd
+from typing import Optional, Tuple
+import config
+from utils.warehouse import fetch_target_hashes, target_table_name
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_COLUMNS = config.KEY_COLUMNS + [config.ROW_HASH_COLUMN]
+
+
+def get_snapshot_path() -> str:
+    """Return the local snapshot file for the target table of the active backend."""
+    return os.path.join(config.SNAPSHOT_DIR, f"{target_table_name().lower()}.parquet")
+
+
+def _watermark_path(snapshot_path: str) -> str:
+    return snapshot_path.replace('.parquet', '.watermark.json')
+
+
+def _normalize_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast key columns to the types stored in the snapshot so joins line up."""
+    return df.assign(
+        YEAR=df['YEAR'].astype('int64'),
+        PERIOD=df['PERIOD'].astype('int64'),
+        STORE_LOCATION=df['STORE_LOCATION'].astype(str)
+    )
+
+
+def load_snapshot(snapshot_path: Optional[str] = None) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Load the local snapshot of target keys and row hashes.
+    Returns: (snapshot_dataframe, watermark) - an empty frame and None if no snapshot exists yet
+    """
+    snapshot_path = snapshot_path or get_snapshot_path()
+    if not os.path.exists(snapshot_path):
+        empty = pd.DataFrame({
+            'YEAR': pd.Series(dtype='int64'),
+            'PERIOD': pd.Series(dtype='int64'),
+            'STORE_LOCATION': pd.Series(dtype=object),
+            config.ROW_HASH_COLUMN: pd.Series(dtype='Int64')
+        })
+        return empty, None
+
+    snapshot = pd.read_parquet(snapshot_path)
+    watermark = None
+    if os.path.exists(_watermark_path(snapshot_path)):
+        with open(_watermark_path(snapshot_path)) as f:
+            watermark = json.load(f).get('watermark')
+    return snapshot, watermark
+
+
+def save_snapshot(snapshot: pd.DataFrame, watermark: Optional[str], snapshot_path: Optional[str] = None):
+    """Write the snapshot and its watermark to disk."""
+    snapshot_path = snapshot_path or get_snapshot_path()
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    snapshot[SNAPSHOT_COLUMNS].to_parquet(snapshot_path, index=False)
+    with open(_watermark_path(snapshot_path), 'w') as f:
+        json.dump({'watermark': watermark}, f)
+
+
+def _upsert(snapshot: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """Replace snapshot rows with the same keys as rows, and append new keys."""
+    rows = _normalize_keys(rows[SNAPSHOT_COLUMNS]).astype({config.ROW_HASH_COLUMN: 'Int64'})
+    combined = pd.concat([snapshot.astype({config.ROW_HASH_COLUMN: 'Int64'}), rows], ignore_index=True)
+    return combined.drop_duplicates(subset=config.KEY_COLUMNS, keep='last').reset_index(drop=True)
+
+
+def refresh_snapshot(conn, snapshot_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Bring the local snapshot up to date with the target table.
+    Only rows created or updated since the stored watermark are fetched. Rows deleted
+    from the target are not detected; delete the snapshot file to rebuild it from scratch.
+    """
+    snapshot, watermark = load_snapshot(snapshot_path)
+    rows = fetch_target_hashes(conn, since=watermark)
+    if not rows:
+        return snapshot
+
+    # object dtype keeps hashes exact; with any NULL hash pandas would infer float64 and round them
+    fetched = pd.DataFrame(rows, columns=SNAPSHOT_COLUMNS + ['CHANGED_AT'], dtype=object)
+    snapshot = _upsert(snapshot, fetched)
+    # Watermark is inclusive (>=), so rows sharing the max timestamp are re-fetched next time
+    new_watermark = pd.Timestamp(fetched['CHANGED_AT'].max()).isoformat()
+    save_snapshot(snapshot, new_watermark, snapshot_path)
+    logger.info(f"Snapshot refreshed: {len(fetched)} changed rows, {len(snapshot)} keys, watermark {new_watermark}")
+    return snapshot
+
+
+def record_loaded_rows(df: pd.DataFrame, snapshot_path: Optional[str] = None):
+    """
+    Apply rows that were just merged to the local snapshot without advancing the watermark,
+    so a --preview right after a load already reflects it.
+    """
+    snapshot, watermark = load_snapshot(snapshot_path)
+    save_snapshot(_upsert(snapshot, df), watermark, snapshot_path)
+
+
+def diff_against_snapshot(df: pd.DataFrame, snapshot: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split validated rows into those new to the target and those whose ROW_HASH differs.
+    Snapshot rows without a hash (loaded before ROW_HASH existed) count as changed.
+    Returns: (insert_rows, update_rows) as slices of df
+    """
+    keys = _normalize_keys(df[config.KEY_COLUMNS])
+    # Nullable Int64 keeps hashes exact; a float column would round them
+    known = keys.merge(
+        snapshot.astype({config.ROW_HASH_COLUMN: 'Int64'}).rename(columns={config.ROW_HASH_COLUMN: 'SNAPSHOT_HASH'}),
+        on=config.KEY_COLUMNS, how='left', indicator=True
+    )
+    known.index = df.index
+
+    is_new = known['_merge'] == 'left_only'
+    hash_differs = known['SNAPSHOT_HASH'].ne(df[config.ROW_HASH_COLUMN]).fillna(True).astype(bool)
+    is_changed = ~is_new & hash_differs
+    return df[is_new], df[is_changed]
+
+
+def print_delta_preview(inserts: pd.DataFrame, updates: pd.DataFrame, total_rows: int, watermark: Optional[str]):
+    """Print the exact keys a delta load would insert and update."""
+    print("\n" + "="*60)
+    print("DELTA PREVIEW (local snapshot, warehouse not contacted)")
+    print("="*60)
+    print(f"Snapshot watermark: {watermark or 'no snapshot - every row counts as new'}")
+    print(f"Rows in file: {total_rows}")
+    print(f"Rows to insert: {len(inserts)}")
+    print(f"Rows to update: {len(updates)}")
+    print(f"Rows unchanged (skipped): {total_rows - len(inserts) - len(updates)}")
+    for label, rows in [('INSERT', inserts), ('UPDATE', updates)]:
+        if len(rows) > 0:
+            print(f"\n{label} keys:")
+            print(rows[config.KEY_COLUMNS].to_string(index=False))
+    print("="*60 + "\n")
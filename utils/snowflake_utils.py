@@ -1,35 +1,264 @@
-import snowflake.connector
-from snowflake.connector import DictCursor
 import config
 import pandas as pd
-from typing import Optional
+from typing import List, Optional, IO, Iterable, Tuple
+import functools
 import logging
+import os
+import time
+import weakref
+from utils.staging import (
+    RAW_STAGE_FORMAT,
+    RAW_STAGED_COLUMNS,
+    file_format_clause,
+    copy_source,
+    is_stage_directory,
+    stage_part_pattern
+)
+from utils.metrics import traced, record, record_query
 
 logger = logging.getLogger(__name__)
 
-def get_snowflake_connection():
-    """Create and return Snowflake connection."""
+# Public functions take cfg, the config module to run against (e.g. config_sandbox); it defaults to config
+
+# Warm connections kept for the life of the process, keyed by connection settings
+# so sandbox and production never share a session: {key: (conn, last_checked)}
+_connections = {}
+
+# Statements already run on each open session, so set-up DDL runs once per session and temp
+# tables created by it are emptied and reused: {conn: set of SQL}. Entries go with their connection.
+_session_statements = weakref.WeakKeyDictionary()
+
+
+def _connection_key(cfg=None) -> tuple:
+    cfg = cfg or config
+    return tuple(sorted((k, str(v)) for k, v in cfg.SNOWFLAKE_CONFIG.items()))
+
+
+def _is_healthy(conn) -> bool:
+    """Check that a connection is open and the session still answers queries."""
+    if conn.is_closed():
+        return False
+    cursor = None
     try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        return True
+    except Exception as e:
+        logger.warning(f"Snowflake health check failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+
+
+@traced('snowflake.connect')
+def get_snowflake_connection(cfg=None):
+    """
+    Return a Snowflake connection, reusing the warm one from earlier calls in this process.
+    A cached connection idle longer than CONNECTION_HEALTH_CHECK_SECONDS is pinged first
+    and replaced if it no longer works. Across processes, SSO runs reuse the ID token
+    cached by the connector (client_store_temporary_credential) instead of opening a browser.
+    """
+    cfg = cfg or config
+    key = _connection_key(cfg)
+    cached = _connections.get(key)
+    if cached:
+        conn, last_checked = cached
+        idle = time.monotonic() - last_checked
+        if (idle < cfg.CONNECTION_HEALTH_CHECK_SECONDS and not conn.is_closed()) or _is_healthy(conn):
+            _connections[key] = (conn, time.monotonic())
+            logger.info("Reusing Snowflake connection")
+            return conn
+        logger.warning("Cached Snowflake connection is no longer usable - reconnecting")
+        _connections.pop(key, None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    try:
+        # Imported on first connect so validation-only runs never load the connector
+        import snowflake.connector
         conn = snowflake.connector.connect(
-            **config.SNOWFLAKE_CONFIG
+            **cfg.SNOWFLAKE_CONFIG
         )
         logger.info("Successfully connected to Snowflake")
+        _connections[key] = (conn, time.monotonic())
         return conn
     except Exception as e:
         logger.error(f"Failed to connect to Snowflake: {e}")
         raise
 
 
-def create_stage_if_not_exists(conn):
-    """Create internal stage for file uploads if it doesn't exist."""
+def close_snowflake_connection():
+    """Close every connection cached by get_snowflake_connection."""
+    for conn, _ in list(_connections.values()):
+        _session_statements.pop(conn, None)
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing Snowflake connection: {e}")
+    _connections.clear()
+
+
+def _execute_batch(cursor, statements: List[str], params: Optional[dict] = None) -> list:
+    """
+    Send statements to Snowflake in one round trip as a multi-statement request; they run in order
+    and the first failure stops the rest. params are bound into every statement.
+    Returns: the result rows of each statement, in order
+    """
+    if len(statements) == 1:
+        cursor.execute(statements[0], params)
+    else:
+        cursor.execute(";\n".join(statements), params, num_statements=len(statements))
+    record_query(cursor)
+    results = [cursor.fetchall()]
+    while cursor.nextset():
+        results.append(cursor.fetchall())
+    return results
+
+
+@traced('snowflake.submit')
+def submit_query(conn, statements: List[str]) -> str:
+    """
+    Start statements as one asynchronous request (multi-statement if several) and return its
+    query ID without waiting, so long steps on several sessions can run at the same time.
+    """
     cursor = conn.cursor()
     try:
-        create_stage_sql = f"""
-        CREATE STAGE IF NOT EXISTS {config.SNOWFLAKE_DATABASE}.{config.SNOWFLAKE_SCHEMA}.{config.STAGE_NAME}
-        FILE_FORMAT = (TYPE = 'CSV' FIELD_OPTIONALLY_ENCLOSED_BY = '"' SKIP_HEADER = 1);
+        if len(statements) == 1:
+            cursor.execute_async(statements[0])
+        else:
+            cursor.execute_async(";\n".join(statements), num_statements=len(statements))
+        record_query(cursor)
+        logger.info(f"Submitted query {cursor.sfqid}")
+        return cursor.sfqid
+    except Exception as e:
+        logger.error(f"Error submitting query: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def poll_query(conn, query_id: str) -> Optional[list]:
+    """
+    Check a query started by submit_query. Raises if it failed.
+    Returns: None while it is still running, then the result rows of each statement, in order
+    """
+    if conn.is_still_running(conn.get_query_status_throw_if_error(query_id)):
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.get_results_from_sfqid(query_id)
+        results = [cursor.fetchall()]
+        while cursor.nextset():
+            results.append(cursor.fetchall())
+        return results
+    finally:
+        cursor.close()
+
+
+def _create_or_truncate(cursor, conn, table: str, create_sql: str):
+    """
+    Create a session temp table with create_sql the first time, and TRUNCATE it on every later
+    call on the same session: one cheap statement instead of dropping and recreating it per load.
+    """
+    done = _session_statements.setdefault(conn, set())
+    if create_sql in done:
+        cursor.execute(f"TRUNCATE TABLE {table}")
+        record_query(cursor)
+        logger.info(f"Truncated temporary table {table} for reuse")
+        return
+    cursor.execute(create_sql)
+    record_query(cursor)
+    done.add(create_sql)
+    logger.info(f"Created temporary table {table}")
+
+
+def _stage_ddl(cfg) -> str:
+    return f"""
+        CREATE STAGE IF NOT EXISTS {cfg.SNOWFLAKE_DATABASE}.{cfg.SNOWFLAKE_SCHEMA}.{cfg.STAGE_NAME}
+        FILE_FORMAT = (TYPE = 'CSV' FIELD_OPTIONALLY_ENCLOSED_BY = '"' SKIP_HEADER = 1)
+        """
+
+
+def _row_hash_column_ddl(cfg) -> str:
+    return f"ALTER TABLE {cfg.TARGET_TABLE} ADD COLUMN IF NOT EXISTS {cfg.ROW_HASH_COLUMN} NUMBER(19,0)"
+
+
+def _ledger_ddl(cfg) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {cfg.LEDGER_TABLE} (
+            FILE_NAME VARCHAR,
+            FILE_CHECKSUM VARCHAR(64),
+            TARGET_TABLE VARCHAR,
+            ROW_COUNT NUMBER,
+            MIN_YEAR NUMBER,
+            MAX_YEAR NUMBER,
+            MIN_PERIOD NUMBER,
+            MAX_PERIOD NUMBER,
+            STORE_COUNT NUMBER,
+            ROWS_INSERTED NUMBER,
+            ROWS_UPDATED NUMBER,
+            OUTCOME VARCHAR,
+            ERROR_MESSAGE VARCHAR,
+            LOADED_AT TIMESTAMP_TZ DEFAULT CURRENT_TIMESTAMP()
+        )
+        """
+
+
+def _change_log_ddl(cfg) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {cfg.CHANGE_LOG_TABLE} (
+            LOAD_ID VARCHAR,
+            FILE_NAME VARCHAR,
+            TARGET_TABLE VARCHAR,
+            YEAR NUMBER,
+            PERIOD NUMBER,
+            STORE_LOCATION VARCHAR,
+            ACTION VARCHAR,
+            CHANGED_VALUES VARIANT,
+            CAPTURED_AT TIMESTAMP_TZ DEFAULT CURRENT_TIMESTAMP()
+        )
         """
-        cursor.execute(create_stage_sql)
-        logger.info(f"Stage {config.STAGE_NAME} is ready")
+
+
+@traced('snowflake.prepare_session')
+def prepare_session(conn, cfg=None):
+    """
+    Set up everything a load needs before its PUT: the stage, the ROW_HASH column and the load
+    ledger, sent as one multi-statement request. Runs once per session; later calls on the same
+    connection (e.g. each load of a watch daemon) send nothing.
+    """
+    cfg = cfg or config
+    done = _session_statements.setdefault(conn, set())
+    statements = [sql for sql in (_stage_ddl(cfg), _row_hash_column_ddl(cfg), _ledger_ddl(cfg)) if sql not in done]
+    if not statements:
+        logger.info("Session is already set up")
+        return
+    cursor = conn.cursor()
+    try:
+        _execute_batch(cursor, statements)
+        done.update(statements)
+        record(statements=len(statements))
+        logger.info(f"Stage {cfg.STAGE_NAME}, column {cfg.ROW_HASH_COLUMN} and ledger {cfg.LEDGER_TABLE} are ready")
+    except Exception as e:
+        logger.error(f"Error setting up session: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.create_stage')
+def create_stage_if_not_exists(conn, cfg=None):
+    """Create internal stage for file uploads if it doesn't exist."""
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(_stage_ddl(cfg))
+        record_query(cursor)
+        logger.info(f"Stage {cfg.STAGE_NAME} is ready")
     except Exception as e:
         logger.error(f"Error creating stage: {e}")
         raise
@@ -37,12 +266,20 @@ def create_stage_if_not_exists(conn):
         cursor.close()
 
 
-def upload_to_stage(conn, local_file: str, stage_file: str):
-    """Upload file to Snowflake stage."""
+@traced('snowflake.put')
+def upload_to_stage(conn, local_file: str, stage_file: str, file_stream: Optional[IO[bytes]] = None, cfg=None):
+    """
+    Upload file to Snowflake stage.
+    If file_stream is given it is uploaded directly and local_file is only used as the staged file name.
+    Files are compressed by the caller, so AUTO_COMPRESS stays off.
+    """
+    cfg = cfg or config
     cursor = conn.cursor()
     try:
-        put_sql = f"PUT file://{local_file} @{config.STAGE_NAME}/{stage_file} AUTO_COMPRESS=FALSE OVERWRITE=TRUE"
-        cursor.execute(put_sql)
+        put_sql = f"PUT file://{local_file} @{cfg.STAGE_NAME}/{stage_file} AUTO_COMPRESS=FALSE OVERWRITE=TRUE"
+        cursor.execute(put_sql, file_stream=file_stream)
+        record_query(cursor)
+        record(bytes=file_stream.getbuffer().nbytes if hasattr(file_stream, 'getbuffer') else os.path.getsize(local_file))
         logger.info(f"Uploaded {local_file} to stage")
     except Exception as e:
         logger.error(f"Error uploading to stage: {e}")
@@ -51,104 +288,898 @@ def upload_to_stage(conn, local_file: str, stage_file: str):
         cursor.close()
 
 
-def create_temp_table(conn):
-    """Create temporary table for staging data."""
+@traced('snowflake.put_parts')
+def upload_parts_to_stage(conn, local_dir: str, stage_dir: str, stage_format: str, cfg=None):
+    """
+    Upload every part file written to local_dir into the stage directory stage_dir with one
+    PUT; the connector uploads STAGE_PUT_PARALLEL files at a time.
+    Returns: the staged reference for load_stage_to_temp (stage_dir ending in '/')
+    """
+    cfg = cfg or config
     cursor = conn.cursor()
+    stage_dir = stage_dir.rstrip('/') + '/'
+    # The connector wants forward slashes in local paths, also on Windows
+    local_pattern = os.path.join(os.path.abspath(local_dir), f"part_*.{stage_format}").replace('\\', '/')
     try:
-        # Drop if exists
-        cursor.execute(f"DROP TABLE IF EXISTS {config.TEMP_TABLE}")
-        
-        # Create temp table with same structure as target
-        create_sql = f"""
-        CREATE TEMPORARY TABLE {config.TEMP_TABLE} LIKE {config.TARGET_TABLE}
-        """
-        cursor.execute(create_sql)
-        logger.info(f"Created temporary table {config.TEMP_TABLE}")
+        put_sql = (f"PUT file://{local_pattern} @{cfg.STAGE_NAME}/{stage_dir} "
+                   f"AUTO_COMPRESS=FALSE OVERWRITE=TRUE PARALLEL={cfg.STAGE_PUT_PARALLEL}")
+        cursor.execute(put_sql)
+        record_query(cursor)
+        parts = [name for name in os.listdir(local_dir) if name.endswith(f".{stage_format}")]
+        record(bytes=sum(os.path.getsize(os.path.join(local_dir, name)) for name in parts), files=len(parts))
+        logger.info(f"Uploaded {len(parts)} parts to stage directory {stage_dir}")
+        return stage_dir
     except Exception as e:
-        logger.error(f"Error creating temp table: {e}")
+        logger.error(f"Error uploading parts to stage: {e}")
         raise
     finally:
         cursor.close()
 
 
-def load_stage_to_temp(conn, stage_file: str):
-    """Load data from stage to temporary table."""
+@traced('snowflake.ensure_row_hash_column')
+def ensure_row_hash_column(conn, cfg=None):
+    """Add the ROW_HASH column to the target table if it is missing."""
+    cfg = cfg or config
     cursor = conn.cursor()
     try:
-        # Build the column list (exclude audit columns from COPY)
-        data_columns = ", ".join(config.REQUIRED_COLUMNS)
-        
-        copy_sql = f"""
-        COPY INTO {config.TEMP_TABLE} ({data_columns})
-        FROM @{config.STAGE_NAME}/{stage_file}
-        FILE_FORMAT = (TYPE = 'CSV' FIELD_OPTIONALLY_ENCLOSED_BY = '"' SKIP_HEADER = 1)
-        ON_ERROR = 'ABORT_STATEMENT'
-        """
-        cursor.execute(copy_sql)
-        result = cursor.fetchone()
-        logger.info(f"Loaded data to temp table: {result}")
-        return result
+        cursor.execute(_row_hash_column_ddl(cfg))
+        record_query(cursor)
+        logger.info(f"Column {cfg.ROW_HASH_COLUMN} is ready on {cfg.TARGET_TABLE}")
     except Exception as e:
-        logger.error(f"Error loading to temp table: {e}")
+        logger.error(f"Error adding row hash column: {e}")
         raise
     finally:
         cursor.close()
 
 
-def merge_temp_to_target(conn, source_filename: str):
-    """Merge data from temp table to target table."""
+@traced('snowflake.fetch_target_hashes')
+def fetch_target_hashes(conn, since: Optional[str] = None, cfg=None):
+    """
+    Fetch key, ROW_HASH and last-change timestamp for target rows.
+    If since is given (ISO timestamp), only rows created or updated at or after it are returned.
+    Returns: list of (YEAR, PERIOD, STORE_LOCATION, ROW_HASH, changed_at)
+    """
+    cfg = cfg or config
     cursor = conn.cursor()
+    where_clause = "WHERE COALESCE(updated_at, created_at) >= TO_TIMESTAMP_TZ(%(since)s)" if since else ""
+    fetch_sql = f"""
+    SELECT YEAR, PERIOD, STORE_LOCATION, {cfg.ROW_HASH_COLUMN},
+           COALESCE(updated_at, created_at) AS changed_at
+    FROM {cfg.TARGET_TABLE}
+    {where_clause}
+    """
+    try:
+        cursor.execute(fetch_sql, {'since': since} if since else None)
+        record_query(cursor)
+        rows = cursor.fetchall()
+        record(rows=len(rows))
+        logger.info(f"Fetched {len(rows)} row hashes from {cfg.TARGET_TABLE}")
+        return rows
+    except Exception as e:
+        logger.error(f"Error fetching row hashes: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.create_ledger_table')
+def create_ledger_table_if_not_exists(conn, cfg=None):
+    """Create the load ledger table that records each loaded file and its outcome."""
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(_ledger_ddl(cfg))
+        record_query(cursor)
+        logger.info(f"Ledger table {cfg.LEDGER_TABLE} is ready")
+    except Exception as e:
+        logger.error(f"Error creating ledger table: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.fetch_loaded_files')
+def fetch_loaded_files(conn, checksums: List[str], target_table: str, cfg=None):
+    """
+    Look up successful ledger entries for the given file checksums.
+    Returns: list of (FILE_CHECKSUM, FILE_NAME, LOADED_AT) for checksums already loaded into target_table
+    """
+    cfg = cfg or config
+    if not checksums:
+        return []
+    cursor = conn.cursor()
+    params = {f"checksum_{i}": checksum for i, checksum in enumerate(checksums)}
+    params['target_table'] = target_table
+    placeholders = ", ".join(f"%({name})s" for name in params if name.startswith('checksum_'))
+    fetch_sql = f"""
+    SELECT FILE_CHECKSUM, MAX_BY(FILE_NAME, LOADED_AT), MAX(LOADED_AT)
+    FROM {cfg.LEDGER_TABLE}
+    WHERE TARGET_TABLE = %(target_table)s
+      AND OUTCOME = 'SUCCESS'
+      AND FILE_CHECKSUM IN ({placeholders})
+    GROUP BY FILE_CHECKSUM
+    """
+    try:
+        cursor.execute(fetch_sql, params)
+        record_query(cursor)
+        rows = cursor.fetchall()
+        record(rows=len(rows))
+        return rows
+    except Exception as e:
+        logger.error(f"Error reading load ledger: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.insert_ledger_entries')
+def insert_ledger_entries(conn, entries: List[dict], cfg=None):
+    """Append entries (dicts of ledger column -> value) to the load ledger in one INSERT."""
+    cfg = cfg or config
+    if not entries:
+        return
+    cursor = conn.cursor()
+    columns = list(entries[0])
+    params = {}
+    value_rows = []
+    for i, entry in enumerate(entries):
+        names = []
+        for col in columns:
+            params[f"{col}_{i}"] = entry[col]
+            names.append(f"%({col}_{i})s")
+        value_rows.append(f"({', '.join(names)})")
+    insert_sql = f"""
+    INSERT INTO {cfg.LEDGER_TABLE} ({', '.join(columns)})
+    VALUES {', '.join(value_rows)}
+    """
+    try:
+        cursor.execute(insert_sql, params)
+        record_query(cursor)
+        logger.info(f"Recorded {len(entries)} load ledger entries")
+    except Exception as e:
+        logger.error(f"Error writing load ledger: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.create_temp_table')
+def create_temp_table(conn, cfg=None):
+    """
+    Create temporary table for staging data, with the target's structure. Later loads on the
+    same session reuse it, emptied with TRUNCATE.
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        _create_or_truncate(cursor, conn, cfg.TEMP_TABLE,
+                            f"CREATE OR REPLACE TEMPORARY TABLE {cfg.TEMP_TABLE} LIKE {cfg.TARGET_TABLE}")
+    except Exception as e:
+        logger.error(f"Error creating temp table: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def build_copy_sql(stage_file: str, stage_format: str = 'csv', columns: Optional[List[str]] = None, cfg=None) -> str:
+    """
+    The COPY of a staged file or stage directory of parts into the temp table. columns are the
+    staged columns (default STAGED_COLUMNS); temp table columns not staged are left NULL.
+    """
+    cfg = cfg or config
+    columns = columns or cfg.STAGED_COLUMNS
+    # Build the column list (exclude audit columns from COPY)
+    data_columns = ", ".join(columns)
+    pattern_clause = f"PATTERN = '{stage_part_pattern(stage_format)}'" if is_stage_directory(stage_file) else ""
     
+    return f"""
+    COPY INTO {cfg.TEMP_TABLE} ({data_columns})
+    FROM {copy_source(f"@{cfg.STAGE_NAME}/{stage_file}", stage_format, columns)}
+    {pattern_clause}
+    {file_format_clause(stage_format)}
+    ON_ERROR = 'ABORT_STATEMENT'
+    """
+
+
+@traced('snowflake.copy')
+def load_stage_to_temp(conn, stage_file: str, stage_format: str = 'csv', columns: Optional[List[str]] = None,
+                       cfg=None):
+    """
+    Load data from stage to temporary table.
+    stage_file is a staged file, or a stage directory of part files (ending in '/') from
+    upload_parts_to_stage; all its parts are loaded by one COPY, which Snowflake spreads
+    across the warehouse's threads. columns are the staged columns, for a partial update.
+    Returns: one COPY result row per file loaded
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(build_copy_sql(stage_file, stage_format, columns, cfg))
+        record_query(cursor)
+        results = cursor.fetchall()
+        record(rows=sum(result[3] for result in results if len(result) > 3), files=len(results))
+        logger.info(f"Loaded {len(results)} staged files to temp table: {results}")
+        return results
+    except Exception as e:
+        logger.error(f"Error loading to temp table: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _build_value_changed_conditions(cfg) -> str:
+    """
+    Build condition to check if ANY value has changed between target and source.
+    Rows loaded before ROW_HASH existed have a NULL hash; backfill_row_hashes fills it
+    for the unchanged ones first, so a NULL hash left at MERGE time means changed.
+    Rows validated in the warehouse have no hash either, so they are compared column by column.
+    """
+    return (
+        f"CASE WHEN source.{cfg.ROW_HASH_COLUMN} IS NULL "
+        f"THEN COALESCE(({_build_column_changed_conditions(cfg)}), FALSE) "
+        f"ELSE target.{cfg.ROW_HASH_COLUMN} IS NULL "
+        f"OR target.{cfg.ROW_HASH_COLUMN} != source.{cfg.ROW_HASH_COLUMN} END"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _build_column_changed_conditions(cfg, columns: Optional[Tuple[str, ...]] = None) -> str:
+    """
+    Build condition to check if ANY column value has changed, one column at a time.
+    columns defaults to the financial columns and OPENED; a partial update passes its own.
+    """
+    return " OR ".join([
+        f"target.{col} != source.{col} OR (target.{col} IS NULL AND source.{col} IS NOT NULL) OR (target.{col} IS NOT NULL AND source.{col} IS NULL)"
+        for col in columns or tuple(cfg.FINANCIAL_COLUMNS + ['OPENED'])
+    ])
+
+
+def build_period_predicate(periods: Optional[Iterable[Tuple[int, int]]], alias: str = 'target') -> str:
+    """
+    Restrict the target to the (YEAR, PERIOD) pairs being loaded so Snowflake prunes the
+    micro-partitions of every other period instead of scanning the whole table. The ranges
+    are what the pruner uses; the per-year period lists make the filter exact.
+    Returns an "AND ..." clause to append to a join or WHERE, or "" when periods is None.
+    """
+    if not periods:
+        return ""
+    by_year = {}
+    for year, period in periods:
+        by_year.setdefault(int(year), set()).add(int(period))
+    all_periods = set().union(*by_year.values())
+    exact = " OR ".join(
+        f"({alias}.YEAR = {year} AND {alias}.PERIOD IN ({', '.join(str(p) for p in sorted(year_periods))}))"
+        for year, year_periods in sorted(by_year.items())
+    )
+    return (f"AND {alias}.YEAR BETWEEN {min(by_year)} AND {max(by_year)} "
+            f"AND {alias}.PERIOD BETWEEN {min(all_periods)} AND {max(all_periods)} "
+            f"AND ({exact})")
+
+
+# The statements below are built once per config module and cached; a load only fills in
+# {period_predicate}. They are cached for the life of the process, so a config module must
+# not change its tables or columns after the first load.
+
+@functools.lru_cache(maxsize=None)
+def _backfill_sql_template(cfg) -> str:
+    return f"""
+    UPDATE {cfg.TARGET_TABLE} target
+    SET {cfg.ROW_HASH_COLUMN} = source.{cfg.ROW_HASH_COLUMN}
+    FROM {cfg.TEMP_TABLE} source
+    WHERE target.YEAR = source.YEAR 
+      AND target.PERIOD = source.PERIOD 
+      AND target.STORE_LOCATION = source.STORE_LOCATION
+      AND target.{cfg.ROW_HASH_COLUMN} IS NULL
+      AND NOT COALESCE(({_build_column_changed_conditions(cfg)}), FALSE)
+      {{period_predicate}}
+    """
+
+
+@functools.lru_cache(maxsize=None)
+def _classify_sql_template(cfg) -> str:
+    return f"""
+    SELECT source.YEAR, source.PERIOD, source.STORE_LOCATION,
+           CASE WHEN target.YEAR IS NULL THEN 'INSERT' ELSE 'UPDATE' END AS action
+    FROM {cfg.TEMP_TABLE} source
+    LEFT JOIN {cfg.TARGET_TABLE} target
+      ON target.YEAR = source.YEAR 
+     AND target.PERIOD = source.PERIOD 
+     AND target.STORE_LOCATION = source.STORE_LOCATION
+     {{period_predicate}}
+    WHERE target.YEAR IS NULL OR ({_build_value_changed_conditions(cfg)})
+    """
+
+
+@functools.lru_cache(maxsize=None)
+def _merge_sql_template(cfg) -> str:
     # Build UPDATE SET clause for all financial columns
     update_set_clause = ",\n        ".join([
-        f"target.{col} = source.{col}" for col in config.FINANCIAL_COLUMNS
+        f"target.{col} = source.{col}" for col in cfg.FINANCIAL_COLUMNS
     ])
     
-    # Build condition to check if ANY value has changed
-    # This prevents updating unchanged rows
-    value_changed_conditions = " OR ".join([
-        f"target.{col} != source.{col} OR (target.{col} IS NULL AND source.{col} IS NOT NULL) OR (target.{col} IS NOT NULL AND source.{col} IS NULL)"
-        for col in config.FINANCIAL_COLUMNS
-    ])
-    
-    # Also check if OPENED changed
-    value_changed_conditions += " OR target.OPENED != source.OPENED OR (target.OPENED IS NULL AND source.OPENED IS NOT NULL) OR (target.OPENED IS NOT NULL AND source.OPENED IS NULL)"
-    
     # Build INSERT columns and values (including audit columns)
-    all_cols = config.REQUIRED_COLUMNS
+    all_cols = cfg.STAGED_COLUMNS
     insert_cols = ", ".join(all_cols + ['created_at', 'updated_at'])
     insert_vals = ", ".join([f"source.{col}" for col in all_cols])
     
-    merge_sql = f"""
-    MERGE INTO {config.TARGET_TABLE} target
+    # The value-changed condition prevents updating unchanged rows
+    return f"""
+    MERGE INTO {cfg.TARGET_TABLE} target
     USING (
         SELECT *,
                CURRENT_TIMESTAMP() as load_timestamp
-        FROM {config.TEMP_TABLE}
+        FROM {cfg.TEMP_TABLE}
     ) source
     ON target.YEAR = source.YEAR 
        AND target.PERIOD = source.PERIOD 
        AND target.STORE_LOCATION = source.STORE_LOCATION
-    WHEN MATCHED AND ({value_changed_conditions}) THEN 
+       {{period_predicate}}
+    WHEN MATCHED AND ({_build_value_changed_conditions(cfg)}) THEN 
       UPDATE SET 
         {update_set_clause},
         target.OPENED = source.OPENED,
+        target.{cfg.ROW_HASH_COLUMN} = source.{cfg.ROW_HASH_COLUMN},
         target.updated_at = source.load_timestamp
     WHEN NOT MATCHED THEN 
       INSERT ({insert_cols})
       VALUES ({insert_vals}, source.load_timestamp, NULL)
     """
+
+
+@traced('snowflake.backfill_row_hashes')
+def backfill_row_hashes(conn, periods: Optional[Iterable[Tuple[int, int]]] = None, cfg=None) -> int:
+    """
+    Copy ROW_HASH from the temp table onto matching target rows that have no hash yet
+    and whose column values are unchanged. Only touches rows loaded before ROW_HASH
+    existed, so after history is backfilled this updates nothing.
+    periods, the (YEAR, PERIOD) pairs in the temp table, limits the target scan to them.
+    Returns: number of target rows backfilled
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    backfill_sql = _backfill_sql_template(cfg).format(period_predicate=build_period_predicate(periods))
     
     try:
-        cursor.execute(merge_sql)
+        cursor.execute(backfill_sql)
+        record_query(cursor)
         result = cursor.fetchone()
-        rows_inserted = result[0] if result else 0
-        rows_updated = result[1] if result else 0
+        rows_backfilled = result[0] if result else 0
+        record(rows=rows_backfilled)
+        if rows_backfilled:
+            logger.info(f"Backfilled {cfg.ROW_HASH_COLUMN} on {rows_backfilled} unchanged rows")
+        return rows_backfilled
+    except Exception as e:
+        logger.error(f"Error backfilling row hashes: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.classify')
+def classify_temp_rows(conn, periods: Optional[Iterable[Tuple[int, int]]] = None, cfg=None):
+    """
+    Classify temp table rows the same way the MERGE will, before it runs.
+    periods limits the target scan as in merge_temp_to_target.
+    Returns: list of (YEAR, PERIOD, STORE_LOCATION, action) for rows that will be
+    inserted ('INSERT') or updated ('UPDATE'); unchanged rows are not returned.
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    classify_sql = _classify_sql_template(cfg).format(period_predicate=build_period_predicate(periods))
+    
+    try:
+        cursor.execute(classify_sql)
+        record_query(cursor)
+        rows = cursor.fetchall()
+        record(rows=len(rows))
+        logger.info(f"Classified {len(rows)} new or changed rows in temp table")
+        return rows
+    except Exception as e:
+        logger.error(f"Error classifying temp table rows: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def build_merge_statements(periods: Optional[Iterable[Tuple[int, int]]] = None, backfill: bool = False,
+                           cfg=None) -> List[str]:
+    """The MERGE of the temp table into the target, after the hash backfill UPDATE if backfill is set."""
+    cfg = cfg or config
+    period_predicate = build_period_predicate(periods)
+    statements = [_merge_sql_template(cfg).format(period_predicate=period_predicate)]
+    if backfill:
+        statements.insert(0, _backfill_sql_template(cfg).format(period_predicate=period_predicate))
+    return statements
+
+
+def merge_counts(results: list, cfg=None) -> Tuple[int, int]:
+    """(rows_inserted, rows_updated) from the result sets of build_merge_statements, MERGE last."""
+    cfg = cfg or config
+    if len(results) > 1 and results[0] and results[0][0][0]:
+        logger.info(f"Backfilled {cfg.ROW_HASH_COLUMN} on {results[0][0][0]} unchanged rows")
+    result = results[-1][0] if results[-1] else None
+    return (result[0] if result else 0), (result[1] if result else 0)
+
+
+@traced('snowflake.merge')
+def merge_temp_to_target(conn, source_filename: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                         backfill: bool = False, cfg=None):
+    """
+    Merge data from temp table to target table.
+    periods, the (YEAR, PERIOD) pairs in the temp table, is pushed into the ON clause so the
+    MERGE only reads the target partitions of those periods. Every source row falls in one of
+    them, so the result is the same as an unrestricted MERGE.
+    With backfill, backfill_row_hashes' UPDATE runs first in the same round trip.
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    
+    try:
+        results = _execute_batch(cursor, build_merge_statements(periods, backfill, cfg))
+        rows_inserted, rows_updated = merge_counts(results, cfg)
+        record(rows_inserted=rows_inserted, rows_updated=rows_updated)
         
-        logger.info(f"Merge complete - Inserted: {rows_inserted}, Updated: {rows_updated}")
+        logger.info(f"Merge complete for {source_filename} - Inserted: {rows_inserted}, Updated: {rows_updated}")
         return rows_inserted, rows_updated
     except Exception as e:
         logger.error(f"Error during merge: {e}")
         raise
     finally:
-        cursor.close()
\ No newline at end of file
+        cursor.close()
+
+
+@traced('snowflake.target_has_periods')
+def target_has_periods(conn, periods: Optional[Iterable[Tuple[int, int]]], cfg=None) -> bool:
+    """
+    True if the target holds any row in the given (YEAR, PERIOD) pairs. Clustered on
+    (YEAR, PERIOD), Snowflake answers from the partitions of those periods alone.
+    Without periods the answer is unknown, so this returns True.
+    """
+    cfg = cfg or config
+    if not periods:
+        return True
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT 1 FROM {cfg.TARGET_TABLE} target WHERE TRUE {build_period_predicate(periods)} LIMIT 1")
+        record_query(cursor)
+        return cursor.fetchone() is not None
+    except Exception as e:
+        logger.error(f"Error checking target for loaded periods: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def build_insert_sql(cfg=None) -> str:
+    """The plain INSERT of every temp table row into the target, for loads of new periods."""
+    cfg = cfg or config
+    columns = ", ".join(cfg.STAGED_COLUMNS)
+    return f"""
+    INSERT INTO {cfg.TARGET_TABLE} ({columns}, created_at, updated_at)
+    SELECT {columns}, CURRENT_TIMESTAMP(), NULL
+    FROM {cfg.TEMP_TABLE}
+    """
+
+
+@traced('snowflake.insert')
+def insert_temp_to_target(conn, source_filename: str, cfg=None):
+    """
+    Insert every temp table row into the target with created_at set, as the MERGE's
+    NOT MATCHED branch would. Only correct when target_has_periods is False for the loaded
+    periods, i.e. every row is new; loads of the same period must not run concurrently.
+    Returns: (rows_inserted, rows_updated), rows_updated always 0
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(build_insert_sql(cfg))
+        record_query(cursor)
+        result = cursor.fetchone()
+        rows_inserted = result[0] if result else 0
+        record(rows_inserted=rows_inserted, rows_updated=0)
+        logger.info(f"Insert-only load complete for {source_filename} - Inserted: {rows_inserted}")
+        return rows_inserted, 0
+    except Exception as e:
+        logger.error(f"Error during insert: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.find_unmatched_keys')
+def find_unmatched_keys(conn, periods: Optional[Iterable[Tuple[int, int]]] = None, sample_size: int = 5, cfg=None):
+    """
+    Temp table keys with no row in the target, which a partial update cannot update.
+    Returns: (count, sample of up to sample_size (YEAR, PERIOD, STORE_LOCATION) in key order)
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        SELECT source.YEAR, source.PERIOD, source.STORE_LOCATION, COUNT(*) OVER () AS unmatched
+        FROM {cfg.TEMP_TABLE} source
+        LEFT JOIN {cfg.TARGET_TABLE} target
+          ON target.YEAR = source.YEAR 
+         AND target.PERIOD = source.PERIOD 
+         AND target.STORE_LOCATION = source.STORE_LOCATION
+         {build_period_predicate(periods)}
+        WHERE target.YEAR IS NULL
+        ORDER BY source.YEAR, source.PERIOD, source.STORE_LOCATION
+        LIMIT {int(sample_size)}
+        """)
+        record_query(cursor)
+        rows = cursor.fetchall()
+        count = rows[0][3] if rows else 0
+        record(rows=count)
+        return count, [row[:3] for row in rows]
+    except Exception as e:
+        logger.error(f"Error checking temp table keys against target: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _partial_merge_sql_template(cfg, columns: Tuple[str, ...]) -> str:
+    update_set_clause = ",\n        ".join([f"target.{col} = source.{col}" for col in columns])
+    return f"""
+    MERGE INTO {cfg.TARGET_TABLE} target
+    USING {cfg.TEMP_TABLE} source
+    ON target.YEAR = source.YEAR 
+       AND target.PERIOD = source.PERIOD 
+       AND target.STORE_LOCATION = source.STORE_LOCATION
+       {{period_predicate}}
+    WHEN MATCHED AND ({_build_column_changed_conditions(cfg, columns)}) THEN 
+      UPDATE SET 
+        {update_set_clause},
+        target.{cfg.ROW_HASH_COLUMN} = NULL,
+        target.updated_at = CURRENT_TIMESTAMP()
+    """
+
+
+@traced('snowflake.merge_partial')
+def merge_partial_to_target(conn, source_filename: str, columns: List[str],
+                            periods: Optional[Iterable[Tuple[int, int]]] = None, cfg=None):
+    """
+    Update only columns on target rows whose value in one of them differs from the temp table,
+    loaded by a partial update; other columns, and keys not in the target, are left alone.
+    ROW_HASH covers every column, so updated rows get a NULL hash; the next full load of their
+    period backfills it if the rest of the row is unchanged, or compares them as changed.
+    Returns: (rows_inserted, rows_updated), rows_inserted always 0
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(_partial_merge_sql_template(cfg, tuple(columns)).format(
+            period_predicate=build_period_predicate(periods)))
+        record_query(cursor)
+        result = cursor.fetchone()
+        rows_updated = result[0] if result else 0
+        record(rows_inserted=0, rows_updated=rows_updated)
+        logger.info(f"Partial update complete for {source_filename} - Updated: {rows_updated} "
+                    f"({', '.join(columns)})")
+        return 0, rows_updated
+    except Exception as e:
+        logger.error(f"Error during partial update: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _capture_changes_sql_template(cfg, deltas: bool, columns: Optional[Tuple[str, ...]] = None) -> str:
+    if columns:
+        # A partial update only updates matched rows, and only when one of its columns changed
+        row_changed = f"target.YEAR IS NOT NULL AND ({_build_column_changed_conditions(cfg, columns)})"
+    else:
+        row_changed = f"target.YEAR IS NULL OR ({_build_value_changed_conditions(cfg)})"
+    if deltas:
+        # One {before, after} entry per changed column; OBJECT_CONSTRUCT drops the NULL ones
+        column_deltas = ",\n               ".join(
+            f"'{col}', IFF(EQUAL_NULL(target.{col}, source.{col}), NULL, "
+            f"OBJECT_CONSTRUCT_KEEP_NULL('before', target.{col}, 'after', source.{col}))"
+            for col in columns or cfg.FINANCIAL_COLUMNS + ['OPENED']
+        )
+        changed_values = f"IFF(target.YEAR IS NULL, NULL, OBJECT_CONSTRUCT(\n               {column_deltas}))"
+    else:
+        changed_values = "NULL"
+    return f"""
+    INSERT INTO {cfg.CHANGE_LOG_TABLE} (LOAD_ID, FILE_NAME, TARGET_TABLE, YEAR, PERIOD, STORE_LOCATION, ACTION, CHANGED_VALUES)
+    SELECT %(load_id)s, %(file_name)s, %(target_table)s, source.YEAR, source.PERIOD, source.STORE_LOCATION,
+           CASE WHEN target.YEAR IS NULL THEN 'INSERT' ELSE 'UPDATE' END,
+           {changed_values}
+    FROM {cfg.TEMP_TABLE} source
+    LEFT JOIN {cfg.TARGET_TABLE} target
+      ON target.YEAR = source.YEAR 
+     AND target.PERIOD = source.PERIOD 
+     AND target.STORE_LOCATION = source.STORE_LOCATION
+     {{period_predicate}}
+    WHERE {row_changed}
+    """
+
+
+@traced('snowflake.capture_changes')
+def capture_changes(conn, load_id: str, file_name: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                    deltas: bool = False, columns: Optional[List[str]] = None, cfg=None):
+    """
+    Write the keys the MERGE is about to insert or update to CHANGE_LOG_TABLE under load_id and
+    read them back, in one round trip. Snowflake's MERGE cannot return the rows it touched, so
+    this applies the MERGE's own match and value-changed conditions just before it runs; call it
+    after backfill_row_hashes and before the MERGE or INSERT, on the same session.
+    With deltas, UPDATE rows carry CHANGED_VALUES, {column: {before, after}} for each changed column.
+    For a partial update, columns are the columns it updates, as in merge_partial_to_target.
+    Returns: list of (YEAR, PERIOD, STORE_LOCATION, ACTION, CHANGED_VALUES) in key order
+    """
+    cfg = cfg or config
+    done = _session_statements.setdefault(conn, set())
+    ddl = _change_log_ddl(cfg)
+    statements = [] if ddl in done else [ddl]
+    statements += [
+        _capture_changes_sql_template(cfg, deltas, tuple(columns or ())).format(
+            period_predicate=build_period_predicate(periods)),
+        f"""
+        SELECT YEAR, PERIOD, STORE_LOCATION, ACTION, CHANGED_VALUES
+        FROM {cfg.CHANGE_LOG_TABLE}
+        WHERE LOAD_ID = %(load_id)s
+        ORDER BY YEAR, PERIOD, STORE_LOCATION
+        """,
+    ]
+    params = {'load_id': load_id, 'file_name': file_name,
+              'target_table': f"{cfg.SNOWFLAKE_DATABASE}.{cfg.SNOWFLAKE_SCHEMA}.{cfg.TARGET_TABLE}"}
+    cursor = conn.cursor()
+    try:
+        rows = _execute_batch(cursor, statements, params)[-1]
+        done.add(ddl)
+        record(rows=len(rows))
+        logger.info(f"Captured {len(rows)} changed keys to {cfg.CHANGE_LOG_TABLE} for load {load_id}")
+        return rows
+    except Exception as e:
+        logger.error(f"Error capturing changed keys: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.discard_changes')
+def discard_changes(conn, load_id: str, cfg=None):
+    """Delete the change log rows of a load whose MERGE failed, so the log only lists applied changes."""
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DELETE FROM {cfg.CHANGE_LOG_TABLE} WHERE LOAD_ID = %(load_id)s", {'load_id': load_id})
+        record_query(cursor)
+        logger.info(f"Discarded change log rows of load {load_id}")
+    except Exception as e:
+        logger.error(f"Error discarding change log rows: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def build_typed_raw_select(cfg=None) -> str:
+    """
+    SELECT converting the text rows of RAW_TABLE the way validate_dataframe converts a frame:
+    numbers that do not parse become NULL, PERIOD keeps the first run of digits ("P01" -> 1)
+    and money is rounded to cents. Also run by the sqlite backend, which registers the functions.
+    """
+    cfg = cfg or config
+    fields = [RAW_STAGED_COLUMNS[0]]
+    for col in cfg.REQUIRED_COLUMNS:
+        if col == 'YEAR':
+            fields.append("TRY_TO_DOUBLE(YEAR) AS YEAR")
+        elif col == 'PERIOD':
+            fields.append("TRY_TO_NUMBER(REGEXP_SUBSTR(PERIOD, '[0-9]+')) AS PERIOD")
+        elif col in cfg.FINANCIAL_COLUMNS:
+            fields.append(f"ROUND(TRY_TO_DOUBLE({col}), 2) AS {col}")
+        else:
+            fields.append(col)
+    return f"SELECT {', '.join(fields)} FROM {cfg.RAW_TABLE}"
+
+
+def _keyed_raw_rows(cfg) -> str:
+    """Typed raw rows with KEY_ROWS, the number of rows sharing each row's key (NULLs group together)."""
+    keys = ", ".join(cfg.KEY_COLUMNS)
+    return f"SELECT typed.*, COUNT(*) OVER (PARTITION BY {keys}) AS KEY_ROWS FROM ({build_typed_raw_select(cfg)}) typed"
+
+
+def build_raw_rule_counts_sql(rules: list, cfg=None) -> str:
+    """One pass over the raw rows: the row count, then the number of rows failing each rule."""
+    cfg = cfg or config
+    counts = ",\n           ".join(f"SUM(CASE WHEN {rule.sql()} THEN 1 ELSE 0 END)" for rule in rules)
+    return f"""
+    SELECT COUNT(*),
+           {counts}
+    FROM ({_keyed_raw_rows(cfg)}) keyed
+    """
+
+
+def build_raw_rule_sample_sql(rule, cfg=None) -> str:
+    """The first rows failing a rule, in file order, as (row number, YEAR, PERIOD, STORE_LOCATION)."""
+    cfg = cfg or config
+    return f"""
+    SELECT {RAW_STAGED_COLUMNS[0]}, YEAR, PERIOD, STORE_LOCATION
+    FROM ({_keyed_raw_rows(cfg)}) keyed
+    WHERE {rule.sql()}
+    ORDER BY {RAW_STAGED_COLUMNS[0]}
+    LIMIT {rule.sample_size}
+    """
+
+
+@traced('snowflake.create_raw_table')
+def create_raw_table(conn, cfg=None):
+    """Create the temporary table the unvalidated text rows are COPYed into; reused per session like the temp table."""
+    cfg = cfg or config
+    cursor = conn.cursor()
+    columns = ", ".join([f"{RAW_STAGED_COLUMNS[0]} NUMBER(38,0)"] + [f"{col} VARCHAR" for col in cfg.REQUIRED_COLUMNS])
+    try:
+        _create_or_truncate(cursor, conn, cfg.RAW_TABLE, f"CREATE OR REPLACE TEMPORARY TABLE {cfg.RAW_TABLE} ({columns})")
+    except Exception as e:
+        logger.error(f"Error creating raw table: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.copy_raw')
+def load_stage_to_raw(conn, stage_file: str, cfg=None):
+    """
+    COPY staged unvalidated rows (a RAW_STAGE_FORMAT file or directory of parts) into RAW_TABLE
+    as text, so no value can fail the COPY; the checks run afterwards in validate_raw_rows.
+    Returns: one COPY result row per file loaded
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    pattern_clause = f"PATTERN = '{stage_part_pattern(RAW_STAGE_FORMAT)}'" if is_stage_directory(stage_file) else ""
+    copy_sql = f"""
+    COPY INTO {cfg.RAW_TABLE} ({", ".join(RAW_STAGED_COLUMNS)})
+    FROM @{cfg.STAGE_NAME}/{stage_file}
+    {pattern_clause}
+    {file_format_clause(RAW_STAGE_FORMAT)}
+    ON_ERROR = 'ABORT_STATEMENT'
+    """
+    try:
+        cursor.execute(copy_sql)
+        record_query(cursor)
+        results = cursor.fetchall()
+        record(rows=sum(result[3] for result in results if len(result) > 3), files=len(results))
+        logger.info(f"Loaded {len(results)} staged files to raw table: {results}")
+        return results
+    except Exception as e:
+        logger.error(f"Error loading to raw table: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.validate_raw')
+def validate_raw_rows(conn, rules: list, cfg=None):
+    """
+    Run the validation rules over RAW_TABLE on warehouse compute: one set-based pass counts
+    the failures of every rule, then a sample query runs for each rule that failed.
+    Returns: (row_count, [(rule, count, sample_rows)] for the failed rules)
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(build_raw_rule_counts_sql(rules, cfg))
+        record_query(cursor)
+        counts = cursor.fetchone()
+        failures = []
+        for rule, count in zip(rules, counts[1:]):
+            if count:
+                cursor.execute(build_raw_rule_sample_sql(rule, cfg))
+                record_query(cursor)
+                failures.append((rule, int(count), cursor.fetchall()))
+        record(rows=counts[0], errors=len(failures))
+        logger.info(f"Validated {counts[0]} raw rows in the warehouse; {len(failures)} rules failed")
+        return counts[0], failures
+    except Exception as e:
+        logger.error(f"Error validating raw rows: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.insert_raw')
+def load_raw_to_temp(conn, cfg=None):
+    """
+    Insert the validated raw rows into the temp table as typed values. ROW_HASH is left NULL
+    (it is computed by pandas), so the MERGE compares these rows column by column.
+    Returns: rows inserted
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    insert_sql = f"""
+    INSERT INTO {cfg.TEMP_TABLE} ({", ".join(cfg.STAGED_COLUMNS)})
+    SELECT {", ".join(cfg.REQUIRED_COLUMNS)}, NULL
+    FROM ({build_typed_raw_select(cfg)}) typed
+    """
+    try:
+        cursor.execute(insert_sql)
+        record_query(cursor)
+        result = cursor.fetchone()
+        rows = result[0] if result else 0
+        record(rows=rows)
+        logger.info(f"Inserted {rows} validated rows into {cfg.TEMP_TABLE}")
+        return rows
+    except Exception as e:
+        logger.error(f"Error inserting validated rows into temp table: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.describe_temp')
+def describe_temp_table(conn, cfg=None):
+    """
+    Row count and key range of the temp table in ledger columns, and its (YEAR, PERIOD) pairs,
+    for loads whose rows never passed through a local frame.
+    Returns: (description, periods)
+    """
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        SELECT COUNT(*), MIN(YEAR), MAX(YEAR), MIN(PERIOD), MAX(PERIOD), COUNT(DISTINCT STORE_LOCATION)
+        FROM {cfg.TEMP_TABLE}
+        """)
+        record_query(cursor)
+        row = cursor.fetchone()
+        cursor.execute(f"SELECT DISTINCT YEAR, PERIOD FROM {cfg.TEMP_TABLE} ORDER BY YEAR, PERIOD")
+        record_query(cursor)
+        periods = [(int(year), int(period)) for year, period in cursor.fetchall()]
+        keys = ['ROW_COUNT', 'MIN_YEAR', 'MAX_YEAR', 'MIN_PERIOD', 'MAX_PERIOD', 'STORE_COUNT']
+        return {key: int(value) if value is not None else None for key, value in zip(keys, row)}, periods
+    except Exception as e:
+        logger.error(f"Error describing temp table: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+@traced('snowflake.get_clustering_key')
+def get_clustering_key(conn, cfg=None) -> Optional[str]:
+    """Return the target table's clustering key as Snowflake reports it, e.g. 'LINEAR(YEAR, PERIOD)', or None."""
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        SELECT CLUSTERING_KEY
+        FROM {cfg.SNOWFLAKE_DATABASE}.INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+        """, (cfg.SNOWFLAKE_SCHEMA, cfg.TARGET_TABLE))
+        record_query(cursor)
+        result = cursor.fetchone()
+        return result[0] if result else None
+    except Exception as e:
+        logger.error(f"Error reading clustering key: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def clustering_key_matches(clustering_key: Optional[str], cfg=None) -> bool:
+    """True if a reported clustering key is exactly CLUSTERING_KEY, in order."""
+    cfg = cfg or config
+    if not clustering_key:
+        return False
+    expected = f"LINEAR({','.join(cfg.CLUSTERING_KEY)})"
+    return clustering_key.replace(' ', '').upper() == expected
+
+
+@traced('snowflake.set_clustering_key')
+def set_clustering_key(conn, cfg=None):
+    """Cluster the target table on CLUSTERING_KEY so period-scoped MERGEs prune well."""
+    cfg = cfg or config
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"ALTER TABLE {cfg.TARGET_TABLE} CLUSTER BY ({', '.join(cfg.CLUSTERING_KEY)})")
+        record_query(cursor)
+        logger.info(f"Set clustering key on {cfg.TARGET_TABLE} to ({', '.join(cfg.CLUSTERING_KEY)})")
+    except Exception as e:
+        logger.error(f"Error setting clustering key: {e}")
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,613 @@
+import logging
+import os
+import re
+import shutil
+import sqlite3
+from datetime import datetime, timezone
+from typing import IO, Iterable, List, Optional, Tuple
+import pandas as pd
+from utils.metrics import traced, record
+from utils.schema import MONEY_COLUMNS
+from utils.staging import RAW_STAGE_FORMAT, RAW_STAGED_COLUMNS, is_stage_directory, stage_part_pattern
+from utils.snowflake_utils import (
+    build_period_predicate,
+    build_raw_rule_counts_sql,
+    build_raw_rule_sample_sql,
+    build_typed_raw_select
+)
+from utils.warehouse import WarehouseBackend
+
+logger = logging.getLogger(__name__)
+
+
+def _load_timestamp() -> str:
+    """UTC ISO timestamp with fixed precision, so stored audit timestamps sort as text."""
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+# Snowflake functions used by the warehouse-side validation SQL, so it runs here unchanged
+
+def _try_to_double(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _try_to_number(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _regexp_substr(value, pattern):
+    if value is None:
+        return None
+    match = re.search(pattern, str(value))
+    return match.group() if match else None
+
+
+class SQLiteBackend(WarehouseBackend):
+    """
+    Local embedded warehouse in a single SQLite file, for CI, laptops and shadow loads.
+    The stage is a directory next to the database, COPY reads the staged file with pandas,
+    and the MERGE is an UPDATE ... FROM of changed rows followed by an INSERT of new keys
+    in one transaction, stamping updated_at and created_at the way the Snowflake MERGE does.
+    Money is stored as REAL dollars; ROW_HASH decides what changed, as in Snowflake.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path: str, cfg=None):
+        super().__init__(cfg)
+        self.path = path
+        self.stage_dir = os.path.join(os.path.dirname(path) or '.', self.cfg.STAGE_NAME.lower())
+        self._conn = None
+        # Set-up done and temp tables created on the open connection, reused like a Snowflake session's
+        self._session = set()
+
+    def target_table_name(self) -> str:
+        # Kept file-name safe: the ledger mirror and snapshot are named after it
+        stem = os.path.splitext(os.path.basename(self.path))[0]
+        return f"local.{stem}.{self.cfg.TARGET_TABLE}"
+
+    @traced('local.connect')
+    def connect(self):
+        """Open the database file, creating it on first use; the connection is reused until close."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.create_function('TRY_TO_DOUBLE', 1, _try_to_double, deterministic=True)
+            self._conn.create_function('TRY_TO_NUMBER', 1, _try_to_number, deterministic=True)
+            self._conn.create_function('REGEXP_SUBSTR', 2, _regexp_substr, deterministic=True)
+            logger.info(f"Opened local warehouse {self.path}")
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._session.clear()
+
+    def _execute(self, conn, sql: str, params=None, action: str = 'running statement') -> int:
+        """Run one statement and commit it. Returns: rows changed"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params or {})
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error {action}: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def _fetchall(self, conn, sql: str, params=None, action: str = 'running query') -> list:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params or {})
+            rows = cursor.fetchall()
+            record(rows=len(rows))
+            return rows
+        except Exception as e:
+            logger.error(f"Error {action}: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    @traced('local.prepare_session')
+    def prepare_session(self, conn):
+        """Stage, target table and ledger, set up once per connection."""
+        if 'setup' in self._session:
+            logger.info("Session is already set up")
+            return
+        self.create_stage_if_not_exists(conn)
+        self.ensure_row_hash_column(conn)
+        self.create_ledger_table_if_not_exists(conn)
+        self._session.add('setup')
+
+    def _create_or_empty(self, conn, table: str, create_sql: str):
+        """Create a temp table the first time on this connection, and empty it for reuse after that."""
+        if table in self._session:
+            self._execute(conn, f"DELETE FROM temp.{table}", action=f"emptying {table}")
+            logger.info(f"Emptied temporary table {table} for reuse")
+            return
+        self._execute(conn, f"DROP TABLE IF EXISTS temp.{table}", action=f"dropping {table}")
+        self._execute(conn, create_sql, action=f"creating {table}")
+        self._session.add(table)
+        logger.info(f"Created temporary table {table}")
+
+    @traced('local.create_stage')
+    def create_stage_if_not_exists(self, conn):
+        os.makedirs(self.stage_dir, exist_ok=True)
+        logger.info(f"Stage {self.stage_dir} is ready")
+
+    @traced('local.ensure_row_hash_column')
+    def ensure_row_hash_column(self, conn):
+        """Create the target table, ROW_HASH and audit columns included, if it does not exist yet."""
+        text_columns = ('STORE_LOCATION', 'OPENED')
+        columns = ",\n            ".join(
+            f"{col} {'TEXT' if col in text_columns else 'REAL' if col in MONEY_COLUMNS else 'INTEGER'}"
+            for col in self.cfg.STAGED_COLUMNS
+        )
+        self._execute(conn, f"""
+        CREATE TABLE IF NOT EXISTS {self.cfg.TARGET_TABLE} (
+            {columns},
+            created_at TEXT,
+            updated_at TEXT,
+            PRIMARY KEY ({', '.join(self.cfg.KEY_COLUMNS)})
+        )
+        """, action='creating target table')
+        logger.info(f"Table {self.cfg.TARGET_TABLE} is ready")
+
+    @traced('local.create_ledger_table')
+    def create_ledger_table_if_not_exists(self, conn):
+        """Create the load ledger table, with the columns of the Snowflake ledger."""
+        self._execute(conn, f"""
+        CREATE TABLE IF NOT EXISTS {self.cfg.LEDGER_TABLE} (
+            FILE_NAME TEXT,
+            FILE_CHECKSUM TEXT,
+            TARGET_TABLE TEXT,
+            ROW_COUNT INTEGER,
+            MIN_YEAR INTEGER,
+            MAX_YEAR INTEGER,
+            MIN_PERIOD INTEGER,
+            MAX_PERIOD INTEGER,
+            STORE_COUNT INTEGER,
+            ROWS_INSERTED INTEGER,
+            ROWS_UPDATED INTEGER,
+            OUTCOME TEXT,
+            ERROR_MESSAGE TEXT,
+            LOADED_AT TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+        )
+        """, action='creating ledger table')
+        logger.info(f"Ledger table {self.cfg.LEDGER_TABLE} is ready")
+
+    @traced('local.put')
+    def upload_to_stage(self, conn, local_file: str, stage_file: str, file_stream: Optional[IO[bytes]] = None):
+        """Copy a file, or write file_stream, into the stage directory."""
+        os.makedirs(self.stage_dir, exist_ok=True)
+        staged_path = os.path.join(self.stage_dir, stage_file)
+        if file_stream is not None:
+            with open(staged_path, 'wb') as f:
+                shutil.copyfileobj(file_stream, f)
+        else:
+            shutil.copyfile(local_file, staged_path)
+        record(bytes=os.path.getsize(staged_path))
+        logger.info(f"Uploaded {local_file} to stage")
+
+    @traced('local.put_parts')
+    def upload_parts_to_stage(self, conn, local_dir: str, stage_dir: str, stage_format: str) -> str:
+        """Copy every part file in local_dir into a directory of the stage."""
+        stage_dir = stage_dir.rstrip('/') + '/'
+        staged_dir = os.path.join(self.stage_dir, stage_dir)
+        os.makedirs(staged_dir, exist_ok=True)
+        parts = [name for name in sorted(os.listdir(local_dir)) if name.endswith(f".{stage_format}")]
+        for name in parts:
+            shutil.copyfile(os.path.join(local_dir, name), os.path.join(staged_dir, name))
+        record(bytes=sum(os.path.getsize(os.path.join(staged_dir, name)) for name in parts), files=len(parts))
+        logger.info(f"Uploaded {len(parts)} parts to stage directory {stage_dir}")
+        return stage_dir
+
+    @traced('local.create_temp_table')
+    def create_temp_table(self, conn):
+        """Create the temp table with the target's columns, for this connection only; later loads reuse it."""
+        self._create_or_empty(conn, self.cfg.TEMP_TABLE,
+                              f"CREATE TEMP TABLE {self.cfg.TEMP_TABLE} AS SELECT * FROM {self.cfg.TARGET_TABLE} WHERE 0")
+
+    def _staged_paths(self, stage_file: str, stage_format: str) -> List[str]:
+        """The staged file, or the part files of a stage directory matching the COPY pattern."""
+        staged_path = os.path.join(self.stage_dir, stage_file)
+        if not is_stage_directory(stage_file):
+            return [staged_path]
+        pattern = re.compile(stage_part_pattern(stage_format))
+        return [os.path.join(staged_path, name) for name in sorted(os.listdir(staged_path)) if pattern.fullmatch(name)]
+
+    def _read_staged_file(self, staged_path: str, stage_format: str, columns: List[str]) -> pd.DataFrame:
+        """
+        Read a staged file the way COPY does: empty CSV fields are NULL, other text is kept
+        as is, and money staged as cents is divided back to dollars.
+        """
+        if stage_format == 'parquet':
+            df = pd.read_parquet(staged_path)
+        else:
+            integers = {col: 'Int64' for col in columns if col not in ('STORE_LOCATION', 'OPENED')}
+            df = pd.read_csv(staged_path, dtype={'STORE_LOCATION': str, 'OPENED': str, **integers},
+                             keep_default_na=False, na_values=[''],
+                             compression='gzip' if stage_format == 'csv.gz' else None)
+        dollars = {col: df[col].astype('Float64') / 100 for col in MONEY_COLUMNS if col in columns}
+        return df[columns].assign(**dollars)
+
+    @traced('local.copy')
+    def load_stage_to_temp(self, conn, stage_file: str, stage_format: str = 'csv',
+                           columns: Optional[List[str]] = None):
+        """
+        Load a staged file, or every part in a stage directory, into the temp table in one transaction.
+        columns are the staged columns (default STAGED_COLUMNS); the other temp columns stay NULL.
+        Returns: one COPY-style (file, status, rows parsed, rows loaded) per file
+        """
+        columns = columns or self.cfg.STAGED_COLUMNS
+        insert_sql = (f"INSERT INTO {self.cfg.TEMP_TABLE} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' for _ in columns)})")
+        results = []
+        cursor = conn.cursor()
+        try:
+            for staged_path in self._staged_paths(stage_file, stage_format):
+                df = self._read_staged_file(staged_path, stage_format, columns)
+                cursor.executemany(insert_sql, df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+                results.append((os.path.relpath(staged_path, self.stage_dir), 'LOADED', len(df), len(df)))
+            conn.commit()
+            record(rows=sum(result[3] for result in results), files=len(results))
+            logger.info(f"Loaded {len(results)} staged files to temp table: {results}")
+            return results
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error loading to temp table: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def _key_join(self) -> str:
+        return " AND ".join(f"target.{col} = source.{col}" for col in self.cfg.KEY_COLUMNS)
+
+    def _column_changed(self, columns: Optional[List[str]] = None) -> str:
+        # IS NOT is SQLite's NULL-safe inequality
+        return " OR ".join(f"target.{col} IS NOT source.{col}"
+                           for col in columns or self.cfg.FINANCIAL_COLUMNS + ['OPENED'])
+
+    def _hash_changed(self) -> str:
+        """Rows validated in the warehouse have no ROW_HASH and are compared column by column."""
+        row_hash = self.cfg.ROW_HASH_COLUMN
+        return (f"CASE WHEN source.{row_hash} IS NULL THEN ({self._column_changed()}) "
+                f"ELSE target.{row_hash} IS NULL OR target.{row_hash} != source.{row_hash} END")
+
+    @traced('local.backfill_row_hashes')
+    def backfill_row_hashes(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None) -> int:
+        """Copy ROW_HASH onto unhashed target rows whose values are unchanged, as in Snowflake."""
+        column_changed = self._column_changed()
+        rows_backfilled = self._execute(conn, f"""
+        UPDATE {self.cfg.TARGET_TABLE} AS target
+        SET {self.cfg.ROW_HASH_COLUMN} = source.{self.cfg.ROW_HASH_COLUMN}
+        FROM {self.cfg.TEMP_TABLE} AS source
+        WHERE {self._key_join()}
+          AND target.{self.cfg.ROW_HASH_COLUMN} IS NULL
+          AND NOT ({column_changed})
+          {build_period_predicate(periods)}
+        """, action='backfilling row hashes')
+        record(rows=rows_backfilled)
+        if rows_backfilled:
+            logger.info(f"Backfilled {self.cfg.ROW_HASH_COLUMN} on {rows_backfilled} unchanged rows")
+        return rows_backfilled
+
+    @traced('local.classify')
+    def classify_temp_rows(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None):
+        """Return (YEAR, PERIOD, STORE_LOCATION, action) for temp rows the MERGE will insert or update."""
+        rows = self._fetchall(conn, f"""
+        SELECT source.YEAR, source.PERIOD, source.STORE_LOCATION,
+               CASE WHEN target.YEAR IS NULL THEN 'INSERT' ELSE 'UPDATE' END AS action
+        FROM {self.cfg.TEMP_TABLE} source
+        LEFT JOIN {self.cfg.TARGET_TABLE} target
+          ON {self._key_join()}
+         {build_period_predicate(periods)}
+        WHERE target.YEAR IS NULL OR ({self._hash_changed()})
+        """, action='classifying temp table rows')
+        logger.info(f"Classified {len(rows)} new or changed rows in temp table")
+        return rows
+
+    @traced('local.merge')
+    def merge_temp_to_target(self, conn, source_filename: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                             backfill: bool = False):
+        """
+        Upsert the temp table into the target in one transaction: changed rows get every
+        column and updated_at, new keys are inserted with created_at and a NULL updated_at.
+        With backfill, backfill_row_hashes runs first.
+        Returns: (rows_inserted, rows_updated)
+        """
+        if backfill:
+            self.backfill_row_hashes(conn, periods)
+        columns = self.cfg.STAGED_COLUMNS
+        data_columns = [col for col in columns if col not in self.cfg.KEY_COLUMNS]
+        period_predicate = build_period_predicate(periods)
+        update_sql = f"""
+        UPDATE {self.cfg.TARGET_TABLE} AS target
+        SET {', '.join(f'{col} = source.{col}' for col in data_columns)},
+            updated_at = :load_timestamp
+        FROM {self.cfg.TEMP_TABLE} AS source
+        WHERE {self._key_join()}
+          {period_predicate}
+          AND ({self._hash_changed()})
+        """
+        insert_sql = f"""
+        INSERT INTO {self.cfg.TARGET_TABLE} ({', '.join(columns)}, created_at, updated_at)
+        SELECT {', '.join(f'source.{col}' for col in columns)}, :load_timestamp, NULL
+        FROM {self.cfg.TEMP_TABLE} AS source
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {self.cfg.TARGET_TABLE} AS target
+            WHERE {self._key_join()}
+              {period_predicate}
+        )
+        """
+        params = {'load_timestamp': _load_timestamp()}
+        cursor = conn.cursor()
+        try:
+            # Updates first: rows inserted next are new keys, which the update cannot match anyway
+            cursor.execute(update_sql, params)
+            rows_updated = cursor.rowcount
+            cursor.execute(insert_sql, params)
+            rows_inserted = cursor.rowcount
+            conn.commit()
+            record(rows_inserted=rows_inserted, rows_updated=rows_updated)
+            logger.info(f"Merge complete for {source_filename} - Inserted: {rows_inserted}, Updated: {rows_updated}")
+            return rows_inserted, rows_updated
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error during merge: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    @traced('local.target_has_periods')
+    def target_has_periods(self, conn, periods: Optional[Iterable[Tuple[int, int]]]) -> bool:
+        """True if the target holds any row in the given (YEAR, PERIOD) pairs; True without periods."""
+        if not periods:
+            return True
+        rows = self._fetchall(conn, f"SELECT 1 FROM {self.cfg.TARGET_TABLE} AS target "
+                                    f"WHERE 1 {build_period_predicate(periods)} LIMIT 1",
+                              action='checking target for loaded periods')
+        return len(rows) > 0
+
+    @traced('local.insert')
+    def insert_temp_to_target(self, conn, source_filename: str):
+        """Insert every temp row with created_at set; only for periods the target has no rows in."""
+        columns = ", ".join(self.cfg.STAGED_COLUMNS)
+        rows_inserted = self._execute(conn, f"""
+        INSERT INTO {self.cfg.TARGET_TABLE} ({columns}, created_at, updated_at)
+        SELECT {columns}, :load_timestamp, NULL
+        FROM {self.cfg.TEMP_TABLE}
+        """, {'load_timestamp': _load_timestamp()}, action='inserting into target')
+        record(rows_inserted=rows_inserted, rows_updated=0)
+        logger.info(f"Insert-only load complete for {source_filename} - Inserted: {rows_inserted}")
+        return rows_inserted, 0
+
+    def _changed_values(self, columns: Optional[List[str]] = None) -> str:
+        """JSON {column: {before, after}} of the columns an UPDATE changes; json_each drops the unchanged ones."""
+        column_deltas = ", ".join(
+            f"'{col}', json(CASE WHEN target.{col} IS NOT source.{col} "
+            f"THEN json_object('before', target.{col}, 'after', source.{col}) END)"
+            for col in columns or self.cfg.FINANCIAL_COLUMNS + ['OPENED']
+        )
+        return (f"(SELECT json_group_object(key, json(value)) "
+                f"FROM json_each(json_object({column_deltas})) WHERE type != 'null')")
+
+    @traced('local.capture_changes')
+    def capture_changes(self, conn, load_id: str, file_name: str,
+                        periods: Optional[Iterable[Tuple[int, int]]] = None, deltas: bool = False,
+                        columns: Optional[List[str]] = None):
+        """
+        Write the keys the MERGE is about to insert or update to the change log and read them back,
+        as in Snowflake; CHANGED_VALUES is JSON text. Call it before the MERGE or INSERT, or with
+        columns before merge_partial_to_target.
+        """
+        if 'change_log' not in self._session:
+            self._execute(conn, f"""
+            CREATE TABLE IF NOT EXISTS {self.cfg.CHANGE_LOG_TABLE} (
+                LOAD_ID TEXT,
+                FILE_NAME TEXT,
+                TARGET_TABLE TEXT,
+                YEAR INTEGER,
+                PERIOD INTEGER,
+                STORE_LOCATION TEXT,
+                ACTION TEXT,
+                CHANGED_VALUES TEXT,
+                CAPTURED_AT TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+            )
+            """, action='creating change log table')
+            self._session.add('change_log')
+        if columns:
+            row_changed = f"target.YEAR IS NOT NULL AND ({self._column_changed(columns)})"
+        else:
+            row_changed = f"target.YEAR IS NULL OR ({self._hash_changed()})"
+        changed_values = (f"CASE WHEN target.YEAR IS NULL THEN NULL ELSE {self._changed_values(columns)} END"
+                          if deltas else "NULL")
+        self._execute(conn, f"""
+        INSERT INTO {self.cfg.CHANGE_LOG_TABLE} (LOAD_ID, FILE_NAME, TARGET_TABLE, YEAR, PERIOD, STORE_LOCATION, ACTION, CHANGED_VALUES)
+        SELECT :load_id, :file_name, :target_table, source.YEAR, source.PERIOD, source.STORE_LOCATION,
+               CASE WHEN target.YEAR IS NULL THEN 'INSERT' ELSE 'UPDATE' END,
+               {changed_values}
+        FROM {self.cfg.TEMP_TABLE} source
+        LEFT JOIN {self.cfg.TARGET_TABLE} target
+          ON {self._key_join()}
+         {build_period_predicate(periods)}
+        WHERE {row_changed}
+        """, {'load_id': load_id, 'file_name': file_name, 'target_table': self.target_table_name()},
+            action='capturing changed keys')
+        rows = self._fetchall(conn, f"""
+        SELECT YEAR, PERIOD, STORE_LOCATION, ACTION, CHANGED_VALUES
+        FROM {self.cfg.CHANGE_LOG_TABLE}
+        WHERE LOAD_ID = :load_id
+        ORDER BY YEAR, PERIOD, STORE_LOCATION
+        """, {'load_id': load_id}, action='reading captured keys')
+        logger.info(f"Captured {len(rows)} changed keys to {self.cfg.CHANGE_LOG_TABLE} for load {load_id}")
+        return rows
+
+    @traced('local.discard_changes')
+    def discard_changes(self, conn, load_id: str):
+        """Delete the change log rows of a load whose MERGE failed."""
+        self._execute(conn, f"DELETE FROM {self.cfg.CHANGE_LOG_TABLE} WHERE LOAD_ID = :load_id",
+                      {'load_id': load_id}, action='discarding change log rows')
+        logger.info(f"Discarded change log rows of load {load_id}")
+
+    @traced('local.find_unmatched_keys')
+    def find_unmatched_keys(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None, sample_size: int = 5):
+        """Temp table keys with no row in the target. Returns: (count, sample of keys in key order)"""
+        rows = self._fetchall(conn, f"""
+        SELECT source.YEAR, source.PERIOD, source.STORE_LOCATION, COUNT(*) OVER () AS unmatched
+        FROM {self.cfg.TEMP_TABLE} source
+        LEFT JOIN {self.cfg.TARGET_TABLE} target
+          ON {self._key_join()}
+         {build_period_predicate(periods)}
+        WHERE target.YEAR IS NULL
+        ORDER BY source.YEAR, source.PERIOD, source.STORE_LOCATION
+        LIMIT {int(sample_size)}
+        """, action='checking temp table keys against target')
+        return (rows[0][3] if rows else 0), [row[:3] for row in rows]
+
+    @traced('local.merge_partial')
+    def merge_partial_to_target(self, conn, source_filename: str, columns: List[str],
+                                periods: Optional[Iterable[Tuple[int, int]]] = None):
+        """Update only columns on matched target rows where one of them changed, clearing ROW_HASH, as in Snowflake."""
+        rows_updated = self._execute(conn, f"""
+        UPDATE {self.cfg.TARGET_TABLE} AS target
+        SET {', '.join(f'{col} = source.{col}' for col in columns)},
+            {self.cfg.ROW_HASH_COLUMN} = NULL,
+            updated_at = :load_timestamp
+        FROM {self.cfg.TEMP_TABLE} AS source
+        WHERE {self._key_join()}
+          {build_period_predicate(periods)}
+          AND ({self._column_changed(columns)})
+        """, {'load_timestamp': _load_timestamp()}, action='during partial update')
+        record(rows_inserted=0, rows_updated=rows_updated)
+        logger.info(f"Partial update complete for {source_filename} - Updated: {rows_updated} ({', '.join(columns)})")
+        return 0, rows_updated
+
+    @traced('local.create_raw_table')
+    def create_raw_table(self, conn):
+        """Create the text table unvalidated rows are loaded into, for this connection only; later loads reuse it."""
+        columns = ", ".join([f"{RAW_STAGED_COLUMNS[0]} INTEGER"] + [f"{col} TEXT" for col in self.cfg.REQUIRED_COLUMNS])
+        self._create_or_empty(conn, self.cfg.RAW_TABLE, f"CREATE TEMP TABLE {self.cfg.RAW_TABLE} ({columns})")
+
+    @traced('local.copy_raw')
+    def load_stage_to_raw(self, conn, stage_file: str):
+        """Load staged unvalidated rows into the raw table as text, in one transaction."""
+        insert_sql = (f"INSERT INTO {self.cfg.RAW_TABLE} ({', '.join(RAW_STAGED_COLUMNS)}) "
+                      f"VALUES ({', '.join('?' for _ in RAW_STAGED_COLUMNS)})")
+        results = []
+        cursor = conn.cursor()
+        try:
+            for staged_path in self._staged_paths(stage_file, RAW_STAGE_FORMAT):
+                df = pd.read_csv(staged_path, dtype=str, keep_default_na=False, na_values=[''], compression='gzip')
+                df = df.astype(object).where(df.notna(), None)
+                cursor.executemany(insert_sql, df[RAW_STAGED_COLUMNS].itertuples(index=False, name=None))
+                results.append((os.path.relpath(staged_path, self.stage_dir), 'LOADED', len(df), len(df)))
+            conn.commit()
+            record(rows=sum(result[3] for result in results), files=len(results))
+            logger.info(f"Loaded {len(results)} staged files to raw table: {results}")
+            return results
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error loading to raw table: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    @traced('local.validate_raw')
+    def validate_raw_rows(self, conn, rules: list):
+        """Run the validation rules over the raw table with the Snowflake SQL. Returns: (row_count, failures)"""
+        counts = self._fetchall(conn, build_raw_rule_counts_sql(rules, self.cfg), action='validating raw rows')[0]
+        failures = []
+        for rule, count in zip(rules, counts[1:]):
+            if count:
+                rows = self._fetchall(conn, build_raw_rule_sample_sql(rule, self.cfg), action='sampling raw rows')
+                failures.append((rule, int(count), rows))
+        logger.info(f"Validated {counts[0]} raw rows in the warehouse; {len(failures)} rules failed")
+        return counts[0], failures
+
+    @traced('local.insert_raw')
+    def load_raw_to_temp(self, conn) -> int:
+        """Insert the validated raw rows into the temp table as typed values, with a NULL ROW_HASH."""
+        rows = self._execute(conn, f"""
+        INSERT INTO {self.cfg.TEMP_TABLE} ({', '.join(self.cfg.STAGED_COLUMNS)})
+        SELECT {', '.join(self.cfg.REQUIRED_COLUMNS)}, NULL
+        FROM ({build_typed_raw_select(self.cfg)}) typed
+        """, action='inserting validated rows into temp table')
+        record(rows=rows)
+        logger.info(f"Inserted {rows} validated rows into {self.cfg.TEMP_TABLE}")
+        return rows
+
+    @traced('local.describe_temp')
+    def describe_temp_table(self, conn):
+        """Row count and key range of the temp table in ledger columns, and its (YEAR, PERIOD) pairs."""
+        row = self._fetchall(conn, f"""
+        SELECT COUNT(*), MIN(YEAR), MAX(YEAR), MIN(PERIOD), MAX(PERIOD), COUNT(DISTINCT STORE_LOCATION)
+        FROM {self.cfg.TEMP_TABLE}
+        """, action='describing temp table')[0]
+        periods = self._fetchall(conn, f"SELECT DISTINCT YEAR, PERIOD FROM {self.cfg.TEMP_TABLE} ORDER BY YEAR, PERIOD",
+                                 action='listing temp table periods')
+        keys = ['ROW_COUNT', 'MIN_YEAR', 'MAX_YEAR', 'MIN_PERIOD', 'MAX_PERIOD', 'STORE_COUNT']
+        description = {key: int(value) if value is not None else None for key, value in zip(keys, row)}
+        return description, [(int(year), int(period)) for year, period in periods]
+
+    @traced('local.fetch_target_hashes')
+    def fetch_target_hashes(self, conn, since: Optional[str] = None):
+        """Return (YEAR, PERIOD, STORE_LOCATION, ROW_HASH, changed_at), only rows changed at or after since if given."""
+        where_clause = "WHERE julianday(COALESCE(updated_at, created_at)) >= julianday(:since)" if since else ""
+        rows = self._fetchall(conn, f"""
+        SELECT YEAR, PERIOD, STORE_LOCATION, {self.cfg.ROW_HASH_COLUMN},
+               COALESCE(updated_at, created_at) AS changed_at
+        FROM {self.cfg.TARGET_TABLE}
+        {where_clause}
+        """, {'since': since}, action='fetching row hashes')
+        logger.info(f"Fetched {len(rows)} row hashes from {self.cfg.TARGET_TABLE}")
+        return rows
+
+    @traced('local.fetch_loaded_files')
+    def fetch_loaded_files(self, conn, checksums: List[str], target_table: str):
+        """Return (FILE_CHECKSUM, FILE_NAME, LOADED_AT) of successful ledger entries for the checksums."""
+        if not checksums:
+            return []
+        params = {f"checksum_{i}": checksum for i, checksum in enumerate(checksums)}
+        placeholders = ", ".join(f":{name}" for name in params)
+        # With a bare MAX(), SQLite takes FILE_NAME from the row holding the maximum
+        return self._fetchall(conn, f"""
+        SELECT FILE_CHECKSUM, FILE_NAME, MAX(LOADED_AT)
+        FROM {self.cfg.LEDGER_TABLE}
+        WHERE TARGET_TABLE = :target_table
+          AND OUTCOME = 'SUCCESS'
+          AND FILE_CHECKSUM IN ({placeholders})
+        GROUP BY FILE_CHECKSUM
+        """, {**params, 'target_table': target_table}, action='reading load ledger')
+
+    @traced('local.insert_ledger_entries')
+    def insert_ledger_entries(self, conn, entries: List[dict]):
+        """Append entries (dicts of ledger column -> value) to the load ledger."""
+        if not entries:
+            return
+        columns = list(entries[0])
+        insert_sql = (f"INSERT INTO {self.cfg.LEDGER_TABLE} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join(f':{col}' for col in columns)})")
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(insert_sql, entries)
+            conn.commit()
+            logger.info(f"Recorded {len(entries)} load ledger entries")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error writing load ledger: {e}")
+            raise
+        finally:
+            cursor.close()
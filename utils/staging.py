@@ -0,0 +1,246 @@
+import gzip
+import io
+import math
+import os
+from typing import List, Optional
+import pandas as pd
+import config
+from utils.schema import MONEY_COLUMNS, as_text, is_cents, to_cents
+
+# Supported formats for data written to the Snowflake stage
+STAGE_FORMATS = ('csv', 'csv.gz', 'parquet')
+
+# Unvalidated rows for warehouse-side validation are staged as text in this format, each
+# with its row number in a full read of the file so errors point at the same rows
+RAW_STAGE_FORMAT = 'csv.gz'
+RAW_ROW_COLUMN = 'SOURCE_ROW'
+RAW_STAGED_COLUMNS = [RAW_ROW_COLUMN] + config.REQUIRED_COLUMNS
+
+
+def _check_format(stage_format: str):
+    if stage_format not in STAGE_FORMATS:
+        raise ValueError(f"Unsupported stage format: {stage_format}. Please use one of {', '.join(STAGE_FORMATS)}.")
+
+
+def partial_staged_columns(update_columns: List[str]) -> List[str]:
+    """The staged columns of a partial update: the keys and the columns it updates, without ROW_HASH."""
+    return config.KEY_COLUMNS + list(update_columns)
+
+
+def _parquet_schema(columns: Optional[List[str]] = None):
+    """Arrow schema for the staged columns, fixed so every chunk writes identically. Money is staged as cents."""
+    import pyarrow as pa
+
+    types = {'STORE_LOCATION': pa.string(), 'OPENED': pa.string()}
+    return pa.schema([(col, types.get(col, pa.int64())) for col in columns or config.STAGED_COLUMNS])
+
+
+def _staged_frame(df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    The staged columns (default STAGED_COLUMNS) with money as integer cents. Validated frames
+    already hold cents, so this is a column selection; integers also serialize far faster than floats.
+    """
+    df = df[columns or config.STAGED_COLUMNS]
+    cents = {col: to_cents(df[col], pd.Int64Dtype()) for col in MONEY_COLUMNS
+             if col in df.columns and not is_cents(df[col])}
+    return df.assign(**cents) if cents else df
+
+
+def _stage_text(values: pd.Series) -> pd.Series:
+    """Text as staged: str values with NULLs kept. Dates parsed by the reader are formatted as the CSV path writes them."""
+    text = as_text(values)
+    if text.dtype != object:
+        text = text.astype(str).where(text.notna(), None)
+    return text
+
+
+def raw_staged_frame(chunk: pd.DataFrame) -> pd.DataFrame:
+    """An unvalidated chunk as staged for warehouse-side validation: row number, then every required column as text."""
+    text = {col: _stage_text(chunk[col]) for col in config.REQUIRED_COLUMNS}
+    return pd.DataFrame({RAW_ROW_COLUMN: chunk.index, **text})[RAW_STAGED_COLUMNS]
+
+
+def _to_arrow_table(df: pd.DataFrame, columns: Optional[List[str]] = None):
+    """Convert the staged columns to an Arrow table using the fixed schema."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Parquet staging requires pyarrow. Install it with: pip install pyarrow")
+
+    df = _staged_frame(df, columns)
+    # Text columns may hold mixed Excel types (e.g. dates and strings); stage them as text like the CSV path
+    text = {col: _stage_text(df[col]) for col in ['STORE_LOCATION', 'OPENED'] if col in df.columns}
+    return pa.Table.from_pandas(df.assign(**text), schema=_parquet_schema(columns), preserve_index=False)
+
+
+def stage_file_name(prefix: str, stage_format: str) -> str:
+    """Return the stage file name for a prefix, with the extension of the format."""
+    _check_format(stage_format)
+    return f"{prefix}.{stage_format}"
+
+
+def stage_part_name(index: int, stage_format: str) -> str:
+    """Return the file name of one part of a chunked staging load."""
+    return stage_file_name(f"part_{index:05d}", stage_format)
+
+
+def stage_part_pattern(stage_format: str) -> str:
+    """COPY PATTERN matching the part files of a format (dots bracketed so no backslash escapes reach the SQL)."""
+    _check_format(stage_format)
+    return f".*part_[0-9]+[.]{stage_format.replace('.', '[.]')}"
+
+
+def is_stage_directory(stage_file: str) -> bool:
+    """True if a staged reference is a directory of part files rather than a single file."""
+    return stage_file.endswith('/')
+
+
+def serialize_frame(df: pd.DataFrame, stage_format: str, columns: Optional[List[str]] = None) -> io.BytesIO:
+    """Serialize the staged columns (default STAGED_COLUMNS) of a DataFrame into an in-memory buffer ready for PUT."""
+    _check_format(stage_format)
+    buffer = io.BytesIO()
+
+    if stage_format == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(_to_arrow_table(df, columns), buffer, compression='snappy')
+    else:
+        data = _staged_frame(df, columns).to_csv(index=False).encode('utf-8')
+        if stage_format == 'csv.gz':
+            data = gzip.compress(data, compresslevel=6)
+        buffer.write(data)
+
+    buffer.seek(0)
+    return buffer
+
+
+def estimate_stage_bytes(df: pd.DataFrame, stage_format: str, sample_rows: int = 10000,
+                         columns: Optional[List[str]] = None) -> int:
+    """Estimate the staged size of a frame by serializing its first sample_rows rows."""
+    if len(df) == 0:
+        return 0
+    sample = df.iloc[:sample_rows]
+    return int(serialize_frame(sample, stage_format, columns).getbuffer().nbytes * len(df) / len(sample))
+
+
+def file_format_clause(stage_format: str) -> str:
+    """Return the COPY FILE_FORMAT clause matching a stage format."""
+    _check_format(stage_format)
+    if stage_format == 'parquet':
+        return "FILE_FORMAT = (TYPE = 'PARQUET')"
+    compression = 'GZIP' if stage_format == 'csv.gz' else 'NONE'
+    return f"FILE_FORMAT = (TYPE = 'CSV' FIELD_OPTIONALLY_ENCLOSED_BY = '\"' SKIP_HEADER = 1 COMPRESSION = {compression})"
+
+
+def copy_source(stage_path: str, stage_format: str, columns: Optional[List[str]] = None) -> str:
+    """
+    Return the FROM clause source for COPY, a transform over the staged file of columns
+    (default STAGED_COLUMNS). CSV fields are read by position and Parquet fields by name.
+    Money is staged as cents and divided back to dollars in Snowflake, which is exact in NUMBER arithmetic.
+    """
+    _check_format(stage_format)
+    fields = []
+    for position, col in enumerate(columns or config.STAGED_COLUMNS, start=1):
+        field = f"$1:{col}" if stage_format == 'parquet' else f"${position}"
+        if col in MONEY_COLUMNS:
+            field = f"{field}::NUMBER(38,0) / 100"
+        fields.append(field)
+    return f"(SELECT {', '.join(fields)} FROM {stage_path})"
+
+
+class StageFileWriter:
+    """
+    Write a staging file on disk chunk by chunk in any of the stage formats.
+    With raw, chunks are frames from raw_staged_frame and are written as they are (CSV formats only).
+    columns are the staged columns of validated chunks (default STAGED_COLUMNS).
+    """
+
+    def __init__(self, path: str, stage_format: str, raw: bool = False, columns: Optional[List[str]] = None):
+        _check_format(stage_format)
+        if raw and stage_format == 'parquet':
+            raise ValueError("Unvalidated rows are staged as CSV")
+        self.path = path
+        self.stage_format = stage_format
+        self.raw = raw
+        self.columns = columns
+        self._handle = None
+        self._parquet_writer = None
+        self._header = True
+
+    def write(self, df: pd.DataFrame):
+        if self.stage_format == 'parquet':
+            import pyarrow.parquet as pq
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, _parquet_schema(self.columns), compression='snappy')
+            self._parquet_writer.write_table(_to_arrow_table(df, self.columns))
+            return
+
+        if self._handle is None:
+            if self.stage_format == 'csv.gz':
+                self._handle = gzip.open(self.path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+            else:
+                self._handle = open(self.path, 'w', encoding='utf-8', newline='')
+        (df if self.raw else _staged_frame(df, self.columns)).to_csv(self._handle, index=False, header=self._header)
+        self._header = False
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+class StagePartWriter:
+    """
+    Write staging data as numbered part files in a directory, starting a new part once the
+    current one reaches target_bytes, so the warehouse can load the parts in parallel.
+    """
+
+    def __init__(self, directory: str, stage_format: str, target_bytes: Optional[int] = None, raw: bool = False):
+        _check_format(stage_format)
+        self.directory = directory
+        self.stage_format = stage_format
+        self.target_bytes = target_bytes or config.STAGE_PART_TARGET_BYTES
+        self.raw = raw
+        self.paths: List[str] = []
+        self._writer = None
+
+    def write(self, df: pd.DataFrame):
+        if self._writer is None:
+            path = os.path.join(self.directory, stage_part_name(len(self.paths) + 1, self.stage_format))
+            self._writer = StageFileWriter(path, self.stage_format, self.raw)
+            self.paths.append(path)
+        self._writer.write(df)
+        # Compressed output is buffered, so a part can overshoot by up to one write
+        if os.path.getsize(self._writer.path) >= self.target_bytes:
+            self._writer.close()
+            self._writer = None
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def write_stage_parts(df: pd.DataFrame, directory: str, stage_format: str, estimated_bytes: Optional[int] = None,
+                      target_bytes: Optional[int] = None, columns: Optional[List[str]] = None) -> List[str]:
+    """
+    Write a frame as equal-sized part files of about target_bytes each, so parallel loads
+    finish together. estimated_bytes is the frame's estimate_stage_bytes, if already known.
+    Returns: the part paths in order
+    """
+    target_bytes = target_bytes or config.STAGE_PART_TARGET_BYTES
+    if estimated_bytes is None:
+        estimated_bytes = estimate_stage_bytes(df, stage_format, columns=columns)
+    rows_per_part = math.ceil(len(df) / max(1, math.ceil(estimated_bytes / target_bytes)))
+    paths = []
+    for start in range(0, len(df), rows_per_part):
+        path = os.path.join(directory, stage_part_name(len(paths) + 1, stage_format))
+        writer = StageFileWriter(path, stage_format, columns=columns)
+        try:
+            writer.write(df.iloc[start:start + rows_per_part])
+        finally:
+            writer.close()
+        paths.append(path)
+    return paths
@@ -1,91 +1,312 @@
+import re
+import numpy as np
 import pandas as pd
-from typing import Tuple, List
+from typing import Tuple, List, Set, Callable, NamedTuple, Optional
 import config
+from utils.schema import compact_frame, cents_array, as_text, with_dollars
+from utils.file_utils import SOURCE_SHEET_COLUMN
 
-def validate_dataframe(df: pd.DataFrame, filename: str) -> Tuple[bool, List[str]]:
+SAMPLE_COLUMNS = ['YEAR', 'PERIOD', 'STORE_LOCATION']
+
+
+class ValidationRule(NamedTuple):
+    """
+    A row-level check: build_mask flags offending rows, message describes how many.
+    sql is the same check as a condition on the typed raw rows of a warehouse-side validation
+    (columns YEAR, PERIOD, STORE_LOCATION and KEY_ROWS, the number of rows sharing the row's key).
+    """
+    name: str
+    build_mask: Callable[[pd.DataFrame], pd.Series]
+    message: Callable[[int], str]
+    sample_label: str
+    sample_size: int
+    sql: Callable[[], str]
+
+
+# Rules run in registration order, which is also the order errors are reported in
+VALIDATION_RULES: List[ValidationRule] = []
+
+
+def register_rule(name: str, message: Callable[[int], str], sample_label: str, sql: Callable[[], str],
+                  sample_size: int = 3):
+    """Decorator that adds a mask-building function, and its SQL form, to VALIDATION_RULES."""
+    def decorator(build_mask):
+        VALIDATION_RULES.append(ValidationRule(name, build_mask, message, sample_label, sample_size, sql))
+        return build_mask
+    return decorator
+
+
+for _col in config.KEY_COLUMNS:
+    register_rule(
+        f'null_{_col.lower()}',
+        lambda n, col=_col: f"Found {n} null values in key column: {col}",
+        f"Sample rows with null {_col}",
+        lambda col=_col: f"{col} IS NULL"
+    )(lambda df, col=_col: df[col].isnull())
+
+
+@register_rule(
+    'year_range',
+    lambda n: f"Found {n} rows with invalid YEAR (must be {config.MIN_YEAR}-{config.MAX_YEAR})",
+    "Sample invalid rows",
+    lambda: f"YEAR IS NOT NULL AND YEAR NOT BETWEEN {config.MIN_YEAR} AND {config.MAX_YEAR}"
+)
+def _invalid_year(df: pd.DataFrame) -> pd.Series:
+    return df['YEAR'].notna() & ~df['YEAR'].between(config.MIN_YEAR, config.MAX_YEAR)
+
+
+@register_rule(
+    'year_integer',
+    lambda n: f"Found {n} rows with non-integer YEAR",
+    "Sample invalid rows",
+    lambda: "YEAR IS NOT NULL AND YEAR <> ROUND(YEAR)"
+)
+def _fractional_year(df: pd.DataFrame) -> pd.Series:
+    # compact_dtypes casts YEAR to int16, which would silently truncate 2023.7 to 2023
+    return df['YEAR'].notna() & (df['YEAR'] % 1 != 0)
+
+
+@register_rule(
+    'period_range',
+    lambda n: f"Found {n} rows with invalid PERIOD (must be {config.MIN_PERIOD}-{config.MAX_PERIOD})",
+    "Sample invalid rows",
+    lambda: f"PERIOD IS NOT NULL AND PERIOD NOT BETWEEN {config.MIN_PERIOD} AND {config.MAX_PERIOD}"
+)
+def _invalid_period(df: pd.DataFrame) -> pd.Series:
+    return df['PERIOD'].notna() & ~df['PERIOD'].between(config.MIN_PERIOD, config.MAX_PERIOD)
+
+
+@register_rule(
+    'duplicate_keys',
+    lambda n: f"Found {n} duplicate rows based on YEAR, PERIOD, STORE_LOCATION",
+    "Sample duplicates",
+    lambda: "KEY_ROWS > 1",
+    sample_size=5
+)
+def _duplicate_keys(df: pd.DataFrame) -> pd.Series:
+    return df.duplicated(subset=config.KEY_COLUMNS, keep=False)
+
+
+def normalize_period(values: pd.Series) -> pd.Series:
+    """
+    Convert PERIOD formats like "P1", "P01", "Period 1" or 1 to numbers.
+    The regex runs once per distinct value rather than once per row.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    normalized = []
+    for value in uniques:
+        match = re.search(r'\d+', str(value))
+        normalized.append(float(match.group()) if match else np.nan)
+    normalized = pd.Series(normalized, dtype='float64')
+    if not normalized.isna().any():
+        normalized = normalized.astype('int64')
+    return pd.Series(normalized.to_numpy()[codes], index=values.index)
+
+
+def convert_numeric_block(df: pd.DataFrame, columns: List[str]):
+    """
+    Convert columns to numeric in place as one block. Columns that are already numeric are
+    left untouched; the rest are cast together and only fall back to per-column coercion
+    (invalid values become NaN) if the block cast fails.
+    """
+    to_convert = [col for col in columns if not pd.api.types.is_numeric_dtype(df[col])]
+    if not to_convert:
+        return
+    try:
+        converted = df[to_convert].astype('float64')
+    except (ValueError, TypeError):
+        converted = df[to_convert].apply(pd.to_numeric, errors='coerce')
+    df[to_convert] = converted
+
+
+def partial_update_columns(columns) -> List[str]:
+    """The non-key required columns a partial update file supplies, in REQUIRED_COLUMNS order."""
+    columns = set(columns)
+    return [col for col in config.REQUIRED_COLUMNS if col in columns and col not in config.KEY_COLUMNS]
+
+
+def validate_dataframe(df: pd.DataFrame, filename: str, dtype_backend: Optional[str] = None,
+                       partial: bool = False) -> Tuple[bool, List[str]]:
     """
     Validate the input dataframe before loading to Snowflake.
+    YEAR, PERIOD and the financial columns are converted to numbers in place, then every
+    rule in VALIDATION_RULES builds its mask in one pass; samples are only built for rules that fail.
+    A valid frame is converted in place to the compact schema in utils/schema.py (money in cents).
+    With partial, the file needs the key columns and any subset of the others, and gets no ROW_HASH.
     Returns: (is_valid, list_of_errors)
     """
     errors = []
     
     # 1. Check required columns exist
-    missing_cols = set(config.REQUIRED_COLUMNS) - set(df.columns)
+    missing_cols = set(config.KEY_COLUMNS if partial else config.REQUIRED_COLUMNS) - set(df.columns)
     if missing_cols:
         errors.append(f"Missing required columns: {missing_cols}")
         return False, errors
+    if partial:
+        # A misspelled column would otherwise be dropped and its correction silently lost
+        unknown_cols = set(df.columns) - set(config.REQUIRED_COLUMNS) - {SOURCE_SHEET_COLUMN}
+        if unknown_cols:
+            errors.append(f"Unknown columns in partial update: {unknown_cols}")
+            return False, errors
+        if not partial_update_columns(df.columns):
+            errors.append("Partial update has no columns to update besides the key columns")
+            return False, errors
     
-    # 2. Convert YEAR to numeric
+    # 2. Convert YEAR and the financial columns to numeric
     try:
-        df['YEAR'] = pd.to_numeric(df['YEAR'], errors='coerce')
+        convert_numeric_block(df, ['YEAR'] + [col for col in config.FINANCIAL_COLUMNS if col in df.columns])
     except Exception as e:
-        errors.append(f"Error converting YEAR to numeric: {e}")
+        errors.append(f"Error converting numeric columns: {e}")
         return False, errors
     
     # 3. Convert PERIOD - handle string formats like "P1", "P01", "Period 1", etc.
     try:
-        # First convert to string to handle any format
-        df['PERIOD'] = df['PERIOD'].astype(str)
-        
-        # Extract numeric part (handles "P1", "P01", "Period 1", etc.)
-        df['PERIOD'] = df['PERIOD'].str.extract('(\d+)', expand=False)
-        
-        # Convert to numeric
-        df['PERIOD'] = pd.to_numeric(df['PERIOD'], errors='coerce')
+        df['PERIOD'] = normalize_period(df['PERIOD'])
     except Exception as e:
         errors.append(f"Error converting PERIOD to numeric: {e}")
         return False, errors
     
-    # 4. Check for null values in key columns
-    for col in config.KEY_COLUMNS:
-        null_count = df[col].isnull().sum()
-        if null_count > 0:
-            errors.append(f"Found {null_count} null values in key column: {col}")
-            # Show some examples of the nulls
-            null_rows = df[df[col].isnull()][['YEAR', 'PERIOD', 'STORE_LOCATION']].head(3)
-            errors.append(f"Sample rows with null {col}:\n{null_rows.to_string()}")
-    
-    # 5. Validate YEAR range (after converting to numeric)
-    valid_years = df['YEAR'].notna()
-    invalid_years = df[valid_years & ~df['YEAR'].between(config.MIN_YEAR, config.MAX_YEAR)]
-    if len(invalid_years) > 0:
-        errors.append(f"Found {len(invalid_years)} rows with invalid YEAR (must be {config.MIN_YEAR}-{config.MAX_YEAR})")
-        sample_years = df.loc[invalid_years.index[:3], ['YEAR', 'PERIOD', 'STORE_LOCATION']]
-        errors.append(f"Sample invalid rows:\n{sample_years.to_string()}")
-    
-    # 6. Validate PERIOD range (after converting to numeric)
-    valid_periods = df['PERIOD'].notna()
-    invalid_periods = df[valid_periods & ~df['PERIOD'].between(config.MIN_PERIOD, config.MAX_PERIOD)]
-    if len(invalid_periods) > 0:
-        errors.append(f"Found {len(invalid_periods)} rows with invalid PERIOD (must be {config.MIN_PERIOD}-{config.MAX_PERIOD})")
-        sample_periods = df.loc[invalid_periods.index[:3], ['YEAR', 'PERIOD', 'STORE_LOCATION']]
-        errors.append(f"Sample invalid rows:\n{sample_periods.to_string()}")
+    # 4. Build every rule mask, then count them together
+    masks = [rule.build_mask(df) for rule in VALIDATION_RULES]
+    counts = np.column_stack([mask.to_numpy() for mask in masks]).sum(axis=0) if len(df) else [0] * len(masks)
     
-    # 7. Check data types for financial columns - convert to numeric
-    numeric_cols = config.FINANCIAL_COLUMNS
-    for col in numeric_cols:
-        if col in df.columns:
-            try:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-            except Exception as e:
-                errors.append(f"Error converting column {col} to numeric: {e}")
+    # Rows read from several sheets show which sheet they came from
+    sample_columns = SAMPLE_COLUMNS + [SOURCE_SHEET_COLUMN] if SOURCE_SHEET_COLUMN in df.columns else SAMPLE_COLUMNS
+    for rule, mask, count in zip(VALIDATION_RULES, masks, counts):
+        if count > 0:
+            errors.extend(rule_errors(rule, int(count), df.loc[mask, sample_columns].head(rule.sample_size)))
     
-    # 8. Check for duplicate keys
-    duplicates = df[df.duplicated(subset=config.KEY_COLUMNS, keep=False)]
-    if len(duplicates) > 0:
-        errors.append(f"Found {len(duplicates)} duplicate rows based on YEAR, PERIOD, STORE_LOCATION")
-        sample_dups = duplicates[['YEAR', 'PERIOD', 'STORE_LOCATION']].head(5)
-        errors.append(f"Sample duplicates:\n{sample_dups.to_string()}")
-    
-    # 9. Basic row count check
+    # 5. Basic row count check
     if len(df) == 0:
         errors.append("DataFrame is empty")
     
     is_valid = len(errors) == 0
     
+    # 6. Compact the frame, then hash the non-key columns for change detection in the MERGE
+    if is_valid:
+        compact_frame(df, dtype_backend)
+        if not partial:
+            df[config.ROW_HASH_COLUMN] = compute_row_hash(df)
+    
     return is_valid, errors
 
 
+def rule_errors(rule: ValidationRule, count: int, sample: pd.DataFrame) -> List[str]:
+    """The errors reported for a failed rule: how many rows failed, then a sample of them."""
+    return [rule.message(count), f"{rule.sample_label}:\n{sample.to_string()}"]
+
+
+def _as_pandas_sample(sample: pd.DataFrame) -> pd.DataFrame:
+    """Show warehouse NULLs as NaN and whole-number keys as integers, as a pandas sample prints them."""
+    for col in ['YEAR', 'PERIOD']:
+        values = pd.to_numeric(sample[col])
+        if values.notna().all() and (values % 1 == 0).all():
+            values = values.astype('int64')
+        sample[col] = values
+    sample['STORE_LOCATION'] = sample['STORE_LOCATION'].where(sample['STORE_LOCATION'].notna(), np.nan)
+    return sample
+
+
+def raw_validation_errors(row_count: int, failures: List[tuple]) -> List[str]:
+    """
+    Errors of a warehouse-side validation, worded as validate_dataframe words them.
+    failures holds (rule, count, sample rows) for each failed rule, sample rows being
+    (row number, YEAR, PERIOD, STORE_LOCATION) with the row numbers of a full read.
+    """
+    errors = []
+    for rule, count, rows in failures:
+        sample = pd.DataFrame([row[1:] for row in rows], columns=SAMPLE_COLUMNS, index=[row[0] for row in rows])
+        errors.extend(rule_errors(rule, count, _as_pandas_sample(sample)))
+    if row_count == 0:
+        errors.append("DataFrame is empty")
+    return errors
+
+
+def compute_row_hash(df: pd.DataFrame) -> pd.Series:
+    """
+    Deterministic, null-safe hash of OPENED and the financial columns.
+    Money is compared at cent precision so float noise never looks like a change.
+    Returns a signed int64 Series so it fits NUMBER(19,0) in Snowflake.
+    """
+    # NULL gets a sentinel no real amount can reach; plain int64 hashes far faster than nullable Int64
+    null_cents = np.iinfo('int64').min
+    cents = np.column_stack([cents_array(df[col], null_cents) for col in config.FINANCIAL_COLUMNS])
+    canonical = pd.DataFrame(cents, columns=config.FINANCIAL_COLUMNS, index=df.index)
+    canonical.insert(0, 'OPENED', as_text(df['OPENED']))
+    hashes = pd.util.hash_pandas_object(canonical, index=False)
+    return pd.Series(hashes.values.view('int64'), index=df.index)
+
+
+def validate_chunk(df: pd.DataFrame, filename: str, seen_keys: Set[tuple],
+                   dtype_backend: Optional[str] = None) -> Tuple[bool, List[str]]:
+    """
+    Validate one chunk of a streamed file.
+    Runs validate_dataframe on the chunk and checks its keys against keys already
+    seen in earlier chunks. seen_keys is updated in place.
+    Returns: (is_valid, list_of_errors)
+    """
+    is_valid, errors = validate_dataframe(df, filename, dtype_backend)
+    if len(df) == 0 or not set(config.KEY_COLUMNS) <= set(df.columns):
+        return is_valid, errors
+    
+    keys = list(zip(df['YEAR'], df['PERIOD'], df['STORE_LOCATION']))
+    repeated = pd.Series([key in seen_keys for key in keys], index=df.index)
+    if repeated.any():
+        errors.append(f"Found {repeated.sum()} rows whose keys already appeared earlier in the file")
+        sample_dups = df.loc[repeated, ['YEAR', 'PERIOD', 'STORE_LOCATION']].head(5)
+        errors.append(f"Sample duplicates:\n{sample_dups.to_string()}")
+    seen_keys.update(keys)
+    
+    return len(errors) == 0, errors
+
+
+def periods_in_frame(df: pd.DataFrame) -> list:
+    """Sorted distinct (YEAR, PERIOD) pairs of a validated frame, as Python ints."""
+    pairs = df[['YEAR', 'PERIOD']].drop_duplicates()
+    return sorted(zip(pairs['YEAR'].astype('int64').tolist(), pairs['PERIOD'].astype('int64').tolist()))
+
+
+def update_validation_summary(summary: dict, df: pd.DataFrame):
+    """Accumulate the figures shown by print_validation_summary from one streamed chunk."""
+    if 'sample' not in summary:
+        summary.update(rows=0, stores=set(), periods=set(), year_min=None, year_max=None,
+                       period_min=None, period_max=None,
+                       sample=with_dollars(df[['YEAR', 'PERIOD', 'STORE_LOCATION', 'SALES', 'COGS']].head()))
+    summary['rows'] += len(df)
+    summary['stores'].update(df['STORE_LOCATION'].dropna().unique())
+    summary['periods'].update(periods_in_frame(df))
+    for col, key in [('YEAR', 'year'), ('PERIOD', 'period')]:
+        lo, hi = df[col].min(), df[col].max()
+        summary[f'{key}_min'] = lo if summary[f'{key}_min'] is None else min(summary[f'{key}_min'], lo)
+        summary[f'{key}_max'] = hi if summary[f'{key}_max'] is None else max(summary[f'{key}_max'], hi)
+
+
+def print_stream_summary(summary: dict):
+    """Print the summary accumulated by update_validation_summary."""
+    print("\n" + "="*60)
+    print("DATA VALIDATION SUMMARY")
+    print("="*60)
+    print(f"Total Rows: {summary['rows']}")
+    print(f"Unique Stores: {len(summary['stores'])}")
+    print(f"Year Range: {summary['year_min']:.0f} - {summary['year_max']:.0f}")
+    print(f"Period Range: {summary['period_min']:.0f} - {summary['period_max']:.0f}")
+    print(f"\nSample of data:")
+    print(summary['sample'])
+    print("="*60 + "\n")
+
+
+def print_description_summary(description: dict):
+    """Print the summary of rows validated in the warehouse, from their ledger description."""
+    print("\n" + "="*60)
+    print("DATA VALIDATION SUMMARY")
+    print("="*60)
+    print(f"Total Rows: {description['ROW_COUNT']}")
+    print(f"Unique Stores: {description['STORE_COUNT']}")
+    print(f"Year Range: {description['MIN_YEAR']} - {description['MAX_YEAR']}")
+    print(f"Period Range: {description['MIN_PERIOD']} - {description['MAX_PERIOD']}")
+    print("="*60 + "\n")
+
+
 def print_validation_summary(df: pd.DataFrame):
     """Print a summary of the data for review."""
     print("\n" + "="*60)
@@ -96,5 +317,7 @@ def print_validation_summary(df: pd.DataFrame):
     print(f"Year Range: {df['YEAR'].min():.0f} - {df['YEAR'].max():.0f}")
     print(f"Period Range: {df['PERIOD'].min():.0f} - {df['PERIOD'].max():.0f}")
     print(f"\nSample of data:")
-    print(df[['YEAR', 'PERIOD', 'STORE_LOCATION', 'SALES', 'COGS']].head())
+    # A partial update shows the columns it updates
+    shown = ['SALES', 'COGS'] if config.ROW_HASH_COLUMN in df.columns else partial_update_columns(df.columns)
+    print(with_dollars(df[SAMPLE_COLUMNS + shown].head()))
     print("="*60 + "\n")
\ No newline at end of file
@@ -0,0 +1,453 @@
+import contextlib
+import importlib
+import logging
+from typing import IO, Callable, Iterable, List, Optional, Tuple
+import config
+from utils import snowflake_utils
+
+logger = logging.getLogger(__name__)
+
+# Backends a load can run against (see create_backend)
+BACKENDS = ('snowflake', 'sqlite')
+
+
+class PendingStep:
+    """
+    A long warehouse step (COPY, MERGE or INSERT) started without waiting for it; see the
+    submit_ methods of WarehouseBackend. query_id is the warehouse query still to poll, and
+    to_result turns its result sets into what the blocking method returns. Once poll_step
+    reports it done, result holds that value.
+    """
+
+    def __init__(self, name: str, query_id: Optional[str] = None,
+                 to_result: Optional[Callable[[list], object]] = None, result=None):
+        self.name = name
+        self.query_id = query_id
+        self.to_result = to_result
+        self.result = result
+
+
+class WarehouseBackend:
+    """
+    The warehouse operations a load runs, in pipeline order: stage, temp table, COPY, MERGE,
+    plus the ledger and snapshot queries. Every backend keeps the Snowflake semantics: new keys
+    are inserted with created_at, rows whose ROW_HASH changed are updated with updated_at, and
+    unchanged rows are left alone, so loads can be compared row for row across backends.
+    """
+    name = None
+
+    def __init__(self, cfg=None):
+        self.cfg = cfg or config
+
+    def target_table_name(self) -> str:
+        """Fully qualified target table; ledger entries and snapshots are kept per target."""
+        raise NotImplementedError
+
+    def connect(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def prepare_session(self, conn):
+        """Stage, ROW_HASH column and ledger in one step, set up once per session (connection)."""
+        raise NotImplementedError
+
+    def create_stage_if_not_exists(self, conn):
+        raise NotImplementedError
+
+    def ensure_row_hash_column(self, conn):
+        raise NotImplementedError
+
+    def create_ledger_table_if_not_exists(self, conn):
+        raise NotImplementedError
+
+    def upload_to_stage(self, conn, local_file: str, stage_file: str, file_stream: Optional[IO[bytes]] = None):
+        raise NotImplementedError
+
+    def upload_parts_to_stage(self, conn, local_dir: str, stage_dir: str, stage_format: str) -> str:
+        raise NotImplementedError
+
+    def create_temp_table(self, conn):
+        raise NotImplementedError
+
+    def load_stage_to_temp(self, conn, stage_file: str, stage_format: str = 'csv',
+                           columns: Optional[List[str]] = None):
+        raise NotImplementedError
+
+    def backfill_row_hashes(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None) -> int:
+        raise NotImplementedError
+
+    def classify_temp_rows(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None):
+        raise NotImplementedError
+
+    def merge_temp_to_target(self, conn, source_filename: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                             backfill: bool = False):
+        raise NotImplementedError
+
+    def target_has_periods(self, conn, periods: Optional[Iterable[Tuple[int, int]]]) -> bool:
+        raise NotImplementedError
+
+    def insert_temp_to_target(self, conn, source_filename: str):
+        raise NotImplementedError
+
+    def capture_changes(self, conn, load_id: str, file_name: str,
+                        periods: Optional[Iterable[Tuple[int, int]]] = None, deltas: bool = False,
+                        columns: Optional[List[str]] = None):
+        raise NotImplementedError
+
+    def find_unmatched_keys(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None, sample_size: int = 5):
+        raise NotImplementedError
+
+    def merge_partial_to_target(self, conn, source_filename: str, columns: List[str],
+                                periods: Optional[Iterable[Tuple[int, int]]] = None):
+        raise NotImplementedError
+
+    def discard_changes(self, conn, load_id: str):
+        raise NotImplementedError
+
+    def create_raw_table(self, conn):
+        raise NotImplementedError
+
+    def load_stage_to_raw(self, conn, stage_file: str):
+        raise NotImplementedError
+
+    def validate_raw_rows(self, conn, rules: list):
+        raise NotImplementedError
+
+    def load_raw_to_temp(self, conn) -> int:
+        raise NotImplementedError
+
+    def describe_temp_table(self, conn):
+        raise NotImplementedError
+
+    def fetch_target_hashes(self, conn, since: Optional[str] = None):
+        raise NotImplementedError
+
+    # Asynchronous versions of the long steps, so loads into several targets overlap. A backend
+    # without asynchronous queries runs the step right away and returns it already done.
+
+    def submit_load_stage_to_temp(self, conn, stage_file: str, stage_format: str = 'csv') -> PendingStep:
+        return PendingStep('copy', result=self.load_stage_to_temp(conn, stage_file, stage_format))
+
+    def submit_merge_temp_to_target(self, conn, source_filename: str,
+                                    periods: Optional[Iterable[Tuple[int, int]]] = None,
+                                    backfill: bool = False) -> PendingStep:
+        return PendingStep('merge', result=self.merge_temp_to_target(conn, source_filename, periods, backfill))
+
+    def submit_insert_temp_to_target(self, conn, source_filename: str) -> PendingStep:
+        return PendingStep('insert', result=self.insert_temp_to_target(conn, source_filename))
+
+    def poll_step(self, conn, step: PendingStep) -> bool:
+        """True once the step has finished, with its result in step.result. Raises if it failed."""
+        return step.query_id is None
+
+    def fetch_loaded_files(self, conn, checksums: List[str], target_table: str):
+        raise NotImplementedError
+
+    def insert_ledger_entries(self, conn, entries: List[dict]):
+        raise NotImplementedError
+
+
+class SnowflakeBackend(WarehouseBackend):
+    """The production backend: snowflake_utils run against cfg (config, or e.g. config_sandbox)."""
+    name = 'snowflake'
+
+    def target_table_name(self) -> str:
+        return f"{self.cfg.SNOWFLAKE_DATABASE}.{self.cfg.SNOWFLAKE_SCHEMA}.{self.cfg.TARGET_TABLE}"
+
+    def connect(self):
+        return snowflake_utils.get_snowflake_connection(cfg=self.cfg)
+
+    def close(self):
+        snowflake_utils.close_snowflake_connection()
+
+    def prepare_session(self, conn):
+        snowflake_utils.prepare_session(conn, cfg=self.cfg)
+
+    def create_stage_if_not_exists(self, conn):
+        snowflake_utils.create_stage_if_not_exists(conn, cfg=self.cfg)
+
+    def ensure_row_hash_column(self, conn):
+        snowflake_utils.ensure_row_hash_column(conn, cfg=self.cfg)
+
+    def create_ledger_table_if_not_exists(self, conn):
+        snowflake_utils.create_ledger_table_if_not_exists(conn, cfg=self.cfg)
+
+    def upload_to_stage(self, conn, local_file: str, stage_file: str, file_stream: Optional[IO[bytes]] = None):
+        snowflake_utils.upload_to_stage(conn, local_file, stage_file, file_stream, cfg=self.cfg)
+
+    def upload_parts_to_stage(self, conn, local_dir: str, stage_dir: str, stage_format: str) -> str:
+        return snowflake_utils.upload_parts_to_stage(conn, local_dir, stage_dir, stage_format, cfg=self.cfg)
+
+    def create_temp_table(self, conn):
+        snowflake_utils.create_temp_table(conn, cfg=self.cfg)
+
+    def load_stage_to_temp(self, conn, stage_file: str, stage_format: str = 'csv',
+                           columns: Optional[List[str]] = None):
+        return snowflake_utils.load_stage_to_temp(conn, stage_file, stage_format, columns, cfg=self.cfg)
+
+    def backfill_row_hashes(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None) -> int:
+        return snowflake_utils.backfill_row_hashes(conn, periods, cfg=self.cfg)
+
+    def classify_temp_rows(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None):
+        return snowflake_utils.classify_temp_rows(conn, periods, cfg=self.cfg)
+
+    def merge_temp_to_target(self, conn, source_filename: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                             backfill: bool = False):
+        return snowflake_utils.merge_temp_to_target(conn, source_filename, periods, backfill, cfg=self.cfg)
+
+    def target_has_periods(self, conn, periods: Optional[Iterable[Tuple[int, int]]]) -> bool:
+        return snowflake_utils.target_has_periods(conn, periods, cfg=self.cfg)
+
+    def insert_temp_to_target(self, conn, source_filename: str):
+        return snowflake_utils.insert_temp_to_target(conn, source_filename, cfg=self.cfg)
+
+    def capture_changes(self, conn, load_id: str, file_name: str,
+                        periods: Optional[Iterable[Tuple[int, int]]] = None, deltas: bool = False,
+                        columns: Optional[List[str]] = None):
+        return snowflake_utils.capture_changes(conn, load_id, file_name, periods, deltas, columns, cfg=self.cfg)
+
+    def find_unmatched_keys(self, conn, periods: Optional[Iterable[Tuple[int, int]]] = None, sample_size: int = 5):
+        return snowflake_utils.find_unmatched_keys(conn, periods, sample_size, cfg=self.cfg)
+
+    def merge_partial_to_target(self, conn, source_filename: str, columns: List[str],
+                                periods: Optional[Iterable[Tuple[int, int]]] = None):
+        return snowflake_utils.merge_partial_to_target(conn, source_filename, columns, periods, cfg=self.cfg)
+
+    def discard_changes(self, conn, load_id: str):
+        snowflake_utils.discard_changes(conn, load_id, cfg=self.cfg)
+
+    def create_raw_table(self, conn):
+        snowflake_utils.create_raw_table(conn, cfg=self.cfg)
+
+    def load_stage_to_raw(self, conn, stage_file: str):
+        return snowflake_utils.load_stage_to_raw(conn, stage_file, cfg=self.cfg)
+
+    def validate_raw_rows(self, conn, rules: list):
+        return snowflake_utils.validate_raw_rows(conn, rules, cfg=self.cfg)
+
+    def load_raw_to_temp(self, conn) -> int:
+        return snowflake_utils.load_raw_to_temp(conn, cfg=self.cfg)
+
+    def describe_temp_table(self, conn):
+        return snowflake_utils.describe_temp_table(conn, cfg=self.cfg)
+
+    def fetch_target_hashes(self, conn, since: Optional[str] = None):
+        return snowflake_utils.fetch_target_hashes(conn, since, cfg=self.cfg)
+
+    def submit_load_stage_to_temp(self, conn, stage_file: str, stage_format: str = 'csv') -> PendingStep:
+        query_id = snowflake_utils.submit_query(conn, [snowflake_utils.build_copy_sql(stage_file, stage_format, cfg=self.cfg)])
+        return PendingStep('copy', query_id, to_result=lambda results: results[0])
+
+    def submit_merge_temp_to_target(self, conn, source_filename: str,
+                                    periods: Optional[Iterable[Tuple[int, int]]] = None,
+                                    backfill: bool = False) -> PendingStep:
+        query_id = snowflake_utils.submit_query(conn, snowflake_utils.build_merge_statements(periods, backfill, self.cfg))
+        return PendingStep('merge', query_id, to_result=lambda results: snowflake_utils.merge_counts(results, self.cfg))
+
+    def submit_insert_temp_to_target(self, conn, source_filename: str) -> PendingStep:
+        query_id = snowflake_utils.submit_query(conn, [snowflake_utils.build_insert_sql(self.cfg)])
+        return PendingStep('insert', query_id, to_result=lambda results: (results[0][0][0] if results[0] else 0, 0))
+
+    def poll_step(self, conn, step: PendingStep) -> bool:
+        if step.query_id is None:
+            return True
+        results = snowflake_utils.poll_query(conn, step.query_id)
+        if results is None:
+            return False
+        step.result = step.to_result(results)
+        step.query_id = None
+        return True
+
+    def fetch_loaded_files(self, conn, checksums: List[str], target_table: str):
+        return snowflake_utils.fetch_loaded_files(conn, checksums, target_table, cfg=self.cfg)
+
+    def insert_ledger_entries(self, conn, entries: List[dict]):
+        snowflake_utils.insert_ledger_entries(conn, entries, cfg=self.cfg)
+
+
+def create_backend(name: Optional[str] = None, cfg=None, local_path: Optional[str] = None) -> WarehouseBackend:
+    """
+    Build a backend by name (default: config.WAREHOUSE_BACKEND).
+    local_path is the database file of the sqlite backend (default: cfg.LOCAL_WAREHOUSE_PATH).
+    """
+    cfg = cfg or config
+    name = name or cfg.WAREHOUSE_BACKEND
+    if name == 'snowflake':
+        return SnowflakeBackend(cfg)
+    if name == 'sqlite':
+        from utils.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(local_path or cfg.LOCAL_WAREHOUSE_PATH, cfg)
+    raise ValueError(f"Unsupported warehouse backend: {name}. Please use one of {', '.join(BACKENDS)}.")
+
+
+def load_profile(name: str):
+    """The config module of a target profile in config.TARGET_PROFILES, e.g. 'sandbox'."""
+    if name not in config.TARGET_PROFILES:
+        raise ValueError(f"Unknown target profile: {name}. Please use one of {', '.join(config.TARGET_PROFILES)}.")
+    return importlib.import_module(config.TARGET_PROFILES[name])
+
+
+# The backend the pipeline loads into; set once at startup, created from config on first use otherwise
+_backend = None
+
+
+def set_backend(backend: WarehouseBackend):
+    """Make backend the one every function below runs against."""
+    global _backend
+    _backend = backend
+    logger.info(f"Warehouse backend: {backend.name} ({backend.target_table_name()})")
+
+
+def get_backend() -> WarehouseBackend:
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+@contextlib.contextmanager
+def using_backend(backend: WarehouseBackend):
+    """Run the functions below against backend inside the block, e.g. for one target of a multi-target load."""
+    global _backend
+    previous = _backend
+    _backend = backend
+    try:
+        yield backend
+    finally:
+        _backend = previous
+
+
+# Module-level operations on the active backend, so pipeline code does not pass it around
+
+def get_connection():
+    return get_backend().connect()
+
+
+def close_connection():
+    get_backend().close()
+
+
+def target_table_name() -> str:
+    return get_backend().target_table_name()
+
+
+def prepare_session(conn):
+    get_backend().prepare_session(conn)
+
+
+def create_stage_if_not_exists(conn):
+    get_backend().create_stage_if_not_exists(conn)
+
+
+def ensure_row_hash_column(conn):
+    get_backend().ensure_row_hash_column(conn)
+
+
+def create_ledger_table_if_not_exists(conn):
+    get_backend().create_ledger_table_if_not_exists(conn)
+
+
+def upload_to_stage(conn, local_file: str, stage_file: str, file_stream: Optional[IO[bytes]] = None):
+    get_backend().upload_to_stage(conn, local_file, stage_file, file_stream)
+
+
+def upload_parts_to_stage(conn, local_dir: str, stage_dir: str, stage_format: str) -> str:
+    return get_backend().upload_parts_to_stage(conn, local_dir, stage_dir, stage_format)
+
+
+def create_temp_table(conn):
+    get_backend().create_temp_table(conn)
+
+
+def load_stage_to_temp(conn, stage_file: str, stage_format: str = 'csv', columns: Optional[List[str]] = None):
+    return get_backend().load_stage_to_temp(conn, stage_file, stage_format, columns)
+
+
+def backfill_row_hashes(conn, periods: Optional[Iterable[Tuple[int, int]]] = None) -> int:
+    return get_backend().backfill_row_hashes(conn, periods)
+
+
+def classify_temp_rows(conn, periods: Optional[Iterable[Tuple[int, int]]] = None):
+    return get_backend().classify_temp_rows(conn, periods)
+
+
+def merge_temp_to_target(conn, source_filename: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                         backfill: bool = False):
+    return get_backend().merge_temp_to_target(conn, source_filename, periods, backfill)
+
+
+def target_has_periods(conn, periods: Optional[Iterable[Tuple[int, int]]]) -> bool:
+    return get_backend().target_has_periods(conn, periods)
+
+
+def insert_temp_to_target(conn, source_filename: str):
+    return get_backend().insert_temp_to_target(conn, source_filename)
+
+
+def capture_changes(conn, load_id: str, file_name: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                    deltas: bool = False, columns: Optional[List[str]] = None):
+    return get_backend().capture_changes(conn, load_id, file_name, periods, deltas, columns)
+
+
+def find_unmatched_keys(conn, periods: Optional[Iterable[Tuple[int, int]]] = None, sample_size: int = 5):
+    return get_backend().find_unmatched_keys(conn, periods, sample_size)
+
+
+def merge_partial_to_target(conn, source_filename: str, columns: List[str],
+                            periods: Optional[Iterable[Tuple[int, int]]] = None):
+    return get_backend().merge_partial_to_target(conn, source_filename, columns, periods)
+
+
+def discard_changes(conn, load_id: str):
+    get_backend().discard_changes(conn, load_id)
+
+
+def create_raw_table(conn):
+    get_backend().create_raw_table(conn)
+
+
+def load_stage_to_raw(conn, stage_file: str):
+    return get_backend().load_stage_to_raw(conn, stage_file)
+
+
+def validate_raw_rows(conn, rules: list):
+    return get_backend().validate_raw_rows(conn, rules)
+
+
+def load_raw_to_temp(conn) -> int:
+    return get_backend().load_raw_to_temp(conn)
+
+
+def describe_temp_table(conn):
+    return get_backend().describe_temp_table(conn)
+
+
+def fetch_target_hashes(conn, since: Optional[str] = None):
+    return get_backend().fetch_target_hashes(conn, since)
+
+
+def submit_load_stage_to_temp(conn, stage_file: str, stage_format: str = 'csv') -> PendingStep:
+    return get_backend().submit_load_stage_to_temp(conn, stage_file, stage_format)
+
+
+def submit_merge_temp_to_target(conn, source_filename: str, periods: Optional[Iterable[Tuple[int, int]]] = None,
+                                backfill: bool = False) -> PendingStep:
+    return get_backend().submit_merge_temp_to_target(conn, source_filename, periods, backfill)
+
+
+def submit_insert_temp_to_target(conn, source_filename: str) -> PendingStep:
+    return get_backend().submit_insert_temp_to_target(conn, source_filename)
+
+
+def poll_step(conn, step: PendingStep) -> bool:
+    return get_backend().poll_step(conn, step)
+
+
+def fetch_loaded_files(conn, checksums: List[str], target_table: str):
+    return get_backend().fetch_loaded_files(conn, checksums, target_table)
+
+
+def insert_ledger_entries(conn, entries: List[dict]):
+    get_backend().insert_ledger_entries(conn, entries)
@@ -0,0 +1,69 @@
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import config
+from utils.batch_utils import collect_input_files
+
+logger = logging.getLogger(__name__)
+
+
+def _can_open(filepath: str) -> bool:
+    """False while another process still holds the file exclusively (e.g. a Windows share mid-copy)."""
+    try:
+        with open(filepath, 'rb'):
+            return True
+    except OSError:
+        return False
+
+
+class FolderWatcher:
+    """
+    Poll a directory for workbooks that have finished landing.
+    A file is reported once its size and modification time have stayed the same for
+    debounce_seconds and it can be opened, so half-copied or still-saving files are skipped.
+    A file is reported again only if it changes after that.
+    """
+
+    def __init__(self, directory: str, debounce_seconds: Optional[float] = None):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        self.directory = directory
+        self.debounce_seconds = config.WATCH_DEBOUNCE_SECONDS if debounce_seconds is None else debounce_seconds
+        # {path: ((size, mtime_ns), first seen with that signature)}
+        self._pending: Dict[str, Tuple[tuple, float]] = {}
+        # {path: (size, mtime_ns)} of files already reported
+        self._reported: Dict[str, tuple] = {}
+
+    def poll(self) -> List[Tuple[str, float]]:
+        """Return (path, modification time) for each file that became ready since the last poll."""
+        now = time.monotonic()
+        ready = []
+        present = set()
+        for path in collect_input_files(self.directory):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            present.add(path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._reported.get(path) == signature:
+                continue
+
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                # New or still being written - restart the debounce window
+                self._pending[path] = (signature, now)
+                continue
+            if now - pending[1] >= self.debounce_seconds and stat.st_size > 0 and _can_open(path):
+                del self._pending[path]
+                self._reported[path] = signature
+                ready.append((path, stat.st_mtime))
+
+        # Forget files that were moved away so a file dropped again under the same name is picked up
+        for path in set(self._pending) - present:
+            del self._pending[path]
+        for path in set(self._reported) - present:
+            del self._reported[path]
+        return ready